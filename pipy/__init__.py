@@ -1,4 +1,5 @@
 from .pipy import Pipy
 from .package import Package
 from .process import Process
+from .lazy import require
 from .__version__ import __version__
@@ -1,25 +1,20 @@
 
 
+IMMUTABLE_TYPES = (str, bool, int, float)
+
+
 def assert_type(value: object,
                 value_type: type,
                 name: str = None,
                 allow_none: bool = False,
                 ):
-    if name is not None:
-        param_s = "parameter: {NAME}={REPR}({TYPE})".format(NAME=name,
-                                                            TYPE=type(value),
-                                                            REPR=repr(value)
-                                                            )
-    else:
-        param_s = "argument: ({REPR})({TYPE})".format(NAME=name,
-                                                      TYPE=type(value),
-                                                      REPR=repr(value)
-                                                      )
     if value is None:
         if allow_none is False:
-            raise ValueError("Provided {PARAM_S} must be not be None".format(PARAM_S=param_s, TYPE=type(value_type)))
+            raise ValueError("Provided {PARAM_S} must be not be None".format(PARAM_S=get_param_s(value, name)))
         else:
             return None
+    if type(value) is value_type and value_type in IMMUTABLE_TYPES:
+        return value
     try:
         value = value_type(value)
     except Exception as e:
@@ -28,11 +23,25 @@ def assert_type(value: object,
     if isinstance(value, value_type) is True:
         return value
     else:
-        raise TypeError("Provided {PARAM_S} must be of type({TYPE})".format(PARAM_S=param_s,
+        raise TypeError("Provided {PARAM_S} must be of type({TYPE})".format(PARAM_S=get_param_s(value, name),
                                                                             TYPE=type(value_type)
                                                                             ))
 
 
+def get_param_s(value: object, name: str = None):
+    """
+    Format the description of a parameter for an error message, only called when an assertion fails
+    """
+    if name is not None:
+        return "parameter: {NAME}={REPR}({TYPE})".format(NAME=name,
+                                                         TYPE=type(value),
+                                                         REPR=repr(value)
+                                                         )
+    return "argument: ({REPR})({TYPE})".format(TYPE=type(value),
+                                               REPR=repr(value)
+                                               )
+
+
 def assert_list(value: list, name: str = None, allow_none: bool = False):
     value: list = assert_type(value=value, value_type=list, name=name, allow_none=allow_none)
     return value
@@ -0,0 +1,21 @@
+import statistics
+import time
+
+
+def summarize(latencies: list):
+    """
+    Return the min, median and max of a list of latencies in seconds
+    """
+    return {'min': min(latencies), 'median': statistics.median(latencies), 'max': max(latencies)}
+
+
+def measure(func, repeat: int = 5):
+    """
+    Call `func` `repeat` times and return the summary of its latencies, see :obj:`summarize`
+    """
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from .index import IndexClient
+from .logging import get_logger
+from .requirements import normalize_name
+
+
+def get_cache_dir(name: str = None):
+    """
+    Return (and create) the Pipy cache directory, or the sub-directory `name` of it
+
+    The location can be set with the environment variable `PIPY_CACHE_DIR`, otherwise it defaults to the user cache
+    directory of the platform, ex. `~/.cache/pipy`
+    """
+    path = os.environ.get('PIPY_CACHE_DIR')
+    if path is None:
+        if sys.platform == 'win32':
+            base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        elif sys.platform == 'darwin':
+            base = os.path.expanduser('~/Library/Caches')
+        else:
+            base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        path = os.path.join(base, 'pipy')
+    if name is not None:
+        path = os.path.join(path, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_cache_key(*parts):
+    """
+    Return a stable hex digest for a sequence of JSON serializable values
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class JsonCache(object):
+    """
+    A directory of JSON documents, one file per key
+
+    Files are written to a temporary file and moved into place, so concurrent readers never see a partial document.
+
+    Usage
+        cache = JsonCache(name='reports')
+        cache.set(key, {'install': []})
+        cache.get(key) # {'install': []}
+    """
+    log = get_logger()
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = get_cache_dir(name=name)
+
+    def get_path(self, key: str):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self.get_path(key=key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, self.get_path(key=key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return value
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.get_path(key=key))
+        except OSError:
+            pass
+
+
+class SqliteCache(object):
+    """
+    Base class of the caches which are stored in a SQLite database
+
+    Each thread of each process opens its own connection, databases use WAL journaling so that readers in other
+    processes are not blocked by a writer.
+    """
+    timeout = 30
+    schema: str = None
+    _local: threading.local = None
+
+    @classmethod
+    def get_path(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def get_connection(cls):
+        """
+        Return the SQLite connection of the current thread and process, creating the database if needed
+        """
+        path = cls.get_path()
+        conn = getattr(cls._local, 'conn', None)
+        if conn is not None and getattr(cls._local, 'key', None) == (os.getpid(), path):
+            return conn
+        conn = sqlite3.connect(path, timeout=cls.timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(cls.schema)
+        cls._local.conn = conn
+        cls._local.key = (os.getpid(), path)
+        return conn
+
+
+class PyPiCache(SqliteCache):
+    """
+    Persistent cache of PyPi lookups: (index, name) -> latest version and description
+
+    Stored in a SQLite database in the Pipy cache directory, which is safe to share between processes, ex. several
+    notebook kernels on the same node. Entries are kept per package index (see :obj:`IndexClient.configure`), so
+    versions, missing packages and `ETag`s of one index are never used for another. Entries expire after `ttl`
+    seconds (`PIPY_CACHE_TTL`, defaults to 1 hour), lookups of packages which do not exist expire after
+    `negative_ttl` seconds. Expired entries keep their `ETag`, so they can be revalidated with a conditional request
+    to the same index instead of being downloaded again.
+
+    Usage
+        PyPiCache.set('boxsdk', version='2.7.1', description='Official Box Python SDK', etag='"abc"')
+        PyPiCache.get('boxsdk') # {'name': 'boxsdk', 'version': '2.7.1', ..., 'expired': False}
+    """
+    log = get_logger()
+    ttl = int(os.environ.get('PIPY_CACHE_TTL', 3600))
+    negative_ttl = int(os.environ.get('PIPY_CACHE_NEGATIVE_TTL', 300))
+    schema = 'CREATE TABLE IF NOT EXISTS lookups (' \
+             'idx TEXT NOT NULL, ' \
+             'key TEXT NOT NULL, ' \
+             'name TEXT NOT NULL, ' \
+             'found INTEGER NOT NULL, ' \
+             'version TEXT, ' \
+             'description TEXT, ' \
+             'etag TEXT, ' \
+             'fetched REAL NOT NULL, ' \
+             'PRIMARY KEY (idx, key))'
+    _local = threading.local()
+
+    @classmethod
+    def get_path(cls):
+        return os.path.join(get_cache_dir(), 'pypi.sqlite3')
+
+    @classmethod
+    def get_index(cls):
+        """
+        Return the key of the package index which is queried now, credentials of the index URL are not stored
+        """
+        return get_cache_key(IndexClient.get_index_url(), IndexClient.get_json_url())[:16]
+
+    @classmethod
+    def get(cls, name: str, ttl: int = None):
+        """
+        Return the cached lookup of `name` on the current index, or None if it was never looked up
+
+        Returns:
+            :obj:`dict`: name, found, version, description, etag, fetched and expired
+        """
+        row = cls.get_connection().execute('SELECT * FROM lookups WHERE idx = ? AND key = ?',
+                                           (cls.get_index(), normalize_name(name))).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['found'] = bool(entry['found'])
+        if ttl is None:
+            ttl = cls.ttl if entry['found'] is True else cls.negative_ttl
+        entry['expired'] = time.time() - entry['fetched'] > ttl
+        return entry
+
+    @classmethod
+    def set(cls, name: str, version: str = None, description: str = None, etag: str = None, found: bool = True):
+        cls.get_connection().execute('INSERT OR REPLACE INTO lookups '
+                                     '(idx, key, name, found, version, description, etag, fetched) '
+                                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                     (cls.get_index(), normalize_name(name), name, int(found), version, description,
+                                      etag, time.time()))
+
+    @classmethod
+    def touch(cls, name: str):
+        """
+        Mark an expired entry as fresh again, ex. after the index answered `304 Not Modified`
+        """
+        cls.get_connection().execute('UPDATE lookups SET fetched = ? WHERE idx = ? AND key = ?',
+                                     (time.time(), cls.get_index(), normalize_name(name)))
+
+    @classmethod
+    def delete(cls, name: str):
+        cls.get_connection().execute('DELETE FROM lookups WHERE idx = ? AND key = ?',
+                                     (cls.get_index(), normalize_name(name)))
+
+    @classmethod
+    def clear(cls):
+        """
+        Delete the cached lookups of every index
+        """
+        cls.get_connection().execute('DELETE FROM lookups')
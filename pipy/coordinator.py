@@ -0,0 +1,507 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import copy
+import dataclasses
+import functools
+import importlib
+import inspect
+import json
+import os
+import threading
+import time
+
+from .cache import JsonCache, get_cache_dir, get_cache_key
+from .dataclass import DataClass
+from .distributions import DistributionIndex
+from .interpreter import Interpreter
+from .logging import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class LockTimeout(TimeoutError):
+    """
+    Raised when the install lock of the environment could not be acquired within the lock timeout
+    """
+    pass
+
+
+class FileLock(object):
+    """
+    Exclusive lock shared by the threads of this process and by other processes, held with `flock` (`msvcrt.locking`
+    on Windows) on an open lock file. The lock is released by the OS if the holder dies. The holder writes its pid and
+    operation into the lock file, so waiters can report who they wait for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+        self._lock = threading.Lock()
+
+    def lock_file(self, fd: int):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+    def unlock_file(self, fd: int):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def try_acquire(self):
+        """
+        Take the file lock without blocking, the thread lock must be held
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            self.lock_file(fd)
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def acquire(self, timeout: float = None, holder: dict = None, on_wait=None):
+        """
+        Block until the lock is held
+
+        Args:
+            timeout(:obj:`float`, optional): seconds to wait, None to wait forever
+            holder(:obj:`dict`, optional): written to the lock file while the lock is held
+            on_wait(:obj:`callable`, optional): called once with the holder of the lock when the lock is busy
+
+        Returns:
+            :obj:`float`: seconds waited
+
+        Raises:
+            :obj:`LockTimeout` if the lock was not acquired within `timeout`
+        """
+        started = time.perf_counter()
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LockTimeout(f"Timed out after {timeout}s waiting for {self.path}")
+        delay = 0.005
+        try:
+            while not self.try_acquire():
+                if on_wait is not None:
+                    on_wait(self.get_holder())
+                    on_wait = None
+                elapsed = time.perf_counter() - started
+                if timeout is not None and elapsed >= timeout:
+                    raise LockTimeout(f"Timed out after {timeout}s waiting for {self.path}, " + \
+                                      f"held by {self.get_holder()}")
+                time.sleep(delay if timeout is None else min(delay, timeout - elapsed))
+                delay = min(delay * 2, 0.25)
+        except BaseException:
+            self._lock.release()
+            raise
+        if holder is not None:
+            try:
+                os.ftruncate(self.fd, 0)
+                os.write(self.fd, json.dumps(holder).encode('utf-8'))
+            except OSError:
+                pass
+        return time.perf_counter() - started
+
+    def release(self):
+        fd, self.fd = self.fd, None
+        try:
+            self.unlock_file(fd)
+        finally:
+            os.close(fd)
+            self._lock.release()
+
+    def get_holder(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            return None
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=False, unsafe_hash=False, frozen=False)
+class LockMetrics(DataClass):
+    """
+    Dataclass which represents the lock waits of one kind of operation in this process
+
+    Parameters
+        operation(:obj:`str`): ex. `install`
+        acquisitions(:obj:`int`): times the install lock was acquired
+        contended(:obj:`int`): acquisitions which had to wait for another thread or process
+        coalesced(:obj:`int`): requests which were answered with the result of an identical request
+        total_wait(:obj:`float`): seconds spent waiting for the lock or for an identical request
+        max_wait(:obj:`float`): longest wait in seconds
+        last_wait(:obj:`float`): last wait in seconds
+        total_held(:obj:`float`): seconds the lock was held
+    """
+    operation: str = dataclasses.field(init=True)
+    acquisitions: int = dataclasses.field(init=True, default=0)
+    contended: int = dataclasses.field(init=True, default=0)
+    coalesced: int = dataclasses.field(init=True, default=0)
+    total_wait: float = dataclasses.field(init=True, default=0.0)
+    max_wait: float = dataclasses.field(init=True, default=0.0)
+    last_wait: float = dataclasses.field(init=True, default=0.0)
+    total_held: float = dataclasses.field(init=True, default=0.0)
+
+    def get_mean_wait(self):
+        waits = self.acquisitions + self.coalesced
+        return self.total_wait / waits if waits > 0 else 0.0
+
+
+class InstallCoordinator(object):
+    """
+    Serializes the commands which change an environment, across the threads and processes of a node
+
+    Several notebooks attached to one cluster share one `site-packages`. Every mutating operation of
+    :obj:`PackageHelper` holds an exclusive file lock of the target environment (keyed by its prefix) in the `locks`
+    directory of the Pipy cache while pip runs. Requests for the same packages and options are coalesced: threads
+    and tasks of this process which arrive while an identical request runs wait for it and get a copy of its result,
+    and a process which waited for the lock while another process ran the identical request reuses the result the
+    other process stored next to the lock file, unless the environment changed since. Nested operations (ex. an
+    install inside a :obj:`Transaction`) run under the lock already held.
+
+    Lock waits are recorded per operation in :obj:`LockMetrics`. The coordinator is disabled with
+    `PIPY_COORDINATE=0`, the lock timeout is set with `PIPY_LOCK_TIMEOUT` (seconds, waits forever by default).
+
+    Usage
+        Pipy.install('boxsdk') # in two notebooks at once, pip runs once
+        InstallCoordinator.get_metrics()['install'] # LockMetrics(operation='install', acquisitions=1, coalesced=1,...)
+        with InstallCoordinator.hold('restore'):
+            ...
+    """
+    log = get_logger()
+    enabled = os.environ.get('PIPY_COORDINATE', '1').lower() not in ('0', 'false', 'no')
+    timeout = float(os.environ['PIPY_LOCK_TIMEOUT']) if os.environ.get('PIPY_LOCK_TIMEOUT') else None
+    metrics = {}
+    _locks = {}
+    _pending = {}
+    _lock = threading.Lock()
+    _held = contextvars.ContextVar('pipy_coordinator', default=False)
+
+    @classmethod
+    def configure(cls, enabled: bool = None, timeout: float = None):
+        if enabled is not None:
+            cls.enabled = enabled
+        cls.timeout = timeout
+
+    @classmethod
+    def get_environment_key(cls):
+        return get_cache_key(os.path.normcase(os.path.abspath(Interpreter.discover()['prefix'])))[:16]
+
+    @classmethod
+    def get_lock(cls):
+        path = os.path.join(get_cache_dir(name='locks'), f"{cls.get_environment_key()}.lock")
+        with cls._lock:
+            if path not in cls._locks:
+                cls._locks[path] = FileLock(path=path)
+            return cls._locks[path]
+
+    @classmethod
+    def get_request_key(cls, operation: str, names, options: dict = None):
+        if isinstance(names, str):
+            names = [names]
+        names = sorted(' '.join(str(name).split()).lower() for name in names or [])
+        return get_cache_key(operation, names, options or {}, Interpreter.get_executable())
+
+    @classmethod
+    def get_metrics(cls):
+        """
+        Return a copy of the :obj:`LockMetrics` of each operation
+        """
+        with cls._lock:
+            return {operation: dataclasses.replace(metrics) for operation, metrics in cls.metrics.items()}
+
+    @classmethod
+    def reset_metrics(cls):
+        with cls._lock:
+            cls.metrics = {}
+
+    @classmethod
+    def record(cls, operation: str, wait: float = None, contended: bool = False, coalesced: bool = False):
+        """
+        Record a lock acquisition or a coalesced request, `wait` is None if the wait was already recorded
+        """
+        with cls._lock:
+            metrics = cls.metrics.setdefault(operation, LockMetrics(operation=operation))
+            if coalesced is True:
+                metrics.coalesced += 1
+            else:
+                metrics.acquisitions += 1
+            metrics.contended += int(contended)
+            if wait is not None:
+                metrics.total_wait += wait
+                metrics.max_wait = max(metrics.max_wait, wait)
+                metrics.last_wait = wait
+
+    @classmethod
+    def acquire(cls, operation: str, names=None):
+        """
+        Acquire the install lock of the environment
+
+        Returns:
+            :obj:`tuple`: (lock, seconds waited)
+        """
+        if isinstance(names, str):
+            names = [names]
+        lock = cls.get_lock()
+        contended = []
+
+        def on_wait(holder):
+            contended.append(holder)
+            cls.log.info(f"Waiting for the install lock of {Interpreter.discover()['prefix']}, held by {holder}")
+
+        holder = {'pid': os.getpid(), 'operation': operation, 'names': list(names or []), 'since': time.time()}
+        wait = lock.acquire(timeout=cls.timeout, holder=holder, on_wait=on_wait)
+        if len(contended) > 0:
+            cls.log.info(f"Acquired the install lock for {operation} after waiting {wait:.3f}s")
+        cls.record(operation=operation, wait=wait, contended=len(contended) > 0)
+        return lock, wait
+
+    @classmethod
+    def release(cls, lock: FileLock, operation: str, acquired: float):
+        try:
+            lock.release()
+        finally:
+            cls.record_held(operation=operation, held=time.perf_counter() - acquired)
+
+    @classmethod
+    def record_held(cls, operation: str, held: float):
+        with cls._lock:
+            cls.metrics.setdefault(operation, LockMetrics(operation=operation)).total_held += held
+
+    @classmethod
+    @contextlib.contextmanager
+    def hold(cls, operation: str, names=None):
+        """
+        Hold the install lock of the environment inside the `with` block, does nothing if the current thread or task
+        already holds it or the coordinator is disabled
+        """
+        if cls.enabled is False or cls._held.get() is True:
+            yield
+            return
+        lock, _ = cls.acquire(operation=operation, names=names)
+        acquired = time.perf_counter()
+        token = cls._held.set(True)
+        try:
+            yield
+        finally:
+            cls._held.reset(token)
+            cls.release(lock=lock, operation=operation, acquired=acquired)
+
+    @classmethod
+    def get_state(cls):
+        return JsonCache(name='locks').get(key=cls.get_environment_key()) or {}
+
+    @classmethod
+    def set_state(cls, key: str, result=None, failed: bool = False):
+        """
+        Store the result of the last operation, which other processes may reuse until the environment changes
+        """
+        state = {'key': key, 'finished': time.time(),
+                 'mtimes': DistributionIndex.get_mtimes(DistributionIndex.get_paths())}
+        if failed is False:
+            try:
+                state['result'] = cls.encode(value=result)
+            except TypeError as e:
+                cls.log.debug(f"Result of {key} is not stored: {e}")
+        JsonCache(name='locks').set(key=cls.get_environment_key(), value=state)
+
+    @classmethod
+    def get_stored(cls, key: str, requested: float):
+        """
+        Return (True, result) if another process ran the request `key` while this process waited for the lock, and
+        the environment did not change since
+        """
+        state = cls.get_state()
+        if state.get('key') != key or 'result' not in state or state.get('finished', 0) < requested:
+            return False, None
+        if state.get('mtimes') != DistributionIndex.get_mtimes(DistributionIndex.get_paths()):
+            return False, None
+        try:
+            return True, cls.decode(value=state['result'])
+        except (ImportError, AttributeError, TypeError) as e:
+            cls.log.debug(f"Result of {key} can not be reused: {e}")
+            return False, None
+
+    @classmethod
+    def encode(cls, value):
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        if isinstance(value, list):
+            return [cls.encode(value=item) for item in value]
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            return {'__dataclass__': f"{type(value).__module__}:{type(value).__qualname__}",
+                    'fields': {field.name: cls.encode(value=getattr(value, field.name))
+                               for field in dataclasses.fields(value)}}
+        raise TypeError(f"{type(value).__name__} can not be stored")
+
+    @classmethod
+    def decode(cls, value):
+        if isinstance(value, list):
+            return [cls.decode(value=item) for item in value]
+        if isinstance(value, dict) and '__dataclass__' in value:
+            module, name = value['__dataclass__'].split(':')
+            dataclass = getattr(importlib.import_module(module), name)
+            fields = {key: cls.decode(value=item) for key, item in value['fields'].items()}
+            init = {field.name for field in dataclasses.fields(dataclass) if field.init is True}
+            obj = dataclass(**{key: item for key, item in fields.items() if key in init})
+            for key, item in fields.items():
+                if key not in init:
+                    setattr(obj, key, item)
+            return obj
+        return value
+
+    @classmethod
+    def join(cls, key: str):
+        """
+        Return (True, future) if this thread leads the request `key`, or (False, future) of the identical request
+        which is running
+        """
+        with cls._lock:
+            future = cls._pending.get(key)
+            if future is not None:
+                return False, future
+            future = concurrent.futures.Future()
+            cls._pending[key] = future
+            return True, future
+
+    @classmethod
+    def finish(cls, key: str, future: concurrent.futures.Future, result=None, error: BaseException = None):
+        with cls._lock:
+            cls._pending.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @classmethod
+    def coalesced(cls, operation: str, names, result, wait: float = None):
+        cls.record(operation=operation, wait=wait, coalesced=True)
+        cls.log.info(f"Reused the result of an identical {operation} of {names}" + \
+                     ("" if wait is None else f" after waiting {wait:.3f}s"))
+        return copy.deepcopy(result)
+
+    @classmethod
+    def run(cls, operation: str, names, options: dict, func):
+        """
+        Run `func()` under the install lock, or return the result of an identical request
+        """
+        if cls.enabled is False or cls._held.get() is True:
+            return func()
+        key = cls.get_request_key(operation=operation, names=names, options=options)
+        leader, future = cls.join(key=key)
+        if leader is False:
+            started = time.perf_counter()
+            return cls.coalesced(operation=operation, names=names, result=future.result(),
+                                 wait=time.perf_counter() - started)
+        try:
+            requested = time.time()
+            with cls.hold(operation=operation, names=names):
+                stored, result = cls.get_stored(key=key, requested=requested)
+                if stored is True:
+                    result = cls.coalesced(operation=operation, names=names, result=result)
+                else:
+                    try:
+                        result = func()
+                    except BaseException:
+                        cls.set_state(key=key, failed=True)
+                        raise
+                    cls.set_state(key=key, result=result)
+        except BaseException as e:
+            cls.finish(key=key, future=future, error=e)
+            raise
+        cls.finish(key=key, future=future, result=result)
+        return result
+
+    @classmethod
+    async def run_async(cls, operation: str, names, options: dict, func):
+        """
+        Coroutine version of :obj:`InstallCoordinator.run`, `func()` returns a coroutine. The lock is awaited in the
+        default executor, so the event loop is not blocked.
+        """
+        if cls.enabled is False or cls._held.get() is True:
+            return await func()
+        key = cls.get_request_key(operation=operation, names=names, options=options)
+        leader, future = cls.join(key=key)
+        if leader is False:
+            started = time.perf_counter()
+            result = await asyncio.wrap_future(future)
+            return cls.coalesced(operation=operation, names=names, result=result, wait=time.perf_counter() - started)
+        try:
+            requested = time.time()
+            acquire = asyncio.get_event_loop().run_in_executor(
+                None, functools.partial(cls.acquire, operation=operation, names=names))
+            try:
+                lock, _ = await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # The executor keeps waiting for the lock, release it once it is acquired
+                acquire.add_done_callback(lambda f: f.cancelled() or f.exception() is not None or
+                                          cls.release(lock=f.result()[0], operation=operation,
+                                                      acquired=time.perf_counter()))
+                raise
+            acquired = time.perf_counter()
+            token = cls._held.set(True)
+            try:
+                stored, result = cls.get_stored(key=key, requested=requested)
+                if stored is True:
+                    result = cls.coalesced(operation=operation, names=names, result=result)
+                else:
+                    try:
+                        result = await func()
+                    except BaseException:
+                        cls.set_state(key=key, failed=True)
+                        raise
+                    cls.set_state(key=key, result=result)
+            finally:
+                cls._held.reset(token)
+                cls.release(lock=lock, operation=operation, acquired=acquired)
+        except BaseException as e:
+            cls.finish(key=key, future=future, error=e)
+            raise
+        cls.finish(key=key, future=future, result=result)
+        return result
+
+
+def coordinated(operation: str):
+    """
+    Decorator which runs a :obj:`PackageHelper` classmethod through the :obj:`InstallCoordinator`. The first argument
+    after `cls` holds the package names, the other arguments except `progress` are part of the request key.
+
+    Usage
+        @classmethod
+        @coordinated('install')
+        def install_packages(cls, names, no_dependencies=True):
+            ...
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        names_arg = list(signature.parameters)[1]
+
+        def get_request(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            options = {key: value for key, value in list(bound.arguments.items())[1:] if key != 'progress'}
+            return options.pop(names_arg), options
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                names, options = get_request(args, kwargs)
+                return await InstallCoordinator.run_async(operation=operation, names=names, options=options,
+                                                          func=functools.partial(func, *args, **kwargs))
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                names, options = get_request(args, kwargs)
+                return InstallCoordinator.run(operation=operation, names=names, options=options,
+                                              func=functools.partial(func, *args, **kwargs))
+        return wrapper
+    return decorator
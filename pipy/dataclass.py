@@ -5,6 +5,7 @@ from .assertions import assert_type
 
 
 class DataClass(object):
+    __slots__ = ()
     log = get_logger()
 
     def __getitem__(self, key):
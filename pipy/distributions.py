@@ -0,0 +1,273 @@
+import dataclasses
+import hashlib
+import os
+import sys
+import threading
+
+from .dataclass import DataClass
+from .interpreter import Interpreter
+from .logging import get_logger
+from .metadata import MetadataReader
+from .requirements import Requirement, normalize_name
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=True, unsafe_hash=False, frozen=False)
+class InstalledDistribution(DataClass):
+    """
+    Dataclass which represents a single entry of the :obj:`DistributionIndex`
+
+    Parameters
+        name(:obj:`str`, required): Distribution name, as declared by the distribution
+        key(:obj:`str`, required): Normalized distribution name, used as the index key
+        version(:obj:`str`, required): Installed version
+        location(:obj:`str`, required): Directory the distribution is installed into, ex. site-packages
+        path(:obj:`str`, required): Path of the distribution's `*.dist-info` or `*.egg-info` metadata
+        top_level(:obj:`tuple`, optional): Names of the top-level modules provided by the distribution, read from
+            the metadata on the first call to :obj:`InstalledDistribution.get_top_level`
+
+    Warnings
+        Instances of this class are created by :obj:`DistributionIndex` and are not type checked.
+    """
+    name: str = dataclasses.field(init=True)
+    key: str = dataclasses.field(init=True)
+    version: str = dataclasses.field(init=True)
+    location: str = dataclasses.field(init=True, default=None)
+    path: str = dataclasses.field(init=True, default=None)
+    top_level: tuple = dataclasses.field(init=True, default=None)
+
+    def get_metadata(self):
+        """
+        Return the parsed core metadata (`METADATA` or `PKG-INFO`), read on first access
+        """
+        if getattr(self, '_metadata', None) is None:
+            self._metadata = MetadataReader.read_metadata(path=self.path)
+        return self._metadata
+
+    def get_requires(self, environment: dict = None):
+        """
+        Return the list of :obj:`Requirement` of the distribution which apply to `environment`, defaults to the
+        target :obj:`Interpreter` without any extras
+        """
+        if environment is None:
+            environment = Interpreter.get_marker_environment()
+        requires = []
+        for line in MetadataReader.read_requires(path=self.path, metadata=self.get_metadata()):
+            try:
+                req = Requirement(line)
+                if req.applies(environment=environment) is True:
+                    requires.append(req)
+            except ValueError as e:
+                DistributionIndex.log.warning(f"Skipping requirement of {self.name}: {e}")
+        return requires
+
+    def get_hash(self):
+        """
+        Return the digest of the installed files, see :obj:`MetadataReader.get_record_hash`, read on first access
+        """
+        if getattr(self, '_hash', None) is None:
+            self._hash = MetadataReader.get_record_hash(path=self.path)
+        return self._hash
+
+    def get_fingerprint(self):
+        """
+        Return a cheap fingerprint of the installed files, from the size and modification time of `RECORD` (or the
+        core metadata file when there is no `RECORD`). A reinstall of the same version changes the fingerprint.
+        """
+        filepath = MetadataReader.get_file(path=self.path, filename='RECORD')
+        if not os.path.isfile(filepath):
+            filepath = MetadataReader.get_metadata_file(path=self.path) or self.path
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+    def get_installer(self):
+        """
+        Return the name of the tool which installed the distribution, ex. `pip`, from the `INSTALLER` file
+        """
+        text = MetadataReader.read_text(path=self.path, filename='INSTALLER')
+        return None if text is None or len(text.strip()) == 0 else text.strip()
+
+    def get_source(self):
+        """
+        Return where the distribution was installed from, as a pip requirement URL, or None if it was installed from
+        a package index. Read from `direct_url.json`, ex. `git+https://github.com/org/repo@<commit>`
+
+        See: https://www.python.org/dev/peps/pep-0610/
+
+        Returns:
+            :obj:`tuple`: (url, editable), (None, False) for distributions installed from an index
+        """
+        direct_url = MetadataReader.read_json(path=self.path, filename='direct_url.json')
+        if direct_url is None or 'url' not in direct_url:
+            return None, False
+        url = direct_url['url']
+        if 'vcs_info' in direct_url:
+            vcs_info = direct_url['vcs_info']
+            return f"{vcs_info['vcs']}+{url}@{vcs_info.get('commit_id', vcs_info.get('requested_revision'))}", False
+        if 'archive_info' in direct_url and 'hash' in direct_url['archive_info']:
+            return f"{url}#{direct_url['archive_info']['hash'].replace(':', '=', 1)}", False
+        return url, direct_url.get('dir_info', {}).get('editable', False) is True
+
+    def get_top_level(self):
+        if self.top_level is None:
+            top_level = MetadataReader.read_top_level(path=self.path) or \
+                MetadataReader.read_record_top_level(path=self.path)
+            if not top_level:
+                top_level = (self.key.replace('-', '_'),)
+            self.top_level = top_level
+        return self.top_level
+
+
+class DistributionIndex(object):
+    """
+    In-process index of the installed distributions, keyed by normalized name
+
+    The index is built once from the environment and is reused by every lookup until it is invalidated. It is
+    invalidated when the modification time of one of the watched `site-packages` directories changes, or when Pipy
+    itself installs or uninstalls a package (see :obj:`DistributionIndex.invalidate`).
+
+    Usage
+        DistributionIndex.get('python-dateutil') # InstalledDistribution(name='python-dateutil', ...)
+        DistributionIndex.contains('not_a_real_package') # False
+    """
+    log = get_logger()
+    _lock = threading.RLock()
+    _distributions: dict = None
+    _mtimes: dict = None
+
+    @classmethod
+    def get_paths(cls):
+        """
+        Return the directories which are scanned for distributions and watched for changes, the `sys.path` of the
+        target :obj:`Interpreter`
+        """
+        return Interpreter.get_paths()
+
+    @classmethod
+    def get_mtimes(cls, paths: list):
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    @classmethod
+    def scan(cls, paths: list):
+        distributions = {}
+        for location in paths:
+            for name, version, path in MetadataReader.find_distributions(path=location):
+                key = normalize_name(name)
+                if key in distributions:
+                    # Follow `sys.path` precedence, the first distribution found wins
+                    continue
+                distributions[key] = InstalledDistribution(name=name,
+                                                           key=key,
+                                                           version=version,
+                                                           location=location,
+                                                           path=path
+                                                           )
+        return distributions
+
+    @classmethod
+    def is_stale(cls):
+        """
+        Returns True if the index has not been built yet, or a watched directory has changed since it was built
+        """
+        if cls._distributions is None or cls._mtimes is None:
+            return True
+        paths = cls.get_paths()
+        if set(paths) != set(cls._mtimes.keys()):
+            return True
+        return cls.get_mtimes(paths) != cls._mtimes
+
+    @classmethod
+    def refresh(cls, force: bool = False):
+        """
+        Rebuild the index if it is stale, or if `force` is True
+
+        Returns:
+            :obj:`dict`: normalized name -> :obj:`InstalledDistribution`
+        """
+        with cls._lock:
+            if force is True or cls.is_stale() is True:
+                paths = cls.get_paths()
+                mtimes = cls.get_mtimes(paths)
+                cls._distributions = cls.scan(paths)
+                cls._mtimes = mtimes
+            return cls._distributions
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Drop the index, the next lookup will rebuild it. Called after Pipy installs or uninstalls packages.
+        """
+        with cls._lock:
+            cls._distributions = None
+            cls._mtimes = None
+
+    @classmethod
+    def get(cls, name: str):
+        """
+        Return the :obj:`InstalledDistribution` for a package `name`, or None if the package is not installed
+        """
+        return cls.refresh().get(normalize_name(name))
+
+    @classmethod
+    def contains(cls, name: str):
+        return normalize_name(name) in cls.refresh()
+
+    @classmethod
+    def all(cls):
+        """
+        Return a list of every :obj:`InstalledDistribution` in the index
+        """
+        return list(cls.refresh().values())
+
+    @classmethod
+    def benchmark(cls, repeat: int = 5):
+        """
+        Measure the cold import of Pipy and of `pkg_resources` in a new interpreter, and a scan of the installed
+        distributions
+
+        Usage
+            DistributionIndex.benchmark() # {'import': {'min': 0.081, ...}, 'pkg_resources': {...}, 'scan': {...}}
+
+        Returns:
+            :obj:`dict`: `import`, `pkg_resources` and `scan` -> min, median and max latency in seconds,
+                `pkg_resources` is None if it is not installed, and `distributions` -> number of distributions
+        """
+        from .benchmark import measure, summarize
+        from .process import Process
+
+        def measure_import(statement):
+            code = f"import sys, time; sys.path.insert(0, {root!r}); started = time.perf_counter(); {statement}; " \
+                   f"print(time.perf_counter() - started)"
+            cmd = Process(args=[sys.executable, '-c', code], shell=False, timeout=None)
+            cmd.run(raise_exception=False)
+            return None if cmd.failed is True else float(cmd.stdout.strip().splitlines()[-1])
+
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        results = {}
+        for name, statement in (('import', 'from pipy import Pipy'), ('pkg_resources', 'import pkg_resources')):
+            latencies = [measure_import(statement) for _ in range(repeat)]
+            results[name] = None if None in latencies else summarize(latencies)
+        paths = cls.get_paths()
+        results['scan'] = measure(lambda: cls.scan(paths), repeat=repeat)
+        results['distributions'] = len(cls.scan(paths))
+        return results
+
+    @classmethod
+    def get_fingerprint(cls):
+        """
+        Return a digest of the interpreter and the name and version of every installed distribution. Two environments
+        with the same fingerprint have the same packages installed.
+        """
+        distributions = cls.refresh()
+        digest = hashlib.sha256(Interpreter.get_executable().encode('utf-8'))
+        for key in sorted(distributions.keys()):
+            digest.update(f"\n{key}=={distributions[key].version}".encode('utf-8'))
+        return digest.hexdigest()
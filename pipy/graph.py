@@ -0,0 +1,260 @@
+import collections
+import dataclasses
+import os
+import threading
+
+from .dataclass import DataClass
+from .distributions import DistributionIndex
+from .interpreter import Interpreter
+from .logging import get_logger
+from .requirements import as_version, normalize_name
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=True, unsafe_hash=False, frozen=False)
+class Conflict(DataClass):
+    """
+    Dataclass which represents an installed package whose requirement is not satisfied by a version of a dependency
+
+    Parameters
+        name(:obj:`str`, required): Name of the package which declares the requirement
+        version(:obj:`str`, required): Installed version of the package which declares the requirement
+        requirement(:obj:`str`, required): The requirement, ex. `python-dateutil>=2.6.1`
+        dependency(:obj:`str`, required): Name of the required package
+        dependency_version(:obj:`str`, required): Version of the required package which does not satisfy the
+            requirement, or None if the required package is not installed
+
+    See Also
+        :obj:`DependencyGraph.impact`
+        :obj:`DependencyGraph.check`
+    """
+    name: str = dataclasses.field(init=True)
+    version: str = dataclasses.field(init=True)
+    requirement: str = dataclasses.field(init=True)
+    dependency: str = dataclasses.field(init=True)
+    dependency_version: str = dataclasses.field(init=True, default=None)
+
+
+class DependencyGraph(object):
+    """
+    In-memory dependency graph of the installed environment
+
+    The graph is built once from the `Requires-Dist` metadata of every distribution in the :obj:`DistributionIndex`.
+    When the index changes, ex. after Pipy installs a package, only the distributions which were added, removed or
+    changed are re-read (see :obj:`DependencyGraph.sync`).
+
+    Usage
+        graph = DependencyGraph.current()
+        graph.dependents('python-dateutil', transitive=True) # ['pandas', 'matplotlib', ...]
+        graph.impact('python-dateutil', '1.5') # [Conflict(name='pandas', requirement='python-dateutil>=2.6.1', ...)]
+    """
+    log = get_logger()
+    _lock = threading.RLock()
+    _current = None
+    _current_source: dict = None
+
+    def __init__(self, distributions: dict = None, environment: dict = None):
+        self.environment = environment if environment is not None else Interpreter.get_marker_environment()
+        self.distributions = {}
+        self.requires = {}
+        self.required_by = {}
+        if distributions is not None:
+            for dist in distributions.values():
+                self.add(dist=dist)
+
+    def __len__(self):
+        return len(self.distributions)
+
+    def __contains__(self, name: str):
+        return normalize_name(name) in self.distributions
+
+    @classmethod
+    def current(cls):
+        """
+        Return the shared graph of the running environment, synchronized with the :obj:`DistributionIndex`, the
+        graph is rebuilt if the target :obj:`Interpreter` changed
+        """
+        with cls._lock:
+            distributions = DistributionIndex.refresh()
+            environment = Interpreter.get_marker_environment()
+            if cls._current is None or cls._current.environment != environment:
+                cls._current = cls(distributions=distributions, environment=environment)
+            elif cls._current_source is not distributions:
+                cls._current.sync(distributions=distributions)
+            cls._current_source = distributions
+            return cls._current
+
+    def add(self, dist):
+        """
+        Add or replace an :obj:`InstalledDistribution` and its requirements
+        """
+        if dist.key in self.distributions:
+            self.remove(name=dist.key)
+        requires = dist.get_requires(environment=self.environment)
+        self.distributions[dist.key] = dist
+        self.requires[dist.key] = requires
+        for req in requires:
+            self.required_by.setdefault(req.key, {})[dist.key] = req
+
+    def remove(self, name: str):
+        """
+        Remove a distribution and the edges of its requirements. Edges of packages which require it are kept, so
+        they can be reported as missing requirements.
+        """
+        key = normalize_name(name)
+        self.distributions.pop(key, None)
+        for req in self.requires.pop(key, []):
+            dependents = self.required_by.get(req.key)
+            if dependents is not None:
+                dependents.pop(key, None)
+                if len(dependents) == 0:
+                    del self.required_by[req.key]
+
+    def sync(self, distributions: dict):
+        """
+        Update the graph to match `distributions`, only re-reading the distributions which changed
+
+        Returns:
+            :obj:`tuple`: (added, removed, changed) lists of keys
+        """
+        added, removed, changed = [], [], []
+        for key in list(self.distributions.keys()):
+            if key not in distributions:
+                self.remove(name=key)
+                removed.append(key)
+        for key, dist in distributions.items():
+            existing = self.distributions.get(key)
+            if existing is None:
+                self.add(dist=dist)
+                added.append(key)
+            elif existing.version != dist.version or existing.path != dist.path:
+                self.add(dist=dist)
+                changed.append(key)
+        if len(added) + len(removed) + len(changed) > 0:
+            self.log.info(f"Updated dependency graph: {len(added)} added, {len(removed)} removed, " + \
+                          f"{len(changed)} changed")
+        return added, removed, changed
+
+    def dependencies(self, name: str, transitive: bool = False):
+        """
+        Return the keys of the packages required by `name`, in breadth-first order if `transitive` is True
+        """
+        return self.walk(name=name, edges=lambda key: (req.key for req in self.requires.get(key, [])),
+                         transitive=transitive)
+
+    def dependents(self, name: str, transitive: bool = False):
+        """
+        Return the keys of the installed packages which require `name`, in breadth-first order if `transitive`
+        is True
+        """
+        return self.walk(name=name, edges=lambda key: self.required_by.get(key, {}).keys(), transitive=transitive)
+
+    def walk(self, name: str, edges, transitive: bool = False):
+        key = normalize_name(name)
+        seen = {key}
+        found = []
+        queue = collections.deque([key])
+        while len(queue) > 0:
+            for next_key in edges(queue.popleft()):
+                if next_key in seen:
+                    continue
+                seen.add(next_key)
+                found.append(next_key)
+                if transitive is True:
+                    queue.append(next_key)
+        return found
+
+    def impact(self, name: str, version: str):
+        """
+        Return the installed packages which would break if package `name` is changed to `version`
+
+        Args:
+            name(:obj:`str`, required): package name
+            version(:obj:`str`, required): the new version, or None if the package would be removed
+
+        Returns:
+            :obj:`list`: list of :obj:`Conflict`, empty if no installed requirement would be broken
+        """
+        key = normalize_name(name)
+        conflicts = []
+        parsed_version = None if version is None else as_version(version)
+        for dependent, req in self.required_by.get(key, {}).items():
+            if parsed_version is None or req.is_satisfied_by(parsed_version) is False:
+                conflicts.append(Conflict(name=dependent,
+                                          version=self.distributions[dependent].version,
+                                          requirement=str(req),
+                                          dependency=key,
+                                          dependency_version=version
+                                          ))
+        return conflicts
+
+    def affected(self, name: str, version: str):
+        """
+        Return the keys of every package which directly or transitively depends on a package broken by changing
+        package `name` to `version`, see :obj:`DependencyGraph.impact`
+        """
+        affected = []
+        seen = set()
+        for conflict in self.impact(name=name, version=version):
+            for key in [conflict.name] + self.dependents(name=conflict.name, transitive=True):
+                if key not in seen:
+                    seen.add(key)
+                    affected.append(key)
+        return affected
+
+    def check(self):
+        """
+        Return every installed requirement which is currently not satisfied, similar to `pip check`
+
+        Returns:
+            :obj:`list`: list of :obj:`Conflict`
+        """
+        conflicts = []
+        for key, requires in self.requires.items():
+            for req in requires:
+                dependency = self.distributions.get(req.key)
+                if dependency is None or req.is_satisfied_by(dependency.version) is False:
+                    conflicts.append(Conflict(name=key,
+                                              version=self.distributions[key].version,
+                                              requirement=str(req),
+                                              dependency=req.key,
+                                              dependency_version=None if dependency is None else dependency.version
+                                              ))
+        return conflicts
+
+    @classmethod
+    def benchmark(cls, size: int = 1200, requires: int = 5, repeat: int = 5):
+        """
+        Measure the graph of a synthetic `site-packages` of `size` distributions, each requiring the next `requires`
+        distributions, so the last distribution is a transitive dependency of every other one
+
+        Usage
+            DependencyGraph.benchmark() # {'scan': {'min': 0.009, ...}, 'build': {...}, 'impact': {...}, ...}
+
+        Returns:
+            :obj:`dict`: `scan`, `build`, `sync`, `impact`, `dependents` and `transitive_dependents` -> min, median and
+                max latency in seconds
+        """
+        import functools
+        import tempfile
+        from .benchmark import measure
+
+        measure = functools.partial(measure, repeat=repeat)
+        with tempfile.TemporaryDirectory(prefix='pipy-graph-') as location:
+            for idx in range(size):
+                path = os.path.join(location, f"pipybench{idx:05d}-1.0.dist-info")
+                os.makedirs(path)
+                lines = ["Metadata-Version: 2.1", f"Name: pipybench{idx:05d}", "Version: 1.0"]
+                lines.extend(f"Requires-Dist: pipybench{dep:05d} (>=1.0)"
+                             for dep in range(idx + 1, min(idx + 1 + requires, size)))
+                with open(os.path.join(path, 'METADATA'), 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+            results = {'scan': measure(lambda: DistributionIndex.scan([location]))}
+            # Each build reads the metadata of a new scan, distributions cache their metadata once read
+            results['build'] = measure(lambda: cls(distributions=DistributionIndex.scan([location])))
+            graph = cls(distributions=DistributionIndex.scan([location]))
+            results['sync'] = measure(lambda: graph.sync(distributions=DistributionIndex.scan([location])))
+            last = f"pipybench{size - 1:05d}"
+            results['impact'] = measure(lambda: graph.impact(name=last, version='0.1'))
+            results['dependents'] = measure(lambda: graph.dependents(name=last))
+            results['transitive_dependents'] = measure(lambda: graph.dependents(name=last, transitive=True))
+        return results
@@ -0,0 +1,197 @@
+import dataclasses
+import json
+import os
+import sys
+import sysconfig
+import threading
+
+from .dataclass import DataClass
+from .logging import get_logger
+from .requirements import Version, get_marker_environment
+
+# Printed by the target interpreter, importing `pip` only loads its version, not the CLI. The environment markers are
+# evaluated by `pipy/requirements.py` (argv[1]), which only depends on the standard library.
+DISCOVER_SOURCE = r'''
+import json, runpy, sys, sysconfig
+try:
+    import pip
+    version = pip.__version__
+except ImportError:
+    version = None
+print(json.dumps({'python': '.'.join(str(v) for v in sys.version_info[:3]), 'pip': version,
+                  'prefix': sys.prefix, 'paths': sys.path[1:],
+                  'site_packages': [sysconfig.get_path('purelib'), sysconfig.get_path('platlib')],
+                  'markers': runpy.run_path(sys.argv[1])['get_marker_environment']()}))
+'''
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=False, unsafe_hash=False, frozen=False)
+class PipCapabilities(DataClass):
+    """
+    Dataclass which represents the features of the target pip which Pipy uses when they are available
+
+    Parameters
+        version(:obj:`str`, optional): pip version, None if pip is not installed
+        report(:obj:`bool`, optional): `pip install --report` (22.2+)
+        dry_run(:obj:`bool`, optional): `pip install --dry-run` (22.2+)
+        json_list(:obj:`bool`, optional): `pip list --format json` (9.0+)
+        inspect(:obj:`bool`, optional): `pip inspect` (22.2+)
+        raw_progress(:obj:`bool`, optional): `pip install --progress-bar raw` (24.1+)
+    """
+    version: str = dataclasses.field(init=True, default=None)
+    report: bool = dataclasses.field(init=True, default=False)
+    dry_run: bool = dataclasses.field(init=True, default=False)
+    json_list: bool = dataclasses.field(init=True, default=False)
+    inspect: bool = dataclasses.field(init=True, default=False)
+    raw_progress: bool = dataclasses.field(init=True, default=False)
+
+    @classmethod
+    def from_version(cls, version: str):
+        if version is None:
+            return cls()
+        pip = Version(version)
+        return cls(version=version,
+                   report=pip >= Version('22.2'),
+                   dry_run=pip >= Version('22.2'),
+                   json_list=pip >= Version('9.0'),
+                   inspect=pip >= Version('22.2'),
+                   raw_progress=pip >= Version('24.1')
+                   )
+
+
+class Interpreter(object):
+    """
+    The Python interpreter whose environment Pipy manages, and its pip
+
+    pip is always run as `<interpreter> -m pip`, never from `PATH`, which on Databricks or conda often belongs to
+    another interpreter. The interpreter defaults to `sys.executable` and can be set to another interpreter or
+    virtual environment with the environment variable `PIPY_PYTHON` or :obj:`Interpreter.configure`. The pip version
+    and `sys.path` of another interpreter are discovered once with a single subprocess and cached.
+
+    Usage
+        Interpreter.configure('/opt/venvs/jobs') # or '/opt/venvs/jobs/bin/python'
+        Interpreter.get_pip_args('list')          # ['/opt/venvs/jobs/bin/python', '-m', 'pip', 'list']
+        Interpreter.get_capabilities().report     # True
+    """
+    log = get_logger()
+    executable: str = None
+    _info: dict = None
+    _capabilities: PipCapabilities = None
+    _lock = threading.RLock()
+
+    @classmethod
+    def resolve(cls, path: str):
+        """
+        Return the interpreter of `path`, which is either an interpreter or a virtual environment directory
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        if os.path.isdir(path):
+            for candidate in (os.path.join(path, 'bin', 'python'), os.path.join(path, 'Scripts', 'python.exe')):
+                if os.path.isfile(candidate):
+                    return candidate
+            raise FileNotFoundError(f"No Python interpreter in {path}")
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Python interpreter {path} does not exist")
+        return path
+
+    @classmethod
+    def get_executable(cls):
+        if cls.executable is None:
+            path = os.environ.get('PIPY_PYTHON')
+            cls.executable = cls.resolve(path) if path else sys.executable
+        return cls.executable
+
+    @classmethod
+    def configure(cls, executable: str = None):
+        """
+        Manage the environment of another interpreter or virtual environment, or of `sys.executable` if None
+        """
+        from .distributions import DistributionIndex
+        from .worker import PipWorker
+        with cls._lock:
+            cls.executable = sys.executable if executable is None else cls.resolve(executable)
+            cls._info = None
+            cls._capabilities = None
+        DistributionIndex.invalidate()
+        PipWorker.close_all()
+        cls.log.info(f"Managing the environment of {cls.executable}")
+        return cls.executable
+
+    @classmethod
+    def is_current(cls):
+        """
+        Returns True if the target is the running interpreter. Symbolic links are not resolved, the interpreter of a
+        virtual environment is usually a link to the base interpreter.
+        """
+        return os.path.abspath(cls.get_executable()) == os.path.abspath(sys.executable)
+
+    @classmethod
+    def get_pip_args(cls, *args):
+        return [cls.get_executable(), '-m', 'pip'] + list(args)
+
+    @classmethod
+    def discover(cls):
+        """
+        Return the Python version, pip version, prefix, `sys.path`, purelib and platlib directories and environment
+        markers of the target interpreter, discovered once
+
+        Returns:
+            :obj:`dict`
+        """
+        with cls._lock:
+            if cls._info is None:
+                if cls.is_current() is True:
+                    from .distributions import DistributionIndex
+                    pip = DistributionIndex.get(name='pip')
+                    cls._info = {'python': '.'.join(str(v) for v in sys.version_info[:3]),
+                                 'pip': pip.version if pip is not None else None,
+                                 'prefix': sys.prefix,
+                                 'paths': None,
+                                 'site_packages': [sysconfig.get_path('purelib'), sysconfig.get_path('platlib')],
+                                 'markers': get_marker_environment()}
+                else:
+                    from .process import Process
+                    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'requirements.py')
+                    cmd = Process(args=[cls.get_executable(), '-c', DISCOVER_SOURCE, source], timeout=60,
+                                  worker=False)
+                    cmd.run(raise_exception=True)
+                    cls._info = json.loads(cmd.stdout)
+                cls.log.info(f"Python({cls._info['python']}) at {cls.get_executable()} with pip({cls._info['pip']})")
+            return cls._info
+
+    @classmethod
+    def get_paths(cls):
+        """
+        Return the `sys.path` directories of the target interpreter, the live `sys.path` for the running interpreter
+        """
+        if cls.is_current() is True:
+            paths = sys.path
+        else:
+            paths = cls.discover()['paths']
+        return [path for path in paths if len(path) > 0 and os.path.isdir(path)]
+
+    @classmethod
+    def get_marker_environment(cls, extra: str = ''):
+        """
+        Return the values of the environment marker variables of the target interpreter, which decide the
+        requirements that apply to the environment, see :obj:`get_marker_environment`
+        """
+        if cls.is_current() is True:
+            return get_marker_environment(extra=extra)
+        return dict(cls.discover()['markers'], extra=extra)
+
+    @classmethod
+    def get_site_packages(cls):
+        """
+        Return the purelib and platlib directories which pip installs into in the target interpreter
+        """
+        return list(dict.fromkeys(os.path.normcase(os.path.realpath(path)) for path in cls.discover()['site_packages']))
+
+    @classmethod
+    def get_capabilities(cls):
+        """
+        Return the :obj:`PipCapabilities` of the target pip, which decide the fast paths Pipy uses
+        """
+        if cls._capabilities is None:
+            cls._capabilities = PipCapabilities.from_version(version=cls.discover()['pip'])
+        return cls._capabilities
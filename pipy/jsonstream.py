@@ -0,0 +1,151 @@
+import json
+
+WHITESPACE = ' \t\n\r'
+
+
+class JsonArrayStream(object):
+    """
+    Incremental parser which yields the items of a JSON array as the document arrives in chunks
+
+    The array is either the whole document (`key=None`, ex. `pip list --format json`) or the value of `key` in a
+    top-level object (ex. `installed` in `pip inspect`). Only the unparsed tail of the document is buffered, so memory
+    is bounded by the largest item and not by the document. The other values of the top-level object are kept in
+    `document`.
+
+    Usage
+        stream = JsonArrayStream(key='installed')
+        for chunk in chunks:
+            for item in stream.feed(chunk):
+                print(item['metadata']['name'])
+        stream.close()
+        stream.document['pip_version']
+    """
+
+    def __init__(self, key: str = None):
+        self.key = key
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.document = {}
+        self.count = 0
+        # start -> (key -> value ->)* array -> (item ->)* end -> (key -> value ->)* done
+        self.state = 'start'
+        self.current_key = None
+
+    def skip(self, chars: str = ''):
+        """
+        Skip whitespace and `chars`, returns False if the end of the buffer was reached
+        """
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE + chars:
+            self.pos += 1
+        return self.pos < len(self.buffer)
+
+    def expect(self, char: str):
+        if self.buffer[self.pos] != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of the JSON document, " + \
+                             f"got '{self.buffer[self.pos]}'")
+        self.pos += 1
+
+    def decode(self, final: bool = False):
+        """
+        Decode the value at the current position, returns (False, None) if it is not complete yet
+        """
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            if final is True:
+                raise
+            return False, None
+        # A number at the end of the buffer may continue in the next chunk
+        if end == len(self.buffer) and isinstance(value, (int, float)) and final is False:
+            return False, None
+        self.pos = end
+        return True, value
+
+    def feed(self, text: str, final: bool = False):
+        """
+        Parse the next chunk of the document
+
+        Returns:
+            :obj:`list`: items of the array completed by this chunk
+        """
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        items = []
+        while self.skip() is True:
+            if self.state == 'start':
+                if self.key is None:
+                    self.expect('[')
+                    self.state = 'array'
+                else:
+                    self.expect('{')
+                    self.state = 'key'
+            elif self.state == 'key':
+                if self.buffer[self.pos] == '}':
+                    self.pos += 1
+                    self.state = 'done'
+                    continue
+                complete, key = self.decode(final=final)
+                if complete is False:
+                    break
+                self.current_key = key
+                self.state = 'colon'
+            elif self.state == 'colon':
+                self.expect(':')
+                if self.current_key == self.key:
+                    if self.skip() is False:
+                        self.state = 'array_start'
+                        break
+                    self.expect('[')
+                    self.state = 'array'
+                else:
+                    self.state = 'value'
+            elif self.state == 'array_start':
+                self.expect('[')
+                self.state = 'array'
+            elif self.state == 'value':
+                complete, value = self.decode(final=final)
+                if complete is False:
+                    break
+                self.document[self.current_key] = value
+                self.state = 'next_key'
+            elif self.state == 'next_key':
+                if self.buffer[self.pos] == '}':
+                    self.pos += 1
+                    self.state = 'done'
+                else:
+                    self.expect(',')
+                    self.state = 'key'
+            elif self.state == 'array':
+                if self.buffer[self.pos] == ']':
+                    self.pos += 1
+                    self.state = 'next_key' if self.key is not None else 'done'
+                    continue
+                complete, item = self.decode(final=final)
+                if complete is False:
+                    break
+                items.append(item)
+                self.count += 1
+                self.state = 'next_item'
+            elif self.state == 'next_item':
+                if self.buffer[self.pos] == ']':
+                    self.pos += 1
+                    self.state = 'next_key' if self.key is not None else 'done'
+                else:
+                    self.expect(',')
+                    self.state = 'array'
+            else:
+                raise ValueError(f"Unexpected data after the end of the JSON document at offset {self.pos}")
+        return items
+
+    def close(self):
+        """
+        Parse the rest of the document, raises :obj:`ValueError` if it is incomplete
+
+        Returns:
+            :obj:`list`: items of the array which were not returned yet
+        """
+        items = self.feed(text='', final=True)
+        if self.state != 'done':
+            raise ValueError(f"Incomplete JSON document, {self.count} items were parsed")
+        return items
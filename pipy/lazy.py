@@ -0,0 +1,286 @@
+import importlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import sys
+import threading
+import types
+
+from .distributions import DistributionIndex
+from .interpreter import Interpreter
+from .logging import get_logger
+from .package import PackageHelper
+from .requirements import Requirement
+
+
+class RequireLoader(importlib.abc.Loader):
+    """
+    Loader of a module returned by :obj:`require`, which `importlib.util.LazyLoader` executes on the first attribute
+    access: the pending requirements are installed, then the real module is executed into the same module object
+    """
+
+    def __init__(self, requirement: Requirement, module: str, deferred: bool = False):
+        self.requirement = requirement
+        self.module = module
+        # True if the distribution was not installed, `module` is a placeholder until its top-level module is known
+        self.deferred = deferred
+
+    def create_module(self, spec):
+        return None
+
+    def exec_module(self, module):
+        try:
+            # The other requirements of the batch may fail, only a missing module of this one raises
+            LazyRequire.resolve(raise_exception=False)
+            if LazyRequire.is_satisfied(requirement=self.requirement) is False:
+                dist = DistributionIndex.get(self.requirement.key)
+                raise ModuleNotFoundError(f"Failed to install {self.requirement}" + \
+                                          ('' if dist is None else f", {dist.version} is installed"),
+                                          name=self.module)
+            if self.deferred is True:
+                self.module = LazyRequire.rename(module=module, requirement=self.requirement, name=self.module)
+                self.deferred = False
+                existing = sys.modules.get(self.module)
+                if existing is not module:
+                    # The real module was imported meanwhile, the proxy shares its namespace
+                    module.__dict__.update(existing.__dict__)
+                    return
+            spec = LazyRequire.find_spec(requirement=self.requirement, name=self.module)
+            LazyRequire.set_spec(module=module, spec=spec)
+            real = spec.loader.create_module(spec)
+            if real is None:
+                spec.loader.exec_module(module)
+            else:
+                # Extension modules are created by their loader, the proxy takes over their namespace
+                spec.loader.exec_module(real)
+                module.__dict__.update(real.__dict__)
+        except BaseException:
+            # A new require() call creates a new proxy, instead of returning this half executed module
+            if sys.modules.get(self.module) is module:
+                sys.modules.pop(self.module)
+            raise
+
+
+class LazyRequire(object):
+    """
+    Lazy imports of packages which are installed on first use
+
+    :obj:`require` returns a module proxy built on `importlib.util.LazyLoader` and registers it in `sys.modules`,
+    so nothing is installed or imported until an attribute of the module is used. On first attribute access, every
+    requirement which is not satisfied by the installed environment yet is installed with one
+    :obj:`PackageHelper.install_packages` call, one `pip install` for all of the requirements declared so far, and
+    then the module is imported. :obj:`LazyRequire.resolve` installs the pending requirements right away.
+
+    The module is the top-level module of the distribution, see :obj:`LazyRequire.get_module_name`. When the
+    distribution is not installed yet, the proxy is registered under the normalized name, ex. `python_dateutil`, and
+    moved to the real top-level module, ex. `dateutil`, once the distribution is installed. A module which was
+    imported already is returned as is, a warning is logged if its installed version does not satisfy the
+    requirement.
+
+    Warnings
+        Attribute access of a module which is not executed yet is not thread safe before Python 3.12.
+
+    Usage
+        boxsdk = require('boxsdk>=2.7')
+        pandas = require('pandas==1.0.5', no_dependencies=False)
+        dateutil = require('python-dateutil')
+        boxsdk.Client # installs boxsdk and pandas with one `pip install`, then imports boxsdk
+    """
+    log = get_logger()
+    lock = threading.RLock()
+    # (no_dependencies, wheelhouse) -> list of requirements which are not installed yet
+    pending = {}
+    # module name -> proxy returned by require()
+    proxies = {}
+
+    @classmethod
+    def get_module_name(cls, requirement: Requirement):
+        """
+        Return the top-level module of the installed distribution: the module named after the distribution, ex.
+        `attrs`, else its only public top-level module, ex. `dateutil` for `python-dateutil` or `yaml` for `PyYAML`
+
+        Returns:
+            :obj:`str`: the module name, or None if the distribution is not installed
+
+        Raises:
+            :obj:`ValueError` if the distribution has several top-level modules and none is named after it
+        """
+        dist = DistributionIndex.get(requirement.key)
+        if dist is None:
+            return None
+        name = requirement.key.replace('-', '_')
+        top_level = dist.get_top_level()
+        if name in top_level:
+            return name
+        public = [module for module in top_level if not module.startswith('_')]
+        if len(public) == 1:
+            return public[0]
+        raise ValueError(f"{requirement} provides the modules {', '.join(top_level)}, pass module= to require()")
+
+    @classmethod
+    def rename(cls, module, requirement: Requirement, name: str):
+        """
+        Register the proxy `module` of a distribution which was just installed under its top-level module, instead of
+        the placeholder `name`
+
+        Returns:
+            :obj:`str`: the module name
+        """
+        with cls.lock:
+            real_name = cls.get_module_name(requirement=requirement)
+            if real_name is None:
+                raise ModuleNotFoundError(f"{requirement} is not installed", name=name)
+            if real_name != name:
+                cls.log.info(f"Module of {requirement} is {real_name}")
+                if sys.modules.get(name) is module:
+                    sys.modules.pop(name)
+                if cls.proxies.get(name) is module:
+                    cls.proxies.pop(name)
+                if sys.modules.get(real_name) is None:
+                    sys.modules[real_name] = module
+                    cls.proxies[real_name] = module
+            return real_name
+
+    @classmethod
+    def is_satisfied(cls, requirement: Requirement):
+        if requirement.applies(environment=Interpreter.get_marker_environment()) is False:
+            return True
+        dist = DistributionIndex.get(requirement.key)
+        return dist is not None and requirement.is_satisfied_by(dist.version)
+
+    @classmethod
+    def require(cls, requirement: str, module: str = None, no_dependencies: bool = True, wheelhouse: bool = False):
+        """
+        See :obj:`require`
+        """
+        requirement = Requirement(requirement)
+        name = module or cls.get_module_name(requirement=requirement)
+        deferred = name is None
+        if deferred is True:
+            # Renamed to the top-level module of the distribution once it is installed, see `LazyRequire.rename`
+            name = requirement.key.replace('-', '_')
+        with cls.lock:
+            existing = sys.modules.get(name)
+            if existing is not None:
+                if cls.is_satisfied(requirement=requirement) is True:
+                    pass
+                elif existing is cls.proxies.get(name) and type(existing) is not types.ModuleType:
+                    # Not executed yet, `type()` does not trigger the load
+                    cls.pending.setdefault((no_dependencies, wheelhouse), []).append(requirement)
+                else:
+                    cls.log.warning(f"Module {name} is imported already and does not satisfy {requirement}, use " + \
+                                    "Pipy.install(..., reload=True) to upgrade it")
+                return existing
+            if cls.is_satisfied(requirement=requirement) is False:
+                cls.pending.setdefault((no_dependencies, wheelhouse), []).append(requirement)
+            loader = importlib.util.LazyLoader(RequireLoader(requirement=requirement, module=name, deferred=deferred))
+            spec = importlib.machinery.ModuleSpec(name, loader)
+            proxy = importlib.util.module_from_spec(spec)
+            sys.modules[name] = proxy
+            cls.proxies[name] = proxy
+            loader.exec_module(proxy)
+        return proxy
+
+    @classmethod
+    def resolve(cls, raise_exception: bool = True):
+        """
+        Install every pending requirement which is not satisfied yet, with one `pip install` per `no_dependencies` and
+        `wheelhouse`
+
+        Args:
+            raise_exception(:obj:`bool`, optional): If True, raise :obj:`ModuleNotFoundError` if a requirement failed
+                to install. Defaults to True.
+
+        Returns:
+            :obj:`list`: list of :obj:`PyPiPackage`, PyPiPackage.installed is False for each package which failed to
+                install
+        """
+        with cls.lock:
+            pending, cls.pending = cls.pending, {}
+            DistributionIndex.invalidate()
+            packages = []
+            for (no_dependencies, wheelhouse), requirements in sorted(pending.items()):
+                # Another process may have installed some of them meanwhile
+                requirements = [req for req in requirements if cls.is_satisfied(requirement=req) is False]
+                names = cls.merge(requirements=requirements)
+                if len(names) == 0:
+                    continue
+                cls.log.info(f"Installing {len(names)} required packages: {', '.join(names)}")
+                packages.extend(PackageHelper.install_packages(names=names, no_dependencies=no_dependencies,
+                                                               wheelhouse=wheelhouse))
+            if len(packages) > 0:
+                DistributionIndex.invalidate()
+                importlib.invalidate_caches()
+            failed = [pkg for pkg in packages if pkg.installed is False]
+            if len(failed) > 0 and raise_exception is True:
+                raise ModuleNotFoundError("Failed to install " + \
+                                          ', '.join(f"PyPiPackage({pkg.name})({pkg.version})" for pkg in failed))
+            return packages
+
+    @classmethod
+    def merge(cls, requirements: list):
+        """
+        Return one requirement per package, ex. `boxsdk>=2.7,<3` for `boxsdk>=2.7` and `boxsdk<3`
+        """
+        merged = {}
+        for req in requirements:
+            merged.setdefault(req.key, []).append(req)
+        names = []
+        for reqs in merged.values():
+            specifiers = list(dict.fromkeys(str(req.specifier) for req in reqs if req.specifier))
+            names.append(str(reqs[0]) if len(reqs) == 1 else reqs[0].name + ','.join(specifiers))
+        return names
+
+    @classmethod
+    def find_spec(cls, requirement: Requirement, name: str):
+        """
+        Return the spec of the real module `name`, the proxy in `sys.modules` is not consulted
+        """
+        parent = name.rpartition('.')[0]
+        path = importlib.import_module(parent).__path__ if parent else None
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, 'find_spec', None)
+            spec = find_spec(name, path) if find_spec is not None else None
+            if spec is not None and spec.loader is not None:
+                return spec
+        dist = DistributionIndex.get(requirement.key)
+        hint = f", pass module= one of {', '.join(dist.get_top_level())}" if dist is not None else ''
+        raise ModuleNotFoundError(f"No module named '{name}' in {requirement}{hint}", name=name)
+
+    @classmethod
+    def set_spec(cls, module, spec):
+        module.__name__ = spec.name
+        module.__spec__ = spec
+        module.__loader__ = spec.loader
+        module.__package__ = spec.name if spec.submodule_search_locations is not None else spec.parent
+        if spec.submodule_search_locations is not None:
+            module.__path__ = list(spec.submodule_search_locations)
+        if spec.has_location is True:
+            module.__file__ = spec.origin
+            if spec.cached is not None:
+                module.__cached__ = spec.cached
+
+
+def require(requirement: str, module: str = None, no_dependencies: bool = True, wheelhouse: bool = False):
+    """
+    Return a lazy module of a requirement, which is installed if needed and imported on first attribute access
+
+    Requirements of modules which are first used together are installed with a single `pip install`, see
+    :obj:`LazyRequire`
+
+    Args:
+        requirement(:obj:`str`, required): package name or requirement, ex. `boxsdk>=2.7`
+        module(:obj:`str`, optional): name of the module to import. Defaults to the top-level module of the
+            distribution, ex. `dateutil` for `python-dateutil`, read from its metadata after it is installed.
+        no_dependencies(:obj:`bool`, optional): If True, do not install extra dependencies. Defaults to True.
+        wheelhouse(:obj:`bool`, optional): If True, install from the local `Wheelhouse`. Defaults to False.
+
+    Returns:
+        :obj:`module`: the module, executed on first attribute access
+
+    Usage
+        boxsdk = require('boxsdk>=2.7')
+        client = boxsdk.Client(...)
+    """
+    return LazyRequire.require(requirement=requirement, module=module, no_dependencies=no_dependencies,
+                               wheelhouse=wheelhouse)
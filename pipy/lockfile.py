@@ -0,0 +1,222 @@
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+
+from .coordinator import InstallCoordinator
+from .dataclass import DataClass
+from .distributions import DistributionIndex
+from .interpreter import Interpreter
+from .logging import get_logger
+from .process import Process
+from .requirements import normalize_name
+from .timeouts import Timeouts
+from .wheelhouse import Wheelhouse
+
+LOCKFILE_VERSION = 1
+# Never uninstalled by a restore, Pipy and the tools it runs pip with
+PROTECTED = ('pip', 'setuptools', 'wheel', 'pipy')
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=True, unsafe_hash=False, frozen=False)
+class LockedPackage(DataClass):
+    """
+    Dataclass which represents one package of a lockfile
+
+    Parameters
+        name(:obj:`str`, required): Package name
+        version(:obj:`str`, required): Installed version
+        hash(:obj:`str`, optional): Digest of the installed files, see :obj:`MetadataReader.get_record_hash`
+        fingerprint(:obj:`str`, optional): Cheap fingerprint of the installed files when the lockfile was written,
+            see :obj:`InstalledDistribution.get_fingerprint`
+        installer(:obj:`str`, optional): Tool which installed the package, ex. `pip`
+        source(:obj:`str`, optional): URL the package was installed from, or None if it was installed from an index
+        editable(:obj:`bool`, optional): True if the package is installed in editable mode
+
+    See Also
+        :obj:`Lockfile`
+    """
+    name: str = dataclasses.field(init=True)
+    version: str = dataclasses.field(init=True)
+    hash: str = dataclasses.field(init=True, default=None)
+    installer: str = dataclasses.field(init=True, default=None)
+    source: str = dataclasses.field(init=True, default=None)
+    editable: bool = dataclasses.field(init=True, default=False)
+    fingerprint: str = dataclasses.field(init=True, default=None)
+
+    def get_requirement(self):
+        """
+        Return the `pip install` argument which installs exactly this package
+        """
+        if self.source is None:
+            return f"{self.name}=={self.version}"
+        if self.editable is True:
+            return f"--editable={self.source}"
+        return f"{self.name} @ {self.source}"
+
+
+class Lockfile(object):
+    """
+    Writes the installed environment to a lockfile and restores an environment from it
+
+    A lockfile is a JSON document with the name, version, installed files digest and source of every installed
+    distribution. Restoring a lockfile only changes the difference with the installed environment: missing, changed
+    or rebuilt packages are installed with one `pip install --no-deps` command, and on request packages of the
+    target site-packages which are not in the lockfile are removed with one `pip uninstall` command. Restoring an
+    unchanged environment does not run pip.
+
+    Usage
+        Lockfile.write('pipy.lock')
+        Lockfile.restore('pipy.lock') # ([LockedPackage(name='boxsdk', version='2.7.1', ...)], [])
+        Lockfile.restore('pipy.lock', uninstall=True) # ([...], ['requests'])
+    """
+    log = get_logger()
+
+    @classmethod
+    def get_package(cls, dist):
+        source, editable = dist.get_source()
+        return LockedPackage(name=dist.name,
+                             version=dist.version,
+                             hash=dist.get_hash(),
+                             installer=dist.get_installer(),
+                             source=source,
+                             editable=editable,
+                             fingerprint=dist.get_fingerprint()
+                             )
+
+    @classmethod
+    def get_packages(cls):
+        """
+        Return a :obj:`LockedPackage` for every installed distribution, sorted by name
+        """
+        return [cls.get_package(dist=dist) for dist in sorted(DistributionIndex.all(), key=lambda d: d.key)]
+
+    @classmethod
+    def create(cls):
+        """
+        Return the lockfile document of the installed environment
+        """
+        return {'version': LOCKFILE_VERSION,
+                'python': '.'.join(str(v) for v in sys.version_info[:3]),
+                'packages': [pkg.as_dict() for pkg in cls.get_packages()]}
+
+    @classmethod
+    def write(cls, path: str):
+        """
+        Write the lockfile of the installed environment to `path`, the file is replaced atomically
+
+        Returns:
+            :obj:`list`: list of :obj:`LockedPackage`
+        """
+        lock = cls.create()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.lock')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(lock, f, indent=2)
+                f.write('\n')
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        cls.log.info(f"Wrote {len(lock['packages'])} packages to {path}")
+        return [LockedPackage(**pkg) for pkg in lock['packages']]
+
+    @classmethod
+    def read(cls, path: str):
+        """
+        Returns:
+            :obj:`list`: list of :obj:`LockedPackage`
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            lock = json.load(f)
+        if lock.get('version') != LOCKFILE_VERSION:
+            raise ValueError(f"Unsupported lockfile version {lock.get('version')} in {path}")
+        return [LockedPackage(**pkg) for pkg in lock['packages']]
+
+    @classmethod
+    def diff(cls, packages: list):
+        """
+        Compare locked packages with the installed environment in one pass over each
+
+        A package is installed if it is missing, has another version or source, or if its installed files do not
+        match the locked digest. The digest is only computed for packages whose version and source match and whose
+        `RECORD` changed since the lockfile was written (by fingerprint), so an unchanged environment is compared
+        without reading any `RECORD`.
+
+        Returns:
+            :obj:`tuple`: (install, uninstall), the list of :obj:`LockedPackage` to install and the list of names of
+                installed packages which are not in the lockfile. Only packages installed in the purelib or platlib
+                of the target interpreter can be uninstalled, never pip, setuptools, wheel or Pipy.
+        """
+        distributions = DistributionIndex.refresh()
+        locked = {}
+        install = []
+        for pkg in packages:
+            key = normalize_name(pkg.name)
+            locked[key] = pkg
+            dist = distributions.get(key)
+            if dist is None or dist.version != pkg.version:
+                install.append(pkg)
+                continue
+            source, editable = dist.get_source()
+            if source != pkg.source or editable != pkg.editable:
+                install.append(pkg)
+            elif pkg.fingerprint is not None and dist.get_fingerprint() == pkg.fingerprint:
+                continue
+            elif pkg.hash is not None and dist.get_hash() != pkg.hash:
+                cls.log.warning(f"Package({pkg.name})({pkg.version}) does not match the locked files")
+                install.append(pkg)
+        site_packages = Interpreter.get_site_packages()
+        uninstall = [dist.name for key, dist in distributions.items()
+                     if key not in locked and key not in PROTECTED and
+                     os.path.normcase(os.path.realpath(os.path.dirname(dist.path))) in site_packages]
+        return install, uninstall
+
+    @classmethod
+    def restore(cls, path: str, uninstall: bool = False, wheelhouse: bool = False):
+        """
+        Make the installed environment match the lockfile at `path`
+
+        Args:
+            path(:obj:`str`, required): path of the lockfile
+            uninstall(:obj:`bool`, optional): If True, uninstall packages of the target site-packages which are not
+                in the lockfile, see :obj:`Lockfile.diff`. Defaults to False.
+            wheelhouse(:obj:`bool`, optional): If True, install packages from an index through the
+                :obj:`Wheelhouse`. Defaults to False.
+
+        Returns:
+            :obj:`tuple`: (installed, uninstalled) list of :obj:`LockedPackage` and list of names
+        """
+        # The environment is compared with the lockfile under the install lock, so no other process changes it
+        # in between
+        with InstallCoordinator.hold(operation='restore', names=[path]):
+            install, remove = cls.diff(packages=cls.read(path=path))
+            if uninstall is False:
+                remove = []
+            if len(install) == 0 and len(remove) == 0:
+                cls.log.info(f"Environment matches {path}")
+                return [], []
+            try:
+                if len(remove) > 0:
+                    cls.log.info(f"Uninstalling {len(remove)} packages which are not in {path}: {', '.join(remove)}")
+                    cmd = Process(args=Interpreter.get_pip_args('uninstall', '--yes', *remove), shell=False,
+                                  **Timeouts.get_kwargs(operation='uninstall', packages=len(remove)))
+                    cmd.run(raise_exception=True)
+                if len(install) > 0:
+                    cls.log.info(f"Installing {len(install)} packages from {path}: " + \
+                                 f"{', '.join(f'{p.name}({p.version})' for p in install)}")
+                    args = Interpreter.get_pip_args('install', '--no-deps', '--force-reinstall',
+                                                    *[p.get_requirement() for p in install])
+                    if wheelhouse is True:
+                        Wheelhouse.ensure(names=[p.get_requirement() for p in install if p.source is None])
+                        args.extend(Wheelhouse.get_install_args())
+                    cmd = Process(args=args, shell=False,
+                                  **Timeouts.get_kwargs(operation='install', packages=len(install)))
+                    cmd.run(raise_exception=True)
+            finally:
+                # Also after a failed pip command, which may have changed part of the environment
+                DistributionIndex.invalidate()
+            return install, remove
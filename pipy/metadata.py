@@ -0,0 +1,229 @@
+import csv
+import email.parser
+import hashlib
+import json
+import os
+import re
+
+from .logging import get_logger
+
+RE_DIST_INFO = re.compile(
+        r'^(?P<name>.+?)-(?P<version>\d[^-]*)(?:-py\d[^-]*(?:-.+)?)?(?P<ext>\.dist-info|\.egg-info|\.egg)$')
+METADATA_EXTENSIONS = ('.dist-info', '.egg-info', '.egg')
+
+
+class MetadataReader(object):
+    """
+    Reads distribution metadata directly from `*.dist-info` and `*.egg-info` entries on disk
+
+    Replaces `pkg_resources`, which scans and parses every distribution on `sys.path` as soon as it is imported.
+    Directories are only listed when a scan is requested, and metadata files are only opened when a value which can
+    not be taken from the directory name is requested.
+
+    Usage
+        for name, version, path in MetadataReader.find_distributions('/usr/lib/python3/site-packages'):
+            print(name, version)
+        MetadataReader.read_metadata(path)['Summary']
+    """
+    log = get_logger()
+    parser = email.parser.HeaderParser()
+
+    @classmethod
+    def get_metadata_file(cls, path: str):
+        """
+        Return the path of the core metadata file (`METADATA` or `PKG-INFO`) of a distribution metadata entry
+        """
+        if os.path.isfile(path):
+            # Single file `*.egg-info`, written by distutils
+            return path
+        if path.endswith('.egg'):
+            path = os.path.join(path, 'EGG-INFO')
+        for filename in ('METADATA', 'PKG-INFO'):
+            filepath = os.path.join(path, filename)
+            if os.path.isfile(filepath):
+                return filepath
+        return None
+
+    @classmethod
+    def get_file(cls, path: str, filename: str):
+        if path.endswith('.egg'):
+            path = os.path.join(path, 'EGG-INFO')
+        return os.path.join(path, filename)
+
+    @classmethod
+    def read_text(cls, path: str, filename: str):
+        """
+        Return the content of a file in a distribution metadata directory, or None if it does not exist
+        """
+        if os.path.isfile(path):
+            return None
+        try:
+            with open(cls.get_file(path=path, filename=filename), 'r', encoding='utf-8', errors='replace') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @classmethod
+    def read_metadata(cls, path: str):
+        """
+        Parse the core metadata of a distribution metadata entry
+
+        Returns:
+            :obj:`email.message.Message`: headers of the `METADATA` or `PKG-INFO` file, or None if missing
+        """
+        filepath = cls.get_metadata_file(path=path)
+        if filepath is None:
+            return None
+        try:
+            with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+                return cls.parser.parse(f)
+        except OSError:
+            return None
+
+    @classmethod
+    def read_top_level(cls, path: str):
+        """
+        Return the top-level module names declared in `top_level.txt`, or None if the file does not exist
+        """
+        text = cls.read_text(path=path, filename='top_level.txt')
+        if text is None:
+            return None
+        return tuple(line.strip() for line in text.splitlines() if len(line.strip()) > 0)
+
+    @classmethod
+    def read_record_top_level(cls, path: str):
+        """
+        Return the top-level module names of the Python files listed in `RECORD`, for distributions without a
+        `top_level.txt`, or None if there is no `RECORD`
+        """
+        rows = cls.read_record(path=path)
+        if rows is None:
+            return None
+        suffixes = ('.py', '.pyc', '.so', '.pyd')
+        names = []
+        for row in rows:
+            parts = row[0].replace('\\', '/').split('/')
+            if parts[0] in ('', '..', '__pycache__') or parts[0].endswith(('.dist-info', '.data', '.egg-info')) or \
+                    not parts[-1].endswith(suffixes):
+                continue
+            names.append(parts[0] if len(parts) > 1 else parts[0].split('.')[0])
+        return tuple(dict.fromkeys(names))
+
+    @classmethod
+    def read_json(cls, path: str, filename: str):
+        """
+        Return the parsed content of a JSON file in a distribution metadata directory, ex. `direct_url.json`, or None
+        """
+        text = cls.read_text(path=path, filename=filename)
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    @classmethod
+    def read_record(cls, path: str):
+        """
+        Return the rows of the `RECORD` file of a distribution as `(path, hash, size)` tuples, or None if missing
+
+        See: https://packaging.python.org/specifications/recording-installed-packages/#the-record-file
+        """
+        text = cls.read_text(path=path, filename='RECORD')
+        if text is None:
+            return None
+        return [tuple((row + ['', '', ''])[:3]) for row in csv.reader(text.splitlines()) if len(row) > 0]
+
+    @classmethod
+    def get_record_hash(cls, path: str):
+        """
+        Return a digest of the installed files of a distribution, ex. `sha256:4f2e...`
+
+        The digest is computed from the file hashes listed in `RECORD`, without reading the files. Files in the
+        metadata directory and files outside of the install directory (scripts, whose shebang contains the
+        interpreter path) are excluded, so the same wheel installed into two environments has the same digest.
+        Distributions without a `RECORD`, ex. `*.egg-info`, are hashed from their core metadata file.
+        """
+        digest = hashlib.sha256()
+        rows = cls.read_record(path=path)
+        if rows is None:
+            filepath = cls.get_metadata_file(path=path)
+            if filepath is None:
+                return None
+            try:
+                with open(filepath, 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                return None
+            return f"sha256:{digest.hexdigest()}"
+        metadata_dir = os.path.basename(path) + '/'
+        for filepath, file_hash, _ in sorted(rows):
+            if len(file_hash) == 0 or filepath.startswith(('../', metadata_dir)):
+                continue
+            digest.update(f"{filepath},{file_hash}\n".encode('utf-8'))
+        return f"sha256:{digest.hexdigest()}"
+
+    @classmethod
+    def read_requires(cls, path: str, metadata=None):
+        """
+        Return the PEP 508 requirement strings declared by a distribution
+
+        Uses the `Requires-Dist` metadata fields, or `requires.txt` for `*.egg-info` distributions which do not
+        declare them. Sections of `requires.txt` are converted to environment markers.
+        """
+        if metadata is None:
+            metadata = cls.read_metadata(path=path)
+        if metadata is not None and metadata.get_all('Requires-Dist') is not None:
+            return [str(req) for req in metadata.get_all('Requires-Dist')]
+        text = cls.read_text(path=path, filename='requires.txt')
+        if text is None:
+            return []
+        requires = []
+        marker = None
+        for line in text.splitlines():
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                extra, _, section_marker = line[1:-1].partition(':')
+                markers = []
+                if len(section_marker) > 0:
+                    markers.append(f"({section_marker})")
+                if len(extra) > 0:
+                    markers.append(f'extra == "{extra}"')
+                marker = " and ".join(markers) if len(markers) > 0 else None
+                continue
+            requires.append(line if marker is None else f"{line} ; {marker}")
+        return requires
+
+    @classmethod
+    def parse_entry(cls, path: str, entry: str):
+        """
+        Return the `(name, version)` of a distribution metadata entry, or None if `entry` is not one
+
+        The name and version are taken from the entry name when possible, the metadata file is only read for entries
+        which do not include the version, ex. `package.egg-info` created by `pip install --editable`
+        """
+        if not entry.endswith(METADATA_EXTENSIONS):
+            return None
+        matches = RE_DIST_INFO.match(entry)
+        if matches is not None:
+            return matches.group('name'), matches.group('version')
+        metadata = cls.read_metadata(path=os.path.join(path, entry))
+        if metadata is None or metadata['Name'] is None:
+            return None
+        return metadata['Name'], metadata['Version']
+
+    @classmethod
+    def find_distributions(cls, path: str):
+        """
+        Yield `(name, version, metadata_path)` for every distribution installed in the directory `path`
+        """
+        try:
+            entries = sorted(os.listdir(path))
+        except OSError:
+            return
+        for entry in entries:
+            parsed = cls.parse_entry(path=path, entry=entry)
+            if parsed is not None:
+                yield parsed[0], parsed[1], os.path.join(path, entry)
@@ -0,0 +1,351 @@
+import base64
+import getpass
+import hashlib
+import importlib
+import os
+import re
+import shutil
+import site
+import sys
+import tempfile
+
+from .cache import get_cache_dir
+from .coordinator import FileLock, InstallCoordinator
+from .distributions import DistributionIndex
+from .interpreter import Interpreter
+from .logging import get_logger
+from .metadata import MetadataReader
+from .package import FrozenPackage
+from .preflight import Preflight
+from .process import Process
+from .requirements import Requirement, normalize_name
+from .timeouts import Timeouts
+from .transaction import Transaction
+from .wheelhouse import Wheelhouse
+
+
+class Overlay(object):
+    """
+    A per-user or per-notebook directory of packages which is searched before the shared `site-packages`
+
+    Installing into an overlay never changes the shared environment, so one user can upgrade a dependency without
+    breaking the code of other users. Only the difference with the shared environment is installed: the packages
+    pip's resolver plans to install into it (pip 22.2+), pinned and installed with `--no-dependencies` into a staging
+    directory. The staged distributions then replace their previous versions in the overlay, and the overlay is
+    added as a site directory in front of `sys.path` of the running interpreter, so the `.pth` files of its packages,
+    ex. namespace packages or editable installs, are processed like in `site-packages`.
+
+    Identical files of different overlays are stored once: every installed file is hard linked to a content store
+    named by its `RECORD` hash (checked once, when the file is added to the store), so installing a wheel which
+    another overlay already has writes no new data. pip and Python replace files instead of writing into them, so
+    the links are never changed through one overlay. Files of the store which no overlay uses are deleted by
+    :obj:`Overlay.prune`.
+
+    Overlays are kept in the `overlays` directory of the Pipy cache, or in `PIPY_OVERLAY_DIR`, one directory per
+    overlay and Python version. The default overlay is named after `PIPY_OVERLAY` or the current user.
+
+    Warnings
+        Modules which were imported before the overlay was activated keep their loaded version until they are
+        reloaded or the interpreter restarts.
+
+    Usage
+        Pipy.install('boxsdk', no_dependencies=False, overlay=True) # into the overlay of the current user
+        Overlay('etl-notebook').install(['pandas==1.0.5'], no_dependencies=False)
+        Overlay('etl-notebook').activate() # in another process
+    """
+    log = get_logger()
+
+    def __init__(self, name: str = None):
+        self.name = name or os.environ.get('PIPY_OVERLAY') or getpass.getuser()
+        if re.match(r'^\w[\w.-]*$', self.name) is None:
+            raise ValueError(f"Invalid overlay name: {self.name}")
+        python = '.'.join(Interpreter.discover()['python'].split('.')[:2])
+        self.root = self.get_root()
+        self.path = os.path.join(self.root, self.name, f"python{python}")
+        self.lock = FileLock(path=os.path.join(self.root, f"{self.name}.lock"))
+
+    def __repr__(self):
+        return f"Overlay(name='{self.name}', path='{self.path}')"
+
+    @classmethod
+    def get_root(cls):
+        path = os.environ.get('PIPY_OVERLAY_DIR')
+        if path is None:
+            return get_cache_dir(name='overlays')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @classmethod
+    def get_store(cls):
+        path = os.path.join(cls.get_root(), '.store')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def is_active(self):
+        return self.path in sys.path
+
+    def activate(self):
+        """
+        Add the overlay as a site directory of the running interpreter, its `.pth` files are processed, and move it
+        to the front of `sys.path`
+        """
+        if Interpreter.is_current() is False:
+            # PYTHONPATH does not process `.pth` files
+            raise RuntimeError(f"{self} can only be activated in the running interpreter, " + \
+                               f"run `import site; site.addsitedir({self.path!r})` in {Interpreter.get_executable()}")
+        os.makedirs(self.path, exist_ok=True)
+        if self.path not in sys.path:
+            site.addsitedir(self.path)
+            self.log.info(f"Activated {self}")
+        if sys.path[0] != self.path:
+            # `site.addsitedir` appends, the overlay is searched before the shared `site-packages`
+            sys.path.remove(self.path)
+            sys.path.insert(0, self.path)
+        importlib.invalidate_caches()
+        DistributionIndex.invalidate()
+        return self
+
+    def deactivate(self):
+        while self.path in sys.path:
+            sys.path.remove(self.path)
+        importlib.invalidate_caches()
+        DistributionIndex.invalidate()
+        return self
+
+    def get_distributions(self):
+        """
+        Return the distributions installed in the overlay
+
+        Returns:
+            :obj:`dict`: normalized name -> :obj:`InstalledDistribution`
+        """
+        return DistributionIndex.scan(paths=[self.path])
+
+    def get_requirements(self, names: list, no_dependencies: bool = True, upgrade: bool = False,
+                         wheelhouse: bool = False):
+        """
+        Return the requirements to install into the overlay and whether they are pinned by the resolver. With
+        dependencies, only the packages which the shared environment does not satisfy and the overlay does not
+        have yet are returned.
+        """
+        if no_dependencies is True:
+            return names, False
+        capabilities = Interpreter.get_capabilities()
+        if capabilities.report is False or capabilities.dry_run is False:
+            self.log.warning(f"pip({capabilities.version}) can not report an install plan, every dependency is " + \
+                             f"installed into {self}")
+            return names, False
+        index_args = None
+        if wheelhouse is True:
+            Wheelhouse.ensure(names=names, no_dependencies=False)
+            index_args = Wheelhouse.get_install_args()
+        report = Preflight.get_report(names=names, no_dependencies=False, upgrade=upgrade, index_args=index_args)
+        plan = Preflight.get_plan(report=report)
+        installed = self.get_distributions()
+        return [f"{key}=={version}" for key, version in sorted(plan.items())
+                if key not in installed or installed[key].version != version], True
+
+    def install(self, names, no_dependencies: bool = True, upgrade: bool = False, wheelhouse: bool = False,
+                activate: bool = True):
+        """
+        Install packages into the overlay
+
+        Args:
+            names(:obj:`list`, required): package names or requirements
+            no_dependencies(:obj:`bool`, optional): If True, install only `names`. Defaults to True.
+            upgrade(:obj:`bool`, optional): If True, plan the dependencies with `--upgrade`. Defaults to False.
+            wheelhouse(:obj:`bool`, optional): If True, install from the :obj:`Wheelhouse`. Defaults to False.
+            activate(:obj:`bool`, optional): If True, activate the overlay in the running interpreter.
+                Defaults to True.
+
+        Returns:
+            :obj:`list`: :obj:`FrozenPackage` of each requested package which is installed in the overlay
+        """
+        if isinstance(names, str):
+            names = [names]
+        names = list(names)
+        os.makedirs(self.path, exist_ok=True)
+        holder = {'pid': os.getpid(), 'operation': 'overlay', 'names': names}
+        self.lock.acquire(timeout=InstallCoordinator.timeout, holder=holder)
+        try:
+            requirements, pinned = self.get_requirements(names=names, no_dependencies=no_dependencies,
+                                                         upgrade=upgrade, wheelhouse=wheelhouse)
+            if len(requirements) == 0:
+                self.log.info(f"{', '.join(names)} and their dependencies are already satisfied")
+            else:
+                self.log.info(f"Installing {len(requirements)} packages into {self}: {', '.join(requirements)}")
+                self.stage(requirements=requirements, no_dependencies=no_dependencies or pinned, wheelhouse=wheelhouse)
+        finally:
+            self.lock.release()
+        if activate is True and Interpreter.is_current() is True:
+            self.activate()
+        installed = self.get_distributions()
+        keys = [normalize_name(Requirement(name).name) for name in names]
+        return [FrozenPackage.trusted(name=installed[key].name, version=installed[key].version)
+                for key in keys if key in installed]
+
+    def stage(self, requirements: list, no_dependencies: bool = True, wheelhouse: bool = False):
+        """
+        Install `requirements` into a staging directory next to the overlay, then move them into the overlay
+        """
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            args = Interpreter.get_pip_args('install', '--target', staging, *requirements)
+            if no_dependencies is True:
+                args.append('--no-dependencies')
+            if wheelhouse is True:
+                Wheelhouse.ensure(names=requirements, no_dependencies=no_dependencies)
+                args.extend(Wheelhouse.get_install_args())
+            cmd = Process(args=args, shell=False,
+                          **Timeouts.get_kwargs(operation='install', packages=len(requirements)))
+            cmd.run(raise_exception=True)
+            staged = DistributionIndex.scan(paths=[staging])
+            linked, size = self.deduplicate(distributions=staged)
+            self.log.info(f"Linked {linked} files ({size} bytes) of {len(staged)} packages from the overlay store")
+            self.merge(staging=staging, distributions=staged)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.check_imported(distributions=staged)
+        return staged
+
+    @classmethod
+    def get_digest(cls, path: str, algorithm: str):
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return base64.urlsafe_b64encode(digest.digest()).decode('ascii').rstrip('=')
+
+    @classmethod
+    def deduplicate(cls, distributions: dict):
+        """
+        Replace the staged files which are in the store by hard links to the store, and add the others to it. Files
+        are named by their `RECORD` hash, files without one (ex. compiled `*.pyc`) are hashed. Metadata files are not
+        shared, their modification time identifies the install.
+
+        Returns:
+            :obj:`tuple`: (files linked from the store, bytes not written)
+        """
+        store = cls.get_store()
+        linked, size = 0, 0
+        for dist in distributions.values():
+            root = os.path.normpath(dist.location) + os.sep
+            metadata_dir = os.path.normpath(dist.path) + os.sep
+            for path, digest, _ in MetadataReader.read_record(path=dist.path) or []:
+                algorithm, _, value = digest.partition('=')
+                filepath = os.path.normpath(os.path.join(dist.location, path))
+                if not filepath.startswith(root) or filepath.startswith(metadata_dir) or \
+                        os.path.islink(filepath) or not os.path.isfile(filepath) or os.path.getsize(filepath) == 0:
+                    continue
+                try:
+                    if len(value) == 0 or algorithm not in hashlib.algorithms_guaranteed:
+                        algorithm, value = 'sha256', cls.get_digest(path=filepath, algorithm='sha256')
+                        verified = True
+                    else:
+                        verified = False
+                    stored = os.path.join(store, f"{algorithm}-{value}")
+                    if os.path.isfile(stored):
+                        tmp_path = f"{filepath}.pipy-link"
+                        os.link(stored, tmp_path)
+                        os.replace(tmp_path, filepath)
+                        linked += 1
+                        size += os.stat(stored).st_size
+                    elif verified is True or cls.get_digest(path=filepath, algorithm=algorithm) == value:
+                        os.link(filepath, stored)
+                    else:
+                        cls.log.warning(f"{path} of {dist.name} does not match its RECORD hash, it is not shared")
+                except (FileExistsError, FileNotFoundError):
+                    # Another overlay added the file first, or `prune` deleted it
+                    continue
+                except OSError as e:
+                    cls.log.warning(f"Overlay files can not be hard linked, they are not deduplicated: {e}")
+                    return linked, size
+        return linked, size
+
+    def merge(self, staging: str, distributions: dict):
+        """
+        Replace the previous versions of the staged distributions in the overlay, then move the staged files in
+        """
+        installed = self.get_distributions()
+        for key in distributions.keys():
+            if key in installed:
+                self.remove_distribution(dist=installed[key])
+        for entry in os.listdir(staging):
+            self.move(source=os.path.join(staging, entry), target=os.path.join(self.path, entry))
+        importlib.invalidate_caches()
+        DistributionIndex.invalidate()
+
+    @classmethod
+    def move(cls, source: str, target: str):
+        if os.path.isdir(source) and os.path.isdir(target) and not os.path.islink(target):
+            for entry in os.listdir(source):
+                cls.move(source=os.path.join(source, entry), target=os.path.join(target, entry))
+            return
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        os.replace(source, target)
+
+    def remove_distribution(self, dist):
+        files = Transaction.get_files(dist=dist)
+        if files is None:
+            shutil.rmtree(dist.path, ignore_errors=True)
+            return
+        directories = {os.path.normpath(dist.path)}
+        for path in files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            directories.add(os.path.dirname(path))
+        Transaction.remove_empty(directories=directories, root=self.path)
+
+    def uninstall(self, names):
+        """
+        Remove packages from the overlay, the shared environment is not changed
+
+        Returns:
+            :obj:`list`: names of the removed packages
+        """
+        if isinstance(names, str):
+            names = [names]
+        self.lock.acquire(timeout=InstallCoordinator.timeout, holder={'pid': os.getpid(), 'operation': 'overlay'})
+        try:
+            installed = self.get_distributions()
+            removed = []
+            for key in [normalize_name(name) for name in names]:
+                if key in installed:
+                    self.remove_distribution(dist=installed[key])
+                    removed.append(installed[key].name)
+        finally:
+            self.lock.release()
+        importlib.invalidate_caches()
+        DistributionIndex.invalidate()
+        self.log.info(f"Removed {len(removed)} packages from {self}: {', '.join(removed)}")
+        return removed
+
+    def check_imported(self, distributions: dict):
+        imported = sorted(dist.name for dist in distributions.values()
+                          if any(module in sys.modules for module in dist.get_top_level()))
+        if len(imported) > 0 and self.is_active() is True:
+            self.log.warning(f"{', '.join(imported)} were already imported, reload them with `Pipy.reload` " + \
+                             "to use the versions in the overlay")
+        return imported
+
+    @classmethod
+    def prune(cls):
+        """
+        Delete the files of the store which are not linked from any overlay
+
+        Returns:
+            :obj:`int`: number of deleted files
+        """
+        store = cls.get_store()
+        deleted = 0
+        for entry in os.scandir(store):
+            try:
+                if entry.is_file() and entry.stat().st_nlink <= 1:
+                    os.remove(entry.path)
+                    deleted += 1
+            except OSError:
+                continue
+        return deleted
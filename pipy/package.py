@@ -1,106 +1,188 @@
+import asyncio
+import concurrent.futures
+import email.message
+import functools
+import http.client
+import json
 import os
 
 import pkgutil
-import re
+import sys
 
-import pkg_resources
-from pkg_resources import DistributionNotFound
 import importlib
 import importlib.util
+from .assertions import assert_int
+from .cache import PyPiCache
+from .coordinator import coordinated
+from .distributions import DistributionIndex, normalize_name
+from .graph import DependencyGraph
+from .index import IndexClient
+from .interpreter import Interpreter
+from .jsonstream import JsonArrayStream
+from .preflight import Preflight
+from .requirements import Requirement, Version
+from .wheelhouse import Wheelhouse
 from .logging import get_logger
 from .process import Process
+from .progress import PipProgressParser
+from .timeouts import Timeouts
 from .dataclass import DataClass
 
 import dataclasses
 
-RE_SEARCH_RESULT = re.compile(
-        r'^(?P<name>[A-Za-z0-9\-]+)\s\((?P<version>[.0-9\-A-Za-z]+)\)\s+\-\s(?P<description>.+)$')
-RE_SEARCH_RESULT_INSTALLED = re.compile(
-        r'^\s*(?P<is_installed>INSTALLED|LATEST)?\:?\s*(?P<version>[^\)\s]+)\s?\(?(?P<is_latest>latest)?\)?$')
-
 
 class PackageHelper(object):
     log = get_logger()
+    show_chunk_size = 20
+    show_max_workers = 4
 
     @classmethod
     def is_installed(cls, name):
-        try:
-            pkg = pkg_resources.get_distribution(dist=name)
-            if pkg.key is not None and pkg.location is not None:
-                if os.path.exists(os.path.join(pkg.location, pkg.key)) is True:
-                    return True
-        except DistributionNotFound as e:
-            return False
+        return DistributionIndex.contains(name=name)
 
 
     @classmethod
     def search_pypi(cls, name):
-        # cls.log.info(f"Searching PyPi for Package({name}) ...")
-        args = ['pip', 'search', name]
-        cmd = Process(args=args, timeout=30, shell=False)
-        cmd.run(raise_exception=False)
-        results = []
+        """
+        Look up `name` on the package index. PyPi has disabled `pip search`, so only an exact (normalized) match of
+        the package name is returned.
 
-        result_idx = 0
-        if cmd.status_code > 0:
-            return []
-        for idx, item in enumerate(cmd.stdout_lines):
-            matches = RE_SEARCH_RESULT.match(item)
-            if matches is not None:
-                search_result = matches.groupdict()
-                search_result['installed'] = False
-                search_result['installed_version'] = None
-                search_result['outdated'] = False
-                search_result['url'] = cls.get_url(name)
-                # search_result['path'] = None
-                results.append(search_result)
-                result_idx = result_idx + 1
-            matches = RE_SEARCH_RESULT_INSTALLED.match(item)
-            if matches is not None:
-                groups = matches.groupdict()
-                if 'is_latest' in groups:
-                    # print(results[result_idx])
-                    if groups['is_latest'] == 'latest':
-                        results[result_idx - 1]['outdated'] = False
-                        results[result_idx - 1]['installed_version'] = groups['version']
-                if 'is_installed' in groups:
-                    # print(results[result_idx])
-                    if groups['is_installed'] == 'INSTALLED':
-                        results[result_idx - 1]['installed'] = True
-                        # results[result_idx - 1]['path'] = cls.get_path(name=name)
-                        results[result_idx - 1]['installed_version'] = groups['version']
-                    if groups['is_installed'] == 'LATEST':
-                        results[result_idx - 1]['installed'] = True
-                        results[result_idx - 1]['outdated'] = True
-        results = sorted(results, key=lambda k: len(k['name']))
-        results = [PyPiPackage(name=result['name'],
-                               version=result['version'],
-                               installed=result['installed'],
-                               installed_version=result['installed_version'],
-                               outdated=result['outdated'],
-                               description=result['description']
-                               ) for result in results]
-        # cls.log.info(f"Searching PyPiPackage({name}) returned {len(results)} results")
-        return results
+        Returns:
+            :obj:`list`: list with the matching :obj:`PyPiPackage`, empty if the package does not exist
+        """
+        pkg = cls.get_pypi(name=name)
+        return [] if pkg is None else [pkg]
 
     @classmethod
-    def get_pypi(cls, name: str):
+    async def search_pypi_async(cls, name):
+        pkg = await cls.get_pypi_async(name=name)
+        return [] if pkg is None else [pkg]
+
+    @classmethod
+    def get_pypi(cls, name: str, use_cache: bool = True):
         """
-        Search PyPi package repository for a package by `name`. Only return if the package exists on PyPi.
+        Look up a package by `name` on the package index (see :obj:`IndexClient`). Only return if the package exists.
+
+        Results are cached in the persistent :obj:`PyPiCache`, a cached result is used until it expires. Expired
+        results are revalidated with their `ETag`, and are still returned if the index can not be reached.
 
         Args:
             name(:obj:`str`, required): package name
+            use_cache(:obj:`bool`, optional): If False, always query the index. Defaults to True.
         Returns:
             obj:`PyPiPackage`
         """
+        entry = PyPiCache.get(name=name)
+        if use_cache is True and entry is not None and entry['expired'] is False:
+            return cls.get_cached_pypi(name=name, entry=entry)[1]
         cls.log.info(f"Searching PyPi for Package({name}) ...")
-        results = cls.search_pypi(name)
-        if results is not None and len(results) > 0:
-            for result in results:
-                if getattr(result, 'name') == name:
-                    cls.log.info(f"Found PyPiPackage({name})({result.version})")
-                    return result
-        return None
+        try:
+            result = IndexClient.lookup(name=name, etag=cls.get_etag(entry=entry))
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            cls.log.error(f"Failed to look up Package({name}) on {IndexClient.get_display_url()}: {e}")
+            result = None
+        return cls.cache_pypi(name=name, result=result, entry=entry)
+
+    @classmethod
+    async def get_pypi_async(cls, name: str, use_cache: bool = True):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(cls.get_pypi, name=name, use_cache=use_cache))
+
+    @classmethod
+    def get_pypi_many(cls, names: list, use_cache: bool = True):
+        """
+        Look up many packages, see :obj:`PackageHelper.get_pypi`. Every name which is not cached is looked up
+        concurrently on the pooled connections of the :obj:`IndexClient`.
+
+        Returns:
+            :obj:`list`: :obj:`PyPiPackage` or None for each name, in the order of `names`
+        """
+        entries = {name: PyPiCache.get(name=name) for name in names}
+        lookups = [name for name, entry in entries.items()
+                   if use_cache is False or entry is None or entry['expired'] is True]
+        results = {}
+        if len(lookups) > 0:
+            cls.log.info(f"Searching PyPi for {len(lookups)} packages: {', '.join(lookups)} ...")
+            results = IndexClient.lookup_many(names=lookups,
+                                              etags={name: cls.get_etag(entry=entries[name]) for name in lookups})
+        packages = {}
+        for name, entry in entries.items():
+            if name in results:
+                packages[name] = cls.cache_pypi(name=name, result=results[name], entry=entry)
+            else:
+                packages[name] = cls.get_cached_pypi(name=name, entry=entry)[1]
+        return [packages[name] for name in names]
+
+    @classmethod
+    async def get_pypi_many_async(cls, names: list, use_cache: bool = True):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(cls.get_pypi_many, names=names, use_cache=use_cache))
+
+    @classmethod
+    def get_etag(cls, entry: dict = None):
+        """
+        Return the `ETag` of a cache entry if it was issued by the index which is queried now
+        """
+        if entry is None or entry['idx'] != PyPiCache.get_index():
+            return None
+        return entry['etag']
+
+    @classmethod
+    def get_cached_pypi(cls, name: str, entry: dict = None):
+        """
+        Return `(hit, PyPiPackage)` from the :obj:`PyPiCache`, `hit` is False if there is no fresh cache entry.
+        The installed state of the returned package is read from the installed environment, not from the cache.
+        """
+        if entry is None:
+            entry = PyPiCache.get(name=name)
+        if entry is None or entry['expired'] is True:
+            return False, None
+        if entry['found'] is False:
+            cls.log.info(f"PyPiPackage({name}) does not exist (cached)")
+            return True, None
+        cls.log.info(f"Found PyPiPackage({name})({entry['version']}) (cached)")
+        return True, cls.build_pypi(name=entry['name'], version=entry['version'], description=entry['description'])
+
+    @classmethod
+    def cache_pypi(cls, name: str, result: dict, entry: dict = None):
+        """
+        Store the result of :obj:`IndexClient.lookup` in the :obj:`PyPiCache` and return the :obj:`PyPiPackage`
+
+        Args:
+            name(:obj:`str`, required): package name
+            result(:obj:`dict`, required): the lookup result, or None if the lookup failed
+            entry(:obj:`dict`, optional): the previous cache entry, used for `304 Not Modified` and failed lookups
+        """
+        if result is None:
+            if entry is None or entry['found'] is False:
+                return None
+            cls.log.warning(f"Using expired cache entry of PyPiPackage({name})({entry['version']})")
+            return cls.build_pypi(name=entry['name'], version=entry['version'], description=entry['description'])
+        if result['status'] == 304 and entry is not None:
+            PyPiCache.touch(name=name)
+            entry['expired'] = False
+            return cls.get_cached_pypi(name=name, entry=entry)[1]
+        if result['status'] != 200:
+            cls.log.info(f"PyPiPackage({name}) does not exist")
+            PyPiCache.set(name=name, etag=result['etag'], found=False)
+            return None
+        cls.log.info(f"Found PyPiPackage({name})({result['version']})")
+        PyPiCache.set(name=result['name'],
+                      version=result['version'],
+                      description=result['description'],
+                      etag=result['etag'])
+        return cls.build_pypi(name=result['name'], version=result['version'], description=result['description'])
+
+    @classmethod
+    def build_pypi(cls, name: str, version: str, description: str = None):
+        installed_version = cls.get_version(name=name)
+        return PyPiPackage(name=name,
+                           version=version,
+                           installed=installed_version is not None,
+                           installed_version=installed_version,
+                           outdated=installed_version is not None and Version(installed_version) < Version(version),
+                           description=description
+                           )
 
     @classmethod
     def get_package(cls, name: str):
@@ -123,7 +205,11 @@ class PackageHelper(object):
 
     @classmethod
     def get_module(cls, name):
-        mod = importlib.util.find_spec(name)
+        try:
+            mod = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            # The parent package is missing, or a module in `sys.modules` has no spec
+            return None
         if mod is not None:
             return mod
         else:
@@ -131,11 +217,25 @@ class PackageHelper(object):
 
     @classmethod
     def load_module(cls, name):
+        """
+        Execute the module `name` into a new module object, which replaces `sys.modules[name]`. Returns None if the
+        module is not found.
+        """
         mod = cls.get_module(name=name)
-        if name is not None:
-            return mod.loader.load_module()
-        else:
+        if mod is None:
             return None
+        module = importlib.util.module_from_spec(mod)
+        previous = sys.modules.get(name)
+        sys.modules[name] = module
+        try:
+            mod.loader.exec_module(module)
+        except BaseException:
+            if previous is not None:
+                sys.modules[name] = previous
+            else:
+                sys.modules.pop(name, None)
+            raise
+        return module
 
     @classmethod
     def get_path(cls, name):
@@ -159,87 +259,373 @@ class PackageHelper(object):
 
     @classmethod
     def import_module(cls, name):
-        return cls.load_module(name=name)
+        """
+        Return the imported module `name`, importing it if needed, or None if it is not found. Use
+        :obj:`ModuleReloader.reload` to load a new version of an imported module.
+        """
+        if sys.modules.get(name) is not None:
+            return sys.modules[name]
+        if cls.get_module(name=name) is None:
+            return None
+        return importlib.import_module(name)
 
     @classmethod
     def get_version(cls, name):
-        try:
-            pkg = pkg_resources.get_distribution(dist=name)
-            if pkg.key is not None and pkg.location is not None:
-                if os.path.exists(os.path.join(pkg.location, pkg.key)) is True:
-                    if pkg is not None:
-                        if hasattr(pkg, 'version') and getattr(pkg, 'version') is not None:
-                            return getattr(pkg, 'version')
-        except DistributionNotFound as e:
-            pkg = None
+        dist = DistributionIndex.get(name=name)
+        if dist is not None:
+            return dist.version
         return None
 
     @classmethod
     def get_installed_packages(cls):
-        packages = []
-        for pkg in pkg_resources.working_set:
-            packages.append(FrozenPackage(name=pkg.key, version=pkg.version, installed=True))
-        return packages
+        return [FrozenPackage.trusted(name=dist.key, version=dist.version) for dist in DistributionIndex.all()]
+
+    @classmethod
+    def get_installed_table(cls):
+        distributions = DistributionIndex.all()
+        return PackageTable(names=[dist.key for dist in distributions],
+                            versions=[dist.version for dist in distributions])
+
+    @classmethod
+    def get_list_args(cls):
+        if Interpreter.get_capabilities().json_list is True:
+            return Interpreter.get_pip_args('list', '--format', 'json')
+        return Interpreter.get_pip_args('list', '--format', 'freeze')
 
     @classmethod
     def list_packages(cls):
-        args = ['pip', 'list', '--format', 'freeze']
-        cmd = Process(args=args, timeout=30, shell=False)
-        cmd.run(raise_exception=False)
+        """
+        Return the installed packages reported by `pip list`, the JSON output is parsed while pip prints it
+        """
+        args = cls.get_list_args()
+        if Interpreter.get_capabilities().json_list is False:
+            cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='list'))
+            cmd.run(raise_exception=False)
+            return cls.parse_list(cmd=cmd)
+        return [cls.parse_list_item(item=item) for item in cls.stream_json(args=args, operation='list')]
+
+    @classmethod
+    async def list_packages_async(cls):
+        args = cls.get_list_args()
+        cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='list'))
+        await cmd.run_async(raise_exception=False)
+        return cls.parse_list(cmd=cmd)
+
+    @classmethod
+    def stream_json(cls, args: list, operation: str, key: str = None, document: dict = None):
+        """
+        Yield the items of the JSON array printed by a pip command as they are parsed, see :obj:`JsonArrayStream`.
+        The other values of the printed object are copied to `document`.
+        """
+        cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation=operation))
+        stream = JsonArrayStream(key=key)
+        if cmd.use_worker() is True:
+            # The worker returns the whole output at once
+            cmd.run(raise_exception=False)
+            lines = [cmd.stdout or '']
+        else:
+            lines = cmd.stream(raise_exception=False, tail=0, merge_stderr=False)
+        for line in lines:
+            yield from stream.feed(text=line + '\n')
+        if cmd.failed is True:
+            cls.log.error(f"{' '.join(args[2:])} exited with status {cmd.return_code}: {cmd.stderr}")
+            return
+        yield from stream.close()
+        if document is not None:
+            document.update(stream.document)
+
+    @classmethod
+    def parse_list(cls, cmd: Process):
+        if cmd.stdout is not None and cmd.stdout.lstrip().startswith('['):
+            return [cls.parse_list_item(item=item) for item in json.loads(cmd.stdout)]
+        return cls.parse_freeze(lines=cmd.stdout_lines or [])
+
+    @classmethod
+    def parse_list_item(cls, item: dict):
+        return FrozenPackage(name=item['name'], version=item['version'], installed=True)
+
+    @classmethod
+    def parse_freeze(cls, lines: list):
+        """
+        Parse `pip freeze` style lines: `name==version`, `name===version`, `name @ url` and `-e url#egg=name`.
+        The version of direct URL and editable entries is read from the installed metadata.
+        """
         results = []
-        for line in cmd.stdout_lines:
-            name, version = line.split("==")
-            package = FrozenPackage(name=name, version=version, installed=True)
-            results.append(package)
+        for line in lines:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            version = None
+            if line.startswith(('-e ', '--editable')):
+                name = line.partition('#egg=')[2].split('&')[0] or None
+            elif ' @ ' in line:
+                name = line.split(' @ ', 1)[0].strip()
+            elif '==' in line:
+                name, _, version = line.partition('===' if '===' in line else '==')
+            else:
+                name = None
+            if name is None:
+                cls.log.warning(f"Could not parse installed package: {line}")
+                continue
+            if version is None:
+                dist = DistributionIndex.get(name=name)
+                if dist is None:
+                    cls.log.warning(f"Package({name}) is listed but not installed: {line}")
+                    continue
+                version = dist.version
+            results.append(FrozenPackage(name=name.strip(), version=version, installed=True))
         return results
 
+    @classmethod
+    def inspect_packages(cls):
+        """
+        Return information about every installed package from a single `pip inspect`, parsed while pip prints it
+
+        Requirement markers are evaluated against the environment reported by pip, so the result is correct for
+        another :obj:`Interpreter` too. Falls back to reading the metadata when pip is older than 22.2.
+
+        Returns:
+            :obj:`dict`: package name -> :obj:`InstalledPackage`
+        """
+        if Interpreter.get_capabilities().inspect is False:
+            return cls.read_packages(names=[dist.name for dist in DistributionIndex.all()])
+        document = {}
+        items = list(cls.stream_json(args=Interpreter.get_pip_args('inspect'), operation='inspect', key='installed',
+                                     document=document))
+        environment = document.get('environment')
+        requires = {}
+        for item in items:
+            metadata = item['metadata']
+            names = []
+            for requirement in metadata.get('requires_dist', []):
+                try:
+                    req = Requirement(requirement)
+                except ValueError:
+                    continue
+                if req.applies(environment=environment) is True:
+                    names.append(req.name)
+            requires[normalize_name(metadata['name'])] = names
+        required_by = {}
+        for key, names in requires.items():
+            for name in names:
+                required_by.setdefault(normalize_name(name), []).append(key)
+        packages = {}
+        for item in items:
+            metadata = item['metadata']
+            key = normalize_name(metadata['name'])
+            project_url = metadata.get('home_page')
+            if project_url is None or project_url.strip() in ('', 'UNKNOWN'):
+                project_url = None
+                for url in metadata.get('project_url', []):
+                    label, _, url = url.partition(',')
+                    if project_url is None or label.strip().lower() in ('homepage', 'home', 'source'):
+                        project_url = url.strip()
+            packages[metadata['name']] = InstalledPackage(
+                    name=metadata['name'],
+                    version=metadata['version'],
+                    summary=metadata.get('summary') or None,
+                    author=metadata.get('author') or None,
+                    author_email=metadata.get('author_email') or None,
+                    installed=True,
+                    requires=[Package(name=name) for name in requires[key]],
+                    required_by=[Package(name=name) for name in required_by.get(key, [])],
+                    project_url=project_url,
+                    package_url=cls.get_url(name=metadata['name'])
+                    )
+        return packages
+
+    @classmethod
+    def get_outdated(cls, use_cache: bool = True):
+        """
+        Return the installed packages which have a newer version on the package index, ie `pip list --outdated`
+
+        The latest versions are compared in bulk: names with a fresh :obj:`PyPiCache` entry are not looked up, the
+        others are looked up concurrently, see :obj:`PackageHelper.get_pypi_many`. Packages which are not on the
+        index, ex. local or editable packages, are skipped.
+
+        Returns:
+            :obj:`list`: list of :obj:`PyPiPackage`, `installed_version` is the installed version and `version` the
+                latest version
+        """
+        names = [dist.name for dist in DistributionIndex.all()]
+        results = cls.get_pypi_many(names=names, use_cache=use_cache)
+        return [pkg for pkg in results if pkg is not None and pkg.outdated is True]
+
     @classmethod
     def show_package(cls, name):
-        d = {}
-        args = ['pip', 'show', name]
-        cmd = Process(args=args, timeout=30, shell=False)
+        args = Interpreter.get_pip_args('show', name)
+        cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='show'))
+        cmd.run(raise_exception=False)
+        return cls.parse_show(cmd=cmd)
+
+    @classmethod
+    async def show_package_async(cls, name):
+        args = Interpreter.get_pip_args('show', name)
+        cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='show'))
+        await cmd.run_async(raise_exception=False)
+        return cls.parse_show(cmd=cmd)
+
+    @classmethod
+    def show_packages(cls, names: list, chunk_size: int = None, max_workers: int = None):
+        """
+        Return information about many packages, ie `pip show name1 name2 ...`
+
+        The names are split into chunks of `chunk_size` names and each chunk is passed to a single `pip show`
+        command. The chunks are executed in parallel on a pool of `max_workers` threads.
+
+        Args:
+            names(:obj:`list`, required): list of package names
+            chunk_size(:obj:`int`, optional): Number of names passed to each `pip show` command.
+                Defaults to :obj:`PackageHelper.show_chunk_size`
+            max_workers(:obj:`int`, optional): Number of `pip show` commands executed at the same time.
+                Defaults to :obj:`PackageHelper.show_max_workers`
+
+        Returns:
+            :obj:`dict`: package name -> :obj:`InstalledPackage`, or None if the package is not installed
+        """
+        chunk_size = assert_int(value=chunk_size or cls.show_chunk_size, name='chunk_size')
+        max_workers = assert_int(value=max_workers or cls.show_max_workers, name='max_workers')
+        names = list(names)
+        chunks = [names[idx:idx + chunk_size] for idx in range(0, len(names), chunk_size)]
+        cls.log.info(f"Showing {len(names)} packages using {len(chunks)} `pip show` commands ...")
+
+        packages = {}
+        # Worker threads do not see `Timeouts.override`, the policy is read here
+        policy = Timeouts.get(operation='show')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for records in executor.map(functools.partial(cls.show_chunk, policy=policy), chunks):
+                for pkg in records:
+                    packages[normalize_name(pkg.name)] = pkg
+        return {name: packages.get(normalize_name(name)) for name in names}
+
+    @classmethod
+    def show_chunk(cls, names: list, policy=None):
+        args = Interpreter.get_pip_args('show', *names)
+        policy = policy or Timeouts.get(operation='show')
+        cmd = Process(args=args, shell=False, **policy.get_kwargs(packages=len(names)))
         cmd.run(raise_exception=False)
+        # `pip show` exits with a non-zero status if any of the names is not installed, but still prints the others
+        if cmd.stdout_lines is None:
+            return []
+        return cls.parse_show_records(lines=cmd.stdout_lines)
+
+    @classmethod
+    def parse_show(cls, cmd: Process):
         if cmd.return_code != 0:
             return None
+        records = cls.parse_show_records(lines=cmd.stdout_lines)
+        if len(records) > 0:
+            return records[0]
+        return None
+
+    @classmethod
+    def parse_show_records(cls, lines: list):
+        """
+        Parse the output of `pip show`, where the records of multiple packages are separated by `---`
 
-        for l in cmd.stdout_lines:
-            splits = l.split(":")
-            key = splits[0].strip().replace("-", "_").lower()
-            value = "".join(splits[1:]).strip()
+        Returns:
+            :obj:`list`: list of :obj:`InstalledPackage`
+        """
+        records = []
+        record = []
+        for line in lines:
+            if line == '---':
+                records.append(record)
+                record = []
+            else:
+                record.append(line)
+        records.append(record)
+        return [cls.parse_show_record(lines=record) for record in records if len(record) > 0]
+
+    @classmethod
+    def parse_show_record(cls, lines: list):
+        d = {}
+        for l in lines:
+            key, _, value = l.partition(":")
+            key = key.strip().replace("-", "_").lower()
+            value = value.strip()
             if len(value) == 0:
                 value = None
             d[key] = value
 
-        if 'requires' in d and d['requires'] is not None and len(d['requires']) > 0 and d['requires'] is not None:
-            if "," in d['requires']:
-                d['requires'] = [Package(name=req.strip()) for req in d['requires'].split(",")]
-            else:
-                d['requires'] = Package(name=d['requires'])
-        if 'required_by' in d and d['required_by'] is not None and len(d['required_by']) > 0 and d[
-            'required_by'] is not None:
-            if "," in d['required_by']:
-                d['required_by'] = [Package(name=req.strip()) for req in d['required_by'].split(",")]
-            else:
-                d['required_by'] = Package(name=d['required_by'])
+        for key in ('requires', 'required_by'):
+            d[key] = [Package(name=req.strip()) for req in (d.get(key) or '').split(",") if len(req.strip()) > 0]
 
         p = InstalledPackage(name=d['name'],
                              version=d['version'],
-                             summary=d['summary'],
-                             author=d['author'],
-                             author_email=d['author_email'],
+                             summary=d.get('summary'),
+                             author=d.get('author'),
+                             author_email=d.get('author_email'),
                              installed=True,
-                             requires=d['requires'],
-                             required_by=d['required_by'],
-                             project_url=d['home_page'].replace("http", "https").replace("https//", "https://"),
+                             requires=d.get('requires'),
+                             required_by=d.get('required_by'),
+                             project_url=d.get('home_page'),
                              package_url=PackageHelper.get_url(name=d['name'])
                              )
 
         return p
 
     @classmethod
-    def install_package(cls, name, no_dependencies=True, upgrade=False):
+    def read_package(cls, name: str):
+        """
+        Return information about an installed package, read from its metadata without executing `pip show`
+
+        Returns the same fields as `pip show`. `required_by` is computed from the dependency graph of the installed
+        environment, see :obj:`DependencyGraph`.
+
+        Args:
+            name(:obj:`str`, required): package name
+
+        Returns:
+            obj:`InstalledPackage`, or None if the package is not installed
+        """
+        dist = DistributionIndex.get(name=name)
+        if dist is None:
+            return None
+        metadata = dist.get_metadata()
+        if metadata is None:
+            metadata = email.message.Message()
+        project_url = cls.get_metadata_value(metadata=metadata, key='Home-page')
+        if project_url is None:
+            for url in metadata.get_all('Project-URL') or []:
+                label, _, url = url.partition(',')
+                if project_url is None or label.strip().lower() in ('homepage', 'home', 'source'):
+                    project_url = url.strip()
+        graph = DependencyGraph.current()
+        required_by = [graph.distributions[key] for key in graph.dependents(name=dist.key)]
+        name = metadata.get('Name') or dist.name
+        return InstalledPackage(name=name,
+                                version=dist.version,
+                                summary=cls.get_metadata_value(metadata=metadata, key='Summary'),
+                                author=cls.get_metadata_value(metadata=metadata, key='Author'),
+                                author_email=cls.get_metadata_value(metadata=metadata, key='Author-email'),
+                                installed=True,
+                                requires=[Package(name=req.name) for req in graph.requires.get(dist.key, [])],
+                                required_by=[Package(name=d.name) for d in required_by],
+                                project_url=project_url,
+                                package_url=cls.get_url(name=name)
+                                )
+
+    @classmethod
+    def read_packages(cls, names: list):
+        """
+        Return a :obj:`dict` of name -> :obj:`InstalledPackage` read from metadata, see
+        :obj:`PackageHelper.read_package`
+        """
+        return {name: cls.read_package(name=name) for name in names}
+
+    @classmethod
+    def get_metadata_value(cls, metadata, key: str):
+        value = metadata.get(key)
+        if value is None or len(value.strip()) == 0 or value == 'UNKNOWN':
+            return None
+        return value.strip()
+
+    @classmethod
+    @coordinated('install')
+    def install_package(cls, name, no_dependencies=True, upgrade=False, preflight=False, progress=None):
         if isinstance(name, list) or isinstance(name, tuple):
-            packages = [Package(name=n) for n in name]
+            packages = Package.many(names=name)
             names_s = ", ".join(name)
         else:
             packages = [Package(name=name)]
@@ -255,6 +641,10 @@ class PackageHelper(object):
         if len(already_installed_packages) > 0:
             cls.log.info(f"{len(already_installed_packages)} packages are already installed: " + \
                          f"{', '.join(n.name for n in already_installed_packages)}")
+        if preflight is True and len(not_installed_packages) > 0:
+            Preflight.ensure(names=[p.name for p in not_installed_packages],
+                             no_dependencies=no_dependencies,
+                             upgrade=upgrade)
 
         for pkg in not_installed_packages:
             name = pkg.name
@@ -272,15 +662,17 @@ class PackageHelper(object):
             #     if upgrade is False:
             #         return pkg
             cls.log.info(f"Installing PyPiPackage({name})({pkg.version}) ...")
-            args = ['pip', 'install', name]
+            args = Interpreter.get_pip_args('install', name)
             if no_dependencies is True:
                 args.append('--no-dependencies')
             if upgrade is True:
                 args.append('--upgrade')
                 args.append('--upgrade-strategy only-if-needed')
 
-            cmd = Process(args=args, timeout=30, shell=False)
-            cmd.run(raise_exception=False)
+            cmd = Process(args=args + cls.get_progress_args(progress=progress), shell=False,
+                          **Timeouts.get_kwargs(operation='install'))
+            cls.run_pip(cmd=cmd, progress=progress)
+            DistributionIndex.invalidate()
             new_pkg = cls.get_package(name)
 
             if new_pkg.installed is True:
@@ -297,9 +689,231 @@ class PackageHelper(object):
         return installed_packages
 
     @classmethod
+    @coordinated('install')
+    def install_packages(cls, names, no_dependencies=True, upgrade=False, preflight=False, wheelhouse=False,
+                         progress=None):
+        """
+        Install a list of packages using a single `pip install` invocation
+
+        Every name is checked against the installed environment and PyPi in one pass, all of the installable packages
+        are handed to one `pip install a b c ...` command, and the installed state is read back once afterwards.
+
+        Args:
+            names(:obj:`list`, required): list of package names
+            no_dependencies(:obj:`bool`, optional): If True, execute `pip install` with `--no-dependencies`.
+                Defaults to True.
+            upgrade(:obj:`bool`, optional): If True, execute `pip install` with `--upgrade`. Defaults to False.
+            preflight(:obj:`bool`, optional): If True, resolve the packages with `pip install --dry-run` first and
+                raise :obj:`ConflictError` if the install would break an installed package. Defaults to False.
+            wheelhouse(:obj:`bool`, optional): If True, install from the :obj:`Wheelhouse` with `--no-index`, wheels
+                which are not in the wheelhouse yet are downloaded into it first. Defaults to False.
+            progress(:obj:`callable`, optional): If set, the output of `pip install` is streamed and `progress` is
+                called with a :obj:`ProgressEvent` for each step, ex. downloaded bytes.
+
+        Returns:
+            :obj:`list`: list of :obj:`PyPiPackage`, PyPiPackage.installed is True for each package which was
+                installed and False for each package which failed to install
+        """
+        requirements = cls.get_requirements(names=names)
+        not_installed_packages = cls.get_not_installed(names=names)
+        if wheelhouse is True:
+            results = cls.get_wheelhouse_many(names=cls.get_pending_requirements(pending=not_installed_packages,
+                                                                                 requirements=requirements),
+                                              no_dependencies=no_dependencies)
+        else:
+            results = cls.get_pypi_many(names=[pkg.name for pkg in not_installed_packages])
+        results, pending = cls.get_pending(not_installed_packages=not_installed_packages, results=results)
+        if len(pending) == 0:
+            return results
+        if preflight is True:
+            Preflight.ensure(names=cls.get_pending_requirements(pending=pending, requirements=requirements),
+                             no_dependencies=no_dependencies, upgrade=upgrade)
+
+        args = cls.get_install_args(pending=pending, no_dependencies=no_dependencies, upgrade=upgrade,
+                                    requirements=requirements)
+        if wheelhouse is True:
+            args.extend(Wheelhouse.get_install_args())
+        cmd = Process(args=args + cls.get_progress_args(progress=progress), shell=False,
+                      **Timeouts.get_kwargs(operation='install', packages=len(pending)))
+        cls.run_pip(cmd=cmd, progress=progress)
+        cls.check_installed(pending=pending, cmd=cmd, requirements=requirements)
+        return results
+
+    @classmethod
+    @coordinated('install')
+    async def install_packages_async(cls, names, no_dependencies=True, upgrade=False):
+        """
+        Coroutine version of :obj:`PackageHelper.install_packages`
+        """
+        not_installed_packages = cls.get_not_installed(names=names)
+        results = await cls.get_pypi_many_async(names=[pkg.name for pkg in not_installed_packages])
+        results, pending = cls.get_pending(not_installed_packages=not_installed_packages, results=results)
+        if len(pending) == 0:
+            return results
+
+        requirements = cls.get_requirements(names=names)
+        cmd = Process(args=cls.get_install_args(pending=pending, no_dependencies=no_dependencies, upgrade=upgrade,
+                                                requirements=requirements),
+                      shell=False,
+                      **Timeouts.get_kwargs(operation='install', packages=len(pending)))
+        await cmd.run_async(raise_exception=False)
+        cls.check_installed(pending=pending, cmd=cmd, requirements=requirements)
+        return results
+
+    @classmethod
+    def get_wheelhouse_many(cls, names: list, no_dependencies: bool = True):
+        """
+        Return a :obj:`PyPiPackage` for each name which has a wheel in the :obj:`Wheelhouse`, or None, downloading
+        the missing wheels first. The package index is not queried for names which are already in the wheelhouse.
+        """
+        entries = Wheelhouse.ensure(names=names, no_dependencies=no_dependencies)
+        return [None if entry is None else cls.build_pypi(name=Requirement(name).name, version=entry['version'])
+                for name, entry in zip(names, entries)]
+
+    @classmethod
+    def get_progress_args(cls, progress=None):
+        return [] if progress is None else PipProgressParser.get_args()
+
+    @classmethod
+    def run_pip(cls, cmd: Process, progress=None):
+        """
+        Run a pip command, if `progress` is set the output is streamed and parsed into :obj:`ProgressEvent`
+        """
+        if progress is None:
+            return cmd.run(raise_exception=False)
+        for event in PipProgressParser().events(cmd.stream(raise_exception=False)):
+            progress(event)
+        return cmd.stdout, cmd.stderr
+
+    @classmethod
+    def get_requirements(cls, names):
+        """
+        Return normalized name -> requirement of each package name or requirement, ex. `boxsdk>=2.7`
+
+        Returns:
+            :obj:`dict`: normalized name -> (name, :obj:`Requirement` or None if `name` is not a valid requirement)
+        """
+        if isinstance(names, str):
+            names = [names]
+        requirements = {}
+        for name in names:
+            try:
+                req = Requirement(name)
+                requirements[req.key] = (req.name, req)
+            except ValueError:
+                requirements[normalize_name(name)] = (name, None)
+        return requirements
+
+    @classmethod
+    def get_not_installed(cls, names):
+        """
+        Return a :obj:`Package` for each name which is not installed, or whose installed version does not satisfy
+        the requirement, ex. `boxsdk>=2.7`
+        """
+        if isinstance(names, str):
+            names = [names]
+        requirements = list(cls.get_requirements(names=names).values())
+        packages = Package.many(names=[name for name, _ in requirements])
+        already_installed_packages = []
+        not_installed_packages = []
+        for pkg, (_, req) in zip(packages, requirements):
+            if pkg.installed is True and (req is None or req.is_satisfied_by(pkg.version)):
+                already_installed_packages.append(pkg)
+            else:
+                if pkg.installed is True:
+                    cls.log.info(f"Package({pkg.name})({pkg.version}) does not satisfy {req}")
+                not_installed_packages.append(pkg)
+
+        cls.log.info(f"Installing {len(packages)} packages: {', '.join(names)}")
+        cls.log.info(f"{len(not_installed_packages)} packages will be installed: " + \
+                     f"{', '.join(n.name for n in not_installed_packages)}")
+        if len(already_installed_packages) > 0:
+            cls.log.info(f"{len(already_installed_packages)} packages are already installed: " + \
+                         f"{', '.join(n.name for n in already_installed_packages)}")
+        return not_installed_packages
+
+    @classmethod
+    def get_pending(cls, not_installed_packages: list, results: list):
+        """
+        Pair the PyPi search `results` with the packages to install, packages which do not exist on PyPi are
+        reported as PyPiPackage(installed=False) and are not passed to `pip install`
+        """
+        pending = []
+        packages = []
+        for pkg, pypi_pkg in zip(not_installed_packages, results):
+            if pypi_pkg is None:
+                cls.log.error(f"PyPiPackage({pkg.name}) does not exist")
+                packages.append(PyPiPackage(name=pkg.name, installed=False, version=None, outdated=False))
+            else:
+                pending.append(pypi_pkg)
+                packages.append(pypi_pkg)
+        return packages, pending
+
+    @classmethod
+    def get_install_args(cls, pending: list, no_dependencies=True, upgrade=False, requirements: dict = None):
+        """
+        Return the `pip install` command of the pending packages, `requirements` are the parsed names of
+        :obj:`PackageHelper.get_requirements`, so that a requirement (ex. `boxsdk>=2.7`) is passed to pip as is
+        """
+        cls.log.info(f"Installing {len(pending)} packages: " + \
+                     f"{', '.join(f'PyPiPackage({p.name})({p.version})' for p in pending)} ...")
+        args = Interpreter.get_pip_args('install', *cls.get_pending_requirements(pending=pending,
+                                                                                 requirements=requirements))
+        if no_dependencies is True:
+            args.append('--no-dependencies')
+        if upgrade is True:
+            args.append('--upgrade')
+            args.extend(['--upgrade-strategy', 'only-if-needed'])
+        return args
+
+    @classmethod
+    def get_pending_requirements(cls, pending: list, requirements: dict = None):
+        requirements = requirements or {}
+        return [str(requirements.get(normalize_name(p.name), (None, None))[1] or p.name) for p in pending]
+
+    @classmethod
+    def check_installed(cls, pending: list, cmd: Process, requirements: dict = None):
+        """
+        Read the installed state back once after `pip install` and update each pending :obj:`PyPiPackage`
+
+        A package is installed if its installed version satisfies its requirement in `requirements` (see
+        :obj:`PackageHelper.get_requirements`). If `pip install` failed, its version must also have changed, a version
+        which was installed before is not reported as installed.
+        """
+        DistributionIndex.invalidate()
+        if cmd.failed is True:
+            cls.log.error(f"pip install exited with status {cmd.return_code}: {cmd.stderr}")
+
+        requirements = requirements or {}
+        installed = {normalize_name(p.name): p for p in cls.get_installed_packages()}
+        installed_packages = []
+        for pkg in pending:
+            key = normalize_name(pkg.name)
+            req = requirements.get(key, (None, None))[1]
+            frozen_pkg = installed.get(key)
+            previous_version = pkg.installed_version
+            if frozen_pkg is not None and (req is None or req.is_satisfied_by(frozen_pkg.version)) and \
+                    (cmd.failed is False or frozen_pkg.version != previous_version):
+                pkg['installed'] = True
+                pkg['installed_version'] = frozen_pkg.version
+                pkg['outdated'] = frozen_pkg.version != pkg.version
+                cls.log.info(f"Installed PyPiPackage({pkg.name})({frozen_pkg.version})")
+                installed_packages.append(pkg)
+            else:
+                pkg['installed'] = False
+                pkg['installed_version'] = None if frozen_pkg is None else frozen_pkg.version
+                cls.log.error(f"Failed to install PyPiPackage({pkg.name})({pkg.version})" + \
+                              ('' if frozen_pkg is None else f", {frozen_pkg.version} is installed"))
+        if len(installed_packages) > 0:
+            cls.log.info(f"Installed {len(installed_packages)}/{len(pending)} packages: " + \
+                         f"{', '.join(n.name for n in installed_packages)}")
+        return installed_packages
+
+    @classmethod
+    @coordinated('uninstall')
     def uninstall_package(cls, name):
         if isinstance(name, list) or isinstance(name, tuple):
-            packages = [Package(name=n) for n in name]
+            packages = Package.many(names=name)
             names_s = ", ".join(name)
         else:
             packages = [Package(name=name)]
@@ -319,9 +933,10 @@ class PackageHelper(object):
         for pkg in installed_packages:
             name = pkg.name
             cls.log.info(f"Uninstalling Package({name})({pkg.version}) ...")
-            args = ['pip', 'uninstall', name, '--yes']
-            cmd = Process(args=args, timeout=30, shell=False)
+            args = Interpreter.get_pip_args('uninstall', name, '--yes')
+            cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='uninstall'))
             cmd.run(raise_exception=False)
+            DistributionIndex.invalidate()
             new_pkg = cls.get_package(name)
             if new_pkg.installed is False:
                 pkg.installed = False
@@ -336,6 +951,40 @@ class PackageHelper(object):
 
         return uninstalled_packages
 
+    @classmethod
+    @coordinated('uninstall')
+    async def uninstall_packages_async(cls, names):
+        """
+        Coroutine which uninstalls a list of packages using a single `pip uninstall --yes a b c ...` invocation
+
+        Returns:
+            :obj:`list`: list of :obj:`Package` which were uninstalled, Package.installed will be False
+        """
+        if isinstance(names, str):
+            names = [names]
+        packages = Package.many(names=names)
+        installed_packages = [p for p in packages if p.installed is True]
+        cls.log.info(f"Preparing to uninstall {len(packages)} packages: {', '.join(names)}")
+        if len(installed_packages) == 0:
+            return []
+        cls.log.info(f"{len(installed_packages)} packages will be uninstalled: " + \
+                     f"{', '.join(n.name for n in installed_packages)}")
+        args = Interpreter.get_pip_args('uninstall', '--yes', *[p.name for p in installed_packages])
+        cmd = Process(args=args, shell=False,
+                      **Timeouts.get_kwargs(operation='uninstall', packages=len(installed_packages)))
+        await cmd.run_async(raise_exception=False)
+        DistributionIndex.invalidate()
+
+        uninstalled_packages = []
+        for pkg in installed_packages:
+            if cls.is_installed(name=pkg.name) is False:
+                pkg.installed = False
+                cls.log.info(f"Uninstalled Package({pkg.name})({pkg.version})")
+                uninstalled_packages.append(pkg)
+            else:
+                raise ModuleNotFoundError(f"Failed to uninstall Package({pkg.name})")
+        return uninstalled_packages
+
 
 class PackageClassMethods(object):
     """
@@ -364,6 +1013,7 @@ class PackageClassMethods(object):
 
 
     """
+    __slots__ = ()
     name = NotImplementedError
 
     def install(self, no_dependencies: bool = True):
@@ -432,6 +1082,11 @@ class Package(PackageClassMethods, DataClass):
         installed(:obj:`bool`): Returns :obj:`True` if the package is installed, else returns :obj:`False`
         version(:obj:`str`): Returns :obj:`str` containg the version of the package (if installed)
 
+    Notes
+        `installed` and `version` are looked up on first access and cached, call :obj:`Package.refresh` to read
+        them again after the package was installed or uninstalled. Use :obj:`Package.many` to create many packages
+        from a single pass over the installed environment.
+
     References
         `obj`: PackageClassMethods
         `obj`: DataClass
@@ -450,19 +1105,49 @@ class Package(PackageClassMethods, DataClass):
         str(pkg) # Package(name='boxsdk', installed=True, version='2.7.1')
         pkg.installed # True/False
         pkg.version # 2.7.1
+        Package.many(['boxsdk', 'requests']) # [Package(name='boxsdk', ...), Package(name='requests', ...)]
 
     """
     name: str = dataclasses.field(init=True)
-    installed: bool = dataclasses.field(init=False, default=None)
-    version: str = dataclasses.field(init=False, default=None)
+    installed: bool = dataclasses.field(init=False)
+    version: str = dataclasses.field(init=False)
 
     def __post_init__(self):
         self.__init_typecheck__()
-        if self.installed is None:
-            self.installed = PackageHelper.is_installed(name=self.name)
-        if self.version is None:
-            self.version = PackageHelper.get_version(name=self.name)
-        self.__post_init_typecheck__(allow_none=True)
+
+    def __getattr__(self, attr):
+        # Only called for attributes which are not set yet, ie. `installed` and `version` before the first lookup
+        if attr in ('installed', 'version') and 'name' in self.__dict__:
+            self.refresh()
+            return self.__dict__[attr]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'")
+
+    def refresh(self):
+        """
+        Look up `installed` and `version` again from the installed environment
+
+        Returns:
+            :obj:`Package`: self
+        """
+        self.set_distribution(dist=DistributionIndex.get(name=self.name))
+        return self
+
+    def set_distribution(self, dist):
+        self.installed = dist is not None
+        self.version = None if dist is None else dist.version
+
+    @classmethod
+    def many(cls, names: list):
+        """
+        Return a :obj:`Package` for each name, resolved from a single read of the :obj:`DistributionIndex`
+        """
+        distributions = DistributionIndex.refresh()
+        packages = []
+        for name in names:
+            pkg = cls(name=name)
+            pkg.set_distribution(dist=distributions.get(normalize_name(pkg.name)))
+            packages.append(pkg)
+        return packages
 
 
 @dataclasses.dataclass(init=True, repr=True, eq=True, order=True, unsafe_hash=False, frozen=False)
@@ -495,10 +1180,15 @@ class FrozenPackage(PackageClassMethods, DataClass):
         A new instance of :obj:`FrozenPackage` should not be created by the user. This class is used by methods which
         return installed packages.
 
+    Notes
+        Instances use `__slots__` and have no `__dict__`, environments with thousands of packages create thousands
+        of them.
+
     """
-    name: str = dataclasses.field(init=True)
-    installed: bool = dataclasses.field(init=True)
-    version: str = dataclasses.field(init=True)
+    __slots__ = ('name', 'installed', 'version')
+    name: str
+    installed: bool
+    version: str
 
     def __post_init__(self):
         self.__init_typecheck__()
@@ -506,13 +1196,124 @@ class FrozenPackage(PackageClassMethods, DataClass):
             self.installed = PackageHelper.is_installed(name=self.name)
         self.__post_init_typecheck__(allow_none=True)
 
+    @classmethod
+    def trusted(cls, name: str, version: str, installed: bool = True):
+        """
+        Create an instance without type checking, for values which were read from installed distributions
+        """
+        pkg = object.__new__(cls)
+        pkg.name = name
+        pkg.installed = installed
+        pkg.version = version
+        return pkg
+
+
+class PackageTable(object):
+    """
+    Columnar list of installed packages: one tuple of names and one tuple of versions
+
+    Returned by `Pipy.list(table=True)`. A table of thousands of packages is two tuples, :obj:`FrozenPackage`
+    objects are only created when rows are accessed.
+
+    Usage
+        table = Pipy.list(table=True)
+        len(table) # 3000
+        table.get('python-dateutil') # '2.8.1'
+        'boxsdk' in table # True
+        table[0] # FrozenPackage(name='asttokens', installed=True, version='2.4.1')
+        table.to_list() # [FrozenPackage(...), ...]
+    """
+    __slots__ = ('names', 'versions', '_keys')
+
+    def __init__(self, names: tuple, versions: tuple):
+        self.names = tuple(names)
+        self.versions = tuple(versions)
+        self._keys = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return (FrozenPackage.trusted(name=name, version=version) for name, version in zip(self.names, self.versions))
+
+    def __getitem__(self, idx: int):
+        return FrozenPackage.trusted(name=self.names[idx], version=self.versions[idx])
+
+    def __contains__(self, name: str):
+        return normalize_name(name) in self.get_keys()
+
+    def __eq__(self, other):
+        return isinstance(other, PackageTable) and self.names == other.names and self.versions == other.versions
+
+    def __repr__(self):
+        return f"PackageTable(packages={len(self.names)})"
+
+    def get_keys(self):
+        """
+        Return the normalized name -> row index mapping, built on first use
+        """
+        if self._keys is None:
+            self._keys = {normalize_name(name): idx for idx, name in enumerate(self.names)}
+        return self._keys
+
+    def get(self, name: str, default: str = None):
+        """
+        Return the version of package `name`, or `default` if it is not in the table
+        """
+        idx = self.get_keys().get(normalize_name(name))
+        return default if idx is None else self.versions[idx]
+
+    def items(self):
+        return zip(self.names, self.versions)
+
+    def to_list(self):
+        return list(self)
+
+    @classmethod
+    def benchmark(cls, count: int = 3000, repeat: int = 5):
+        """
+        Measure the time and memory of `count` installed package records as type checked :obj:`FrozenPackage`
+        objects, as :obj:`FrozenPackage.trusted` objects and as a :obj:`PackageTable`
+
+        Usage
+            PackageTable.benchmark() # {'FrozenPackage': {'min': 0.0088, ..., 'memory': 193536}, ...}
+
+        Returns:
+            :obj:`dict`: `FrozenPackage`, `trusted` and `PackageTable` -> min, median and max latency in seconds, and
+                `memory` -> bytes held by the records
+        """
+        import tracemalloc
+        from .benchmark import measure
+
+        # Lists, as read from the installed distributions, the table copies them into its columns
+        names = [f"package-{idx:05d}" for idx in range(count)]
+        versions = [f"1.{idx}.0" for idx in range(count)]
+        builders = {'FrozenPackage': lambda: [FrozenPackage(name=name, installed=True, version=version)
+                                              for name, version in zip(names, versions)],
+                    'trusted': lambda: [FrozenPackage.trusted(name=name, version=version)
+                                        for name, version in zip(names, versions)],
+                    'PackageTable': lambda: cls(names=names, versions=versions)}
+        results = {}
+        for name, build in builders.items():
+            results[name] = measure(build, repeat=repeat)
+            # Measured separately, tracemalloc slows down allocations
+            tracemalloc.start()
+            try:
+                records = build()
+                memory = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            del records
+            results[name]['memory'] = memory
+        return results
+
 
 @dataclasses.dataclass(init=True, repr=True, eq=True, order=True, unsafe_hash=False, frozen=False)
 class PyPiPackage(PackageClassMethods, DataClass):
     """
     Dataclass which represents a package available on PyPi
 
-    Represents the results returned from `pip search`
+    Represents the results returned from the package index, see :obj:`IndexClient.lookup`
 
     Parameters
         name(:obj:`str`, required): Package name
@@ -1,4 +1,10 @@
+from .lockfile import Lockfile
+from .overlay import Overlay
 from .package import PackageHelper
+from .reloader import ModuleReloader
+from .snapshot import Snapshot
+from .timeouts import Timeouts
+from .transaction import Transaction
 from .package import Package
 
 
@@ -70,7 +76,7 @@ class Pipy(object):
     """
 
     @classmethod
-    def list(cls, fast: bool = True):
+    def list(cls, fast: bool = True, table: bool = False, outdated: bool = False):
         """
         Return a list of installed packages, ie `pip list`
 
@@ -81,35 +87,109 @@ class Pipy(object):
          fast(:obj:`bool`, required): If True, default to using an un-documented (but faster <1s vs 6s)
                                       method of obtaining installed packages.
                                       If False, use `pip list` which can take up to 10s sometimes.
+         table(:obj:`bool`, optional): If True, return a columnar `PackageTable` of names and versions, which is
+                                       cheaper than a list for environments with thousands of packages.
+         outdated(:obj:`bool`, optional): If True, return the installed packages which have a newer version on the
+                                          package index, ie `pip list --outdated`, as `PyPiPackage`. Latest
+                                          versions are taken from the PyPi cache and looked up in bulk.
 
         Returns:
          :obj:`list`: list of :obj:`InstalledPackage`
 
         """
+        if outdated is True:
+            return PackageHelper.get_outdated()
+        if table is True:
+            return PackageHelper.get_installed_table()
         if fast is True:
             return PackageHelper.get_installed_packages()
         return PackageHelper.list_packages()
 
     @classmethod
-    def freeze(cls, fast: bool = True):
+    def inspect(cls):
         """
-        Return a list of installed packages, ie `pip freeze`
+        Return information about every installed package, ie `pip inspect`, from a single pip command
+
+        See Also
+            `pip inspect`: https://pip.pypa.io/en/stable/cli/pip_inspect
+
+        Returns:
+         :obj:`dict`: package name -> :obj:`InstalledPackage`
+        """
+        return PackageHelper.inspect_packages()
+
+    @classmethod
+    async def list_async(cls, fast: bool = True):
+        """
+        Coroutine version of :obj:`Pipy.list`, `pip list` is run without blocking the event loop
+
+        Usage
+            packages = await Pipy.list_async(fast=False)
+        """
+        if fast is True:
+            return PackageHelper.get_installed_packages()
+        return await PackageHelper.list_packages_async()
+
+    @classmethod
+    def freeze(cls, fast: bool = True, path: str = None):
+        """
+        Return a list of installed packages with their hash and source, ie `pip freeze`, and write them to a lockfile
 
         See Also
             `pip freeze`: https://pip.pypa.io/en/stable/reference/pip_freeze
+            :obj:`Pipy.restore`
 
         Args:
-         fast(:obj:`bool`, required): If True, default to using an un-documented (but faster <1s vs 6s)
-                                      method of obtaining installed packages.
-                                      If False, use `pip list` which can take up to 10s sometimes.
+         fast(:obj:`bool`, required): Kept for compatibility, installed packages are always read from their metadata.
+         path(:obj:`str`, optional): If set, write the lockfile to `path`
 
         Returns:
-         :obj:`list`: list of :obj:`InstalledPackage`
+         :obj:`list`: list of :obj:`LockedPackage`
 
         """
+        if path is not None:
+            return Lockfile.write(path=path)
+        return Lockfile.get_packages()
 
     @classmethod
-    def show(cls, name: str, fast: bool = True):
+    def restore(cls, path: str, uninstall: bool = False, wheelhouse: bool = False):
+        """
+        Make the installed packages match a lockfile written by :obj:`Pipy.freeze`
+
+        Only the difference is changed: missing or changed packages are installed with a single `pip install` command
+        and, if `uninstall` is True, packages of the target site-packages which are not in the lockfile are
+        uninstalled with a single `pip uninstall` command. Nothing is executed if the environment already matches.
+
+        Args:
+         path(:obj:`str`, required): path of the lockfile
+         uninstall(:obj:`bool`, optional): If True, uninstall packages which are not in the lockfile, except pip,
+            setuptools, wheel and Pipy
+         wheelhouse(:obj:`bool`, optional): If True, install from the local `Wheelhouse`
+
+        Returns:
+         :obj:`tuple`: (installed, uninstalled) list of :obj:`LockedPackage` and list of package names
+
+        """
+        return Lockfile.restore(path=path, uninstall=uninstall, wheelhouse=wheelhouse)
+
+    @classmethod
+    def snapshot(cls):
+        """
+        Return a `Snapshot` of the installed packages, which can be compared with a later snapshot
+
+        Usage
+            before = Pipy.snapshot()
+            Pipy.install('boxsdk')
+            before.diff(Pipy.snapshot()) # SnapshotDiff(added=['boxsdk'], ...)
+
+        Returns:
+         :obj:`Snapshot`
+
+        """
+        return Snapshot.take()
+
+    @classmethod
+    def show(cls, name: str, fast: bool = True, chunk_size: int = None, max_workers: int = None, native: bool = True):
         """
         Get information about a package. Returns a `Package` object with attrs: name, installed, version. ie. `pip show`
 
@@ -118,21 +198,48 @@ class Pipy(object):
             `pip show`: https://pip.pypa.io/en/stable/reference/pip_show
 
         Args:
-            name(:obj:`str`, required): package name
+            name(:obj:`str`, required): package name, or list of package names
             fast(:obj:`bool`, required): If True, default to using an un-documented (but faster <1s vs 6s)
                                     method of obtaining installed packages.
                                     If False, use `pip list` which can take up to 10s sometimes.
+            chunk_size(:obj:`int`, optional): When `name` is a list, number of names passed to each `pip show`
+            max_workers(:obj:`int`, optional): When `name` is a list, number of `pip show` commands run in parallel
+            native(:obj:`bool`, optional): If True and `fast` is False, read the package metadata in-process instead
+                                           of executing `pip show` (milliseconds instead of seconds). Defaults to True.
 
         Returns:
-            :obj:`list`: list of :obj:`InstalledPackage`
+            :obj:`list`: list of :obj:`InstalledPackage`, or a :obj:`dict` of name -> :obj:`InstalledPackage` when
+                         `name` is a list
 
         """
+        if isinstance(name, list) or isinstance(name, tuple):
+            if fast is True:
+                return {n: Package(name=n) for n in name}
+            if native is True:
+                return PackageHelper.read_packages(names=name)
+            return PackageHelper.show_packages(names=name, chunk_size=chunk_size, max_workers=max_workers)
         if fast is True:
             return Package(name=name)
+        if native is True:
+            return PackageHelper.read_package(name=name)
         return PackageHelper.show_package(name=name)
 
     @classmethod
-    def install(cls, name: str, no_dependencies=True):
+    async def show_async(cls, name: str, fast: bool = True):
+        """
+        Coroutine version of :obj:`Pipy.show`, `pip show` is run without blocking the event loop
+
+        Usage
+            packages = await asyncio.gather(*[Pipy.show_async(name, fast=False) for name in ('pandas', 'numpy')])
+        """
+        if fast is True:
+            return Package(name=name)
+        return await PackageHelper.show_package_async(name=name)
+
+    @classmethod
+    def install(cls, name: str, no_dependencies=True, batch: bool = False, preflight: bool = False,
+                wheelhouse: bool = False, progress=None, timeout=None, transaction: bool = False, overlay=None,
+                reload: bool = False):
         """
         Install a `PyPiPackage` by `name`, without dependencies, and only if not installed already. Will not upgrade any packages
 
@@ -142,17 +249,96 @@ class Pipy(object):
             `pip install`: https://pip.pypa.io/en/stable/reference/pip_install
 
         Args:
-            name(:obj:`str`, required): package name
+            name(:obj:`str`, required): package name, or list of package names
             no_dependencies(:obj:`bool`, required): If True, do not install extra dependencies (default)
+            batch(:obj:`bool`, optional): If True, install every package with a single `pip install` command and
+                                          report failed packages with PyPiPackage.installed=False instead of raising.
+            preflight(:obj:`bool`, optional): If True, run pip's resolver with `--dry-run` before installing and
+                                              raise `ConflictError` if the install would change a dependency in a
+                                              way which breaks an installed package.
+            wheelhouse(:obj:`bool`, optional): If True, install with a single `pip install --no-index` command from
+                                               the local `Wheelhouse`, which downloads missing wheels only once.
+            progress(:obj:`callable`, optional): Called with a `ProgressEvent` for each step reported by pip while
+                                                 it runs, ex. `Pipy.install('torch', progress=print)`
+            timeout(:obj:`float`, optional): Wall clock limit of `pip install` in seconds, or a `TimeoutPolicy`.
+                                             Defaults to the `install` policy of `Timeouts`.
+            transaction(:obj:`bool`, optional): If True, restore every changed package if any package fails to
+                                                install or the install times out, see `Transaction`. Failed packages
+                                                raise `ModuleNotFoundError` even with `batch`.
+            overlay(:obj:`str`, optional): If set, install into the `Overlay` of this name, or of the current user if
+                                           True, and prepend it to `sys.path`. The shared environment is not changed.
+            reload(:obj:`bool`, optional): If True, reload the imported modules of every package which changed, see
+                                           `Pipy.reload`
 
         Returns:
             :obj:`InstalledPackage`: Package.installed will be True
 
         """
-        return PackageHelper.install_package(name=name, no_dependencies=no_dependencies)
+        if reload is True:
+            before = Snapshot.take()
+            packages = cls.install(name=name, no_dependencies=no_dependencies, batch=batch, preflight=preflight,
+                                   wheelhouse=wheelhouse, progress=progress, timeout=timeout, transaction=transaction,
+                                   overlay=overlay)
+            cls.reload(snapshot=before)
+            return packages
+        if overlay is not None and overlay is not False:
+            overlay = Overlay(name=None if overlay is True else overlay)
+            with Timeouts.override(install=timeout):
+                return overlay.install(names=name, no_dependencies=no_dependencies, wheelhouse=wheelhouse)
+        if transaction is True:
+            with Transaction(names=name, no_dependencies=no_dependencies):
+                packages = cls.install(name=name, no_dependencies=no_dependencies, batch=batch, preflight=preflight,
+                                       wheelhouse=wheelhouse, progress=progress, timeout=timeout)
+                for pkg in packages if batch is True else []:
+                    if pkg.installed is False:
+                        raise ModuleNotFoundError(f"Failed to install PyPiPackage({pkg.name})({pkg.version})")
+            return packages
+        with Timeouts.override(install=timeout):
+            if batch is True or wheelhouse is True:
+                packages = PackageHelper.install_packages(names=name,
+                                                          no_dependencies=no_dependencies,
+                                                          preflight=preflight,
+                                                          wheelhouse=wheelhouse,
+                                                          progress=progress)
+                if batch is True:
+                    return packages
+                for pkg in packages:
+                    if pkg.installed is False:
+                        raise ModuleNotFoundError(f"Failed to install PyPiPackage({pkg.name})({pkg.version})")
+                return packages
+            return PackageHelper.install_package(name=name,
+                                                 no_dependencies=no_dependencies,
+                                                 preflight=preflight,
+                                                 progress=progress)
 
     @classmethod
-    def uninstall(cls, name: str):
+    async def install_async(cls, name: str, no_dependencies=True, batch: bool = False, timeout=None):
+        """
+        Coroutine version of :obj:`Pipy.install`
+
+        PyPi is searched for every package concurrently, and all packages are installed with a single `pip install`.
+
+        Args:
+            name(:obj:`str`, required): package name, or list of package names
+            no_dependencies(:obj:`bool`, required): If True, do not install extra dependencies (default)
+            batch(:obj:`bool`, optional): If True, report failed packages with PyPiPackage.installed=False instead of
+                                          raising `ModuleNotFoundError`.
+            timeout(:obj:`float`, optional): Wall clock limit of `pip install` in seconds, or a `TimeoutPolicy`.
+
+        Returns:
+            :obj:`list`: list of :obj:`PyPiPackage`
+        """
+        with Timeouts.override(install=timeout):
+            packages = await PackageHelper.install_packages_async(names=name, no_dependencies=no_dependencies)
+        if batch is True:
+            return packages
+        for pkg in packages:
+            if pkg.installed is False:
+                raise ModuleNotFoundError(f"Failed to install PyPiPackage({pkg.name})({pkg.version})")
+        return packages
+
+    @classmethod
+    def uninstall(cls, name: str, timeout=None, transaction: bool = False):
         """
         Uninstall a package by `name`,  only if the package is currently installed.
 
@@ -162,20 +348,54 @@ class Pipy(object):
 
         Args:
           name(:obj:`str`, required): package name
+          timeout(:obj:`float`, optional): Wall clock limit of `pip uninstall` in seconds, or a `TimeoutPolicy`
+          transaction(:obj:`bool`, optional): If True, reinstall the uninstalled packages if one of them fails to
+                                              uninstall, see `Transaction`
 
         Returns:
           obj:`Package`: Package.installed will be False
 
         """
-        return PackageHelper.uninstall_package(name=name)
+        if transaction is True:
+            with Transaction(names=name):
+                return cls.uninstall(name=name, timeout=timeout)
+        with Timeouts.override(uninstall=timeout):
+            return PackageHelper.uninstall_package(name=name)
+
+    @classmethod
+    async def uninstall_async(cls, name: str, timeout=None):
+        """
+        Coroutine version of :obj:`Pipy.uninstall`, all packages are uninstalled with a single `pip uninstall`
+        """
+        with Timeouts.override(uninstall=timeout):
+            return await PackageHelper.uninstall_packages_async(names=name)
+
+    @classmethod
+    def reload(cls, name: str = None, snapshot: Snapshot = None, dependents: bool = True):
+        """
+        Reload the imported modules of packages which were installed or upgraded, without restarting the interpreter
+
+        Args:
+            name(:obj:`str`, optional): package name, or list of package names
+            snapshot(:obj:`Snapshot`, optional): reload every package which changed since `Pipy.snapshot()`
+            dependents(:obj:`bool`, optional): If True, also reload the imported modules of the packages which depend
+                                               on them (default)
+
+        Returns:
+            :obj:`ReloadReport`: the reloaded modules, and the modules which could not be reloaded safely
+
+        Usage
+            Pipy.reload('boxsdk').safe # True
+        """
+        return ModuleReloader.reload(names=name, snapshot=snapshot, dependents=dependents)
 
     @classmethod
     def search(cls, name: str):
         """
         Search PyPi package for a package by `name`. Return a list of `PyPiPackage` search results
 
-        See Also
-              `pip uninstall`: https://pip.pypa.io/en/stable/reference/pip_search
+        PyPi has disabled `pip search`, so the package index is queried for an exact (normalized) match of `name`,
+        see :obj:`IndexClient`. The result list contains at most one package.
 
         Args:
             name(:obj:`str`, required): package name
@@ -187,6 +407,16 @@ class Pipy(object):
         """
         return PackageHelper.search_pypi(name=name)
 
+    @classmethod
+    async def search_async(cls, name: str):
+        """
+        Coroutine version of :obj:`Pipy.search`, many searches can run concurrently from one event loop
+
+        Usage
+            results = await asyncio.gather(Pipy.search_async('requests'), Pipy.search_async('boxsdk'))
+        """
+        return await PackageHelper.search_pypi_async(name=name)
+
     @classmethod
     def get_package(cls, name: str):
         """
@@ -225,7 +455,6 @@ class Pipy(object):
 
         See Also
             :method:`Pipy.get_pypi_package`
-            `pip search`: https://pip.pypa.io/en/stable/reference/pip_search
 
         Args:
            name(:obj:`str`, required): package name
@@ -254,8 +483,5 @@ class Pipy(object):
            obj:`bool`: True if the package is installed
 
         """
-        pkg = cls.get_package(name=name)
-        if pkg is not None and pkg.installed is True:
-            return True
-        return False
+        return PackageHelper.is_installed(name=name)
 
@@ -0,0 +1,149 @@
+import json
+
+from .cache import JsonCache, get_cache_key
+from .distributions import DistributionIndex
+from .graph import DependencyGraph
+from .interpreter import Interpreter
+from .logging import get_logger
+from .process import Process
+from .requirements import normalize_name
+from .timeouts import Timeouts
+
+
+class ConflictError(RuntimeError):
+    """
+    Raised when an install plan would break the requirements of installed packages
+
+    Attributes
+        conflicts(:obj:`list`): list of :obj:`Conflict`
+    """
+
+    def __init__(self, message: str, conflicts: list):
+        super().__init__(message)
+        self.conflicts = conflicts
+
+
+class Preflight(object):
+    """
+    Checks what `pip install` would change before anything is installed
+
+    Runs pip's resolver with `pip install --dry-run --report -`, then checks every planned install or upgrade against
+    the requirements of the installed packages in the :obj:`DependencyGraph`. Plans which would break an installed
+    package are refused with a :obj:`ConflictError`.
+
+    Resolver reports are cached per (requirement set, install options, environment fingerprint), so a cluster which
+    starts from the same environment and installs the same packages skips the resolver.
+
+    Usage
+        Preflight.check(['boxsdk']) # [Conflict(name='pandas', requirement='python-dateutil<2', ...)]
+        Preflight.ensure(['boxsdk']) # raises ConflictError
+    """
+    log = get_logger()
+    cache = None
+
+    @classmethod
+    def get_cache(cls):
+        if cls.cache is None:
+            cls.cache = JsonCache(name='reports')
+        return cls.cache
+
+    @classmethod
+    def get_args(cls, names: list, no_dependencies: bool = True, upgrade: bool = False, index_args: list = None):
+        args = Interpreter.get_pip_args('install', '--dry-run', '--quiet', '--report', '-', *names)
+        args.extend(index_args or [])
+        if no_dependencies is True:
+            args.append('--no-dependencies')
+        if upgrade is True:
+            args.append('--upgrade')
+            args.extend(['--upgrade-strategy', 'only-if-needed'])
+        return args
+
+    @classmethod
+    def get_report(cls, names: list, no_dependencies: bool = True, upgrade: bool = False, use_cache: bool = True,
+                   index_args: list = None):
+        """
+        Return pip's installation report for `names` without installing anything, `index_args` select where pip
+        looks for packages, ex. :obj:`Wheelhouse.get_install_args`
+
+        See: https://pip.pypa.io/en/stable/reference/installation-report/
+
+        Returns:
+            :obj:`dict`: the parsed JSON report
+        """
+        args = cls.get_args(names=names, no_dependencies=no_dependencies, upgrade=upgrade, index_args=index_args)
+        key = get_cache_key(sorted(names), no_dependencies, upgrade, DistributionIndex.get_fingerprint())
+        if index_args:
+            key = get_cache_key(key, index_args)
+        if use_cache is True:
+            report = cls.get_cache().get(key=key)
+            if report is not None:
+                cls.log.info(f"Using cached resolver report for {len(names)} packages: {', '.join(names)}")
+                return report
+
+        cls.log.info(f"Resolving {len(names)} packages: {', '.join(names)} ...")
+        cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='resolve', packages=len(names)))
+        cmd.run(raise_exception=True)
+        report = json.loads(cmd.stdout)
+        cls.get_cache().set(key=key, value=report)
+        return report
+
+    @classmethod
+    def get_plan(cls, report: dict):
+        """
+        Return the planned changes of a report
+
+        Returns:
+            :obj:`dict`: normalized name -> version which would be installed
+        """
+        plan = {}
+        for item in report.get('install', []):
+            metadata = item.get('metadata', {})
+            plan[normalize_name(metadata['name'])] = metadata['version']
+        return plan
+
+    @classmethod
+    def check(cls, names: list, no_dependencies: bool = True, upgrade: bool = False, use_cache: bool = True):
+        """
+        Return the conflicts between what `pip install names` would install and the installed packages
+
+        Packages which are replaced by the same plan are not reported, their new versions declare new requirements.
+        The check is skipped when the target pip is older than 22.2, which has no `--dry-run --report`.
+
+        Returns:
+            :obj:`list`: list of :obj:`Conflict`, empty if the plan is safe
+        """
+        if isinstance(names, str):
+            names = [names]
+        capabilities = Interpreter.get_capabilities()
+        if capabilities.dry_run is False or capabilities.report is False:
+            cls.log.warning(f"pip({capabilities.version}) does not support `install --dry-run --report`, " + \
+                            "skipping the preflight check")
+            return []
+        report = cls.get_report(names=names, no_dependencies=no_dependencies, upgrade=upgrade, use_cache=use_cache)
+        plan = cls.get_plan(report=report)
+        graph = DependencyGraph.current()
+        conflicts = []
+        for key, version in plan.items():
+            dist = graph.distributions.get(key)
+            if dist is not None and dist.version == version:
+                continue
+            if dist is not None:
+                cls.log.info(f"Package({key}) would be changed from {dist.version} to {version}")
+            for conflict in graph.impact(name=key, version=version):
+                if conflict.name not in plan:
+                    conflicts.append(conflict)
+        return conflicts
+
+    @classmethod
+    def ensure(cls, names: list, no_dependencies: bool = True, upgrade: bool = False, use_cache: bool = True):
+        """
+        Raise :obj:`ConflictError` if `pip install names` would break an installed package, see :obj:`Preflight.check`
+        """
+        conflicts = cls.check(names=names, no_dependencies=no_dependencies, upgrade=upgrade, use_cache=use_cache)
+        if len(conflicts) > 0:
+            for conflict in conflicts:
+                cls.log.error(f"Package({conflict.name})({conflict.version}) requires {conflict.requirement}, " + \
+                              f"install would change {conflict.dependency} to {conflict.dependency_version}")
+            raise ConflictError(f"Installing {', '.join(names)} would break {len(conflicts)} installed requirements",
+                                conflicts=conflicts)
+        return None
@@ -1,23 +1,134 @@
+import asyncio
+import codecs
+import collections
 import locale
 import os
+import queue
+import re
+import signal
 import subprocess
+import threading
+import time
 from collections import OrderedDict
 
-from .assertions import assert_bool, assert_int, assert_list, assert_str
+from .assertions import assert_bool, assert_float, assert_list, assert_str
+from .interpreter import Interpreter
 from .logging import get_logger
+from .worker import PipWorker, WorkerError
+
+RE_LINE_END = re.compile(r'\r\n|\r|\n')
+SIGKILL = getattr(signal, 'SIGKILL', signal.SIGTERM)
+
+
+class InactivityTimeout(subprocess.TimeoutExpired):
+    """
+    Raised when a command does not print anything for `timeout` seconds, a subclass of `subprocess.TimeoutExpired`
+    """
+
+    def __str__(self):
+        return f"Command '{self.cmd}' produced no output for {self.timeout} seconds"
+
+
+class Watchdog(object):
+    """
+    Tracks the wall clock deadline and the inactivity deadline of a command
+
+    The inactivity deadline moves each time :obj:`Watchdog.touch` is called, ie when the command prints something,
+    so a long download which reports progress is not stopped while a command which hangs silently is.
+    """
+
+    def __init__(self, timeout: float = None, inactivity_timeout: float = None):
+        self.timeout = timeout
+        self.inactivity_timeout = inactivity_timeout
+        self.started = self.active = time.monotonic()
+        self.reason = None
+
+    def touch(self):
+        self.active = time.monotonic()
+
+    def remaining(self):
+        """
+        Return the seconds until the next deadline, 0 if a deadline passed, or None if there is no deadline
+        """
+        now = time.monotonic()
+        remaining, reason = None, None
+        if self.timeout is not None:
+            remaining, reason = self.started + self.timeout - now, 'timeout'
+        if self.inactivity_timeout is not None:
+            idle = self.active + self.inactivity_timeout - now
+            if remaining is None or idle < remaining:
+                remaining, reason = idle, 'inactivity'
+        if remaining is not None and remaining <= 0:
+            self.reason = reason
+            return 0
+        return remaining
+
+    def expired(self):
+        return self.remaining() == 0
+
+    def get_error(self, cmd: list, output: str = None):
+        if self.reason == 'inactivity':
+            return InactivityTimeout(cmd=cmd, timeout=self.inactivity_timeout, output=output)
+        return subprocess.TimeoutExpired(cmd=cmd, timeout=self.timeout, output=output)
+
+
+class LineBuffer(object):
+    """
+    Splits a stream of bytes into decoded lines
+
+    Lines end with `\\n`, `\\r\\n` or `\\r`, so each redraw of a progress bar is a line. Empty lines are dropped, and
+    a partial line longer than `max_length` is returned as a line, so memory is bounded whatever the output.
+    """
+
+    def __init__(self, encoding: str, max_length: int = 64 * 1024):
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.max_length = max_length
+        self.buffer = ''
+
+    def feed(self, data: bytes):
+        lines = RE_LINE_END.split(self.buffer + self.decoder.decode(data))
+        self.buffer = lines.pop()
+        if len(self.buffer) > self.max_length:
+            lines.append(self.buffer)
+            self.buffer = ''
+        return [line for line in lines if len(line) > 0]
+
+    def flush(self):
+        lines = RE_LINE_END.split(self.buffer + self.decoder.decode(b'', final=True))
+        self.buffer = ''
+        return [line for line in lines if len(line) > 0]
 
 
 class Process(object):
+    """
+    Runs a command with a wall clock `timeout` and an optional `inactivity_timeout`, both in seconds or None
+
+    The command is started in its own process group. When a deadline passes, or the caller is interrupted, the
+    group receives `SIGTERM` and, if it is still running after `grace` seconds, `SIGKILL`, so the children of the
+    command (ex. build backends started by pip) are stopped with it.
+
+    `pip ...` commands run by :obj:`Process.run` are sent to a :obj:`PipWorker` when `worker` is True, or when it
+    is None and the worker is enabled. The worker only enforces the wall clock `timeout`.
+
+    See Also
+        :obj:`Timeouts` for the timeout policy of each pip command
+    """
 
     def __init__(self,
                  args: list,
-                 timeout: int = 15,
-                 shell: bool = False
+                 timeout: float = 15,
+                 shell: bool = False,
+                 inactivity_timeout: float = None,
+                 grace: float = 10,
+                 worker: bool = None
                  ):
 
         self.args = assert_list(value=args, name='args')
         self.args_str = assert_str(value=" ".join(self.args), name='args')
-        self.timeout = assert_int(value=timeout, name='timeout')
+        self.timeout = assert_float(value=timeout, name='timeout', allow_none=True)
+        self.inactivity_timeout = assert_float(value=inactivity_timeout, name='inactivity_timeout', allow_none=True)
+        self.grace = assert_float(value=grace, name='grace')
+        self.worker = assert_bool(value=worker, name='worker', allow_none=True)
         self.shell = assert_bool(value=shell, name='shell')
         self.encoding = assert_str(value=locale.getpreferredencoding(), name='encoding')
         self.linesep = assert_str(value=os.linesep, name='linesep')
@@ -34,6 +145,8 @@ class Process(object):
         self.keys = ('args',
                      'pid',
                      'timeout',
+                     'inactivity_timeout',
+                     'grace',
                      'shell',
                      'encoding',
                      'linesep',
@@ -51,6 +164,8 @@ class Process(object):
                 self.args_str,
                 self.pid,
                 self.timeout,
+                self.inactivity_timeout,
+                self.grace,
                 self.shell,
                 self.encoding,
                 self.linesep,
@@ -77,25 +192,34 @@ class Process(object):
         else:
             return "{LOG_BASE}: {MSG}".format(LOG_BASE=self._log_base, MSG=msg)
 
-    def p_open(self):
+    @classmethod
+    def get_session_args(cls):
+        """
+        Return the `subprocess.Popen` arguments which start a command in a new process group
+        """
+        if os.name == 'posix':
+            return {'start_new_session': True}
+        return {'creationflags': getattr(subprocess, 'CREATE_NEW_PROCESS_GROUP', 0)}
+
+    def get_watchdog(self):
+        return Watchdog(timeout=self.timeout, inactivity_timeout=self.inactivity_timeout)
+
+    def p_open(self, stderr=subprocess.PIPE):
         try:
             proc = subprocess.Popen(args=self.args,
                                     bufsize=-1,
                                     executable=None,
                                     stdin=subprocess.PIPE,
                                     stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
+                                    stderr=stderr,
                                     close_fds=True,
                                     shell=self.shell,
                                     cwd=None,
                                     env=None,
                                     universal_newlines=False,
                                     startupinfo=None,
-                                    creationflags=0,
                                     restore_signals=True,
-                                    start_new_session=False,
-                                    encoding=self.encoding,
-                                    errors=None
+                                    **self.get_session_args()
                                     )
             return proc
         except Exception as e:
@@ -105,60 +229,440 @@ class Process(object):
 
                 raise e
 
+    def get_pip_args(self):
+        """
+        Return the arguments of a `pip` command, ex. `['show', 'requests']`, or None if the command is not `pip`
+        """
+        if self.shell is True or len(self.args) == 0:
+            return None
+        if self.args[0] == 'pip':
+            return self.args[1:]
+        if self.args[1:3] == ['-m', 'pip'] and self.args[0] == Interpreter.get_executable():
+            return self.args[3:]
+        return None
+
+    def use_worker(self):
+        if self.worker is False or self.get_pip_args() is None:
+            return False
+        return self.worker is True or PipWorker.is_enabled()
+
+    def run_worker(self, stdin: str = None, raise_exception: bool = True):
+        """
+        Run the `pip` command in a :obj:`PipWorker`, or in a new process if the worker crashes
+        """
+        try:
+            return_code, stdout, stderr = PipWorker.execute(args=self.get_pip_args(), stdin=stdin,
+                                                            timeout=self.timeout)
+        except WorkerError as e:
+            self.log.warning(self.build_log_str(msg=f"{e}, running the command in a new process"))
+            proc = self.p_open()
+            return self.communicate(proc=proc, stdin=stdin, raise_exception=raise_exception)
+        except subprocess.TimeoutExpired:
+            watchdog = self.get_watchdog()
+            watchdog.reason = 'timeout'
+            self.set_timeout(return_code=None, watchdog=watchdog)
+            raise
+        return self.set_result(return_code=return_code, stdout=stdout, stderr=stderr, raise_exception=raise_exception)
+
     def run(self, stdin: str = None, raise_exception: bool = True):
         self.stdin = assert_str(stdin, name='stdin', allow_none=True)
+        if self.use_worker() is True:
+            return self.run_worker(stdin=stdin, raise_exception=raise_exception)
         proc = self.p_open()
         stdout, stderr = self.communicate(proc=proc, stdin=stdin, raise_exception=raise_exception)
         return stdout, stderr
 
-    def communicate(self, proc, stdin=None, raise_exception: bool = True):
-        try:
-            stdout, stderr = proc.communicate(input=stdin, timeout=self.timeout)
-            self.pid = proc.pid
-            self.status_code = proc.poll()
-            self.return_code = proc.returncode
-            if stderr is not None:
-                self.stderr = stderr
-
-            if stdout is not None:
-                self.stdout = stdout
-            if self.return_code is None:
-                self.return_code = 1
-                self.failed = True
-            if isinstance(self.return_code, int) and self.return_code > 0 or self.return_code < 0:
-                self.failed = True
-                if raise_exception is True:
-                    self.log.error(self.build_log_str(
-                            msg="Exited with non-zero status {STATUS}: {STDERR}".format(STATUS=self.return_code,
-                                                                                        NEWLINE=self.linesep,
-                                                                                        STDERR=self.stderr),
-                            name='STDOUT')
-                            )
-                    raise subprocess.CalledProcessError(returncode=self.return_code,
-                                                        cmd=self.args,
-                                                        output=self.stdout,
-                                                        stderr=self.stderr)
-
-            return stdout, stderr
+    async def run_async(self, stdin: str = None, raise_exception: bool = True):
+        """
+        Coroutine version of :obj:`Process.run`, built on `asyncio.create_subprocess_exec`
 
+        Has the same timeout and `subprocess.CalledProcessError` semantics as :obj:`Process.run`, but does not block
+        the event loop while the command runs.
+        """
+        self.stdin = assert_str(stdin, name='stdin', allow_none=True)
+        if self.use_worker() is True:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self.run_worker, stdin, raise_exception)
+        proc = await self.p_open_async()
+        stdout, stderr = await self.communicate_async(proc=proc, stdin=stdin, raise_exception=raise_exception)
+        return stdout, stderr
+
+    async def p_open_async(self, stderr=subprocess.PIPE):
+        try:
+            if self.shell is True:
+                proc = await asyncio.create_subprocess_shell(cmd=self.args_str,
+                                                             stdin=subprocess.PIPE,
+                                                             stdout=subprocess.PIPE,
+                                                             stderr=stderr,
+                                                             close_fds=True,
+                                                             **self.get_session_args()
+                                                             )
+            else:
+                proc = await asyncio.create_subprocess_exec(*self.args,
+                                                            stdin=subprocess.PIPE,
+                                                            stdout=subprocess.PIPE,
+                                                            stderr=stderr,
+                                                            close_fds=True,
+                                                            **self.get_session_args()
+                                                            )
+            return proc
         except Exception as e:
             if isinstance(e, FileNotFoundError):
-                self.log.error(self.build_log_str("Command not found: {CMD}".format(CMD=" ".join(proc.args))))
-            if isinstance(e, subprocess.TimeoutExpired):
-                self.status_code = proc.poll()
-                proc.kill()
-                self.return_code = proc.returncode
-                self.log.error(self.build_log_str(msg="Timeout after {TIMEOUT}s with {RETURN_CODE} status".format(
-                        TIMEOUT=self.timeout,
-                        RETURN_CODE=self.return_code
-                        ),
-
-                        ))
-            if isinstance(e, subprocess.SubprocessError):
-                self.status_code = proc.poll()
-                self.return_code = proc.returncode
-                self.log.error(
-                        self.build_log_str("Exited with status: {RETURN_CODE}".format(RETURN_CODE=self.return_code)))
+                self.log.error(self.build_log_str(msg="Command not found: {CMD}".format(CMD=" ".join(self.args))))
             raise e
+
+    def stream(self, stdin: str = None, raise_exception: bool = True, tail: int = 1000, chunk_size: int = 64 * 1024,
+               merge_stderr: bool = True):
+        """
+        Run the command and yield its output lines as they arrive, stderr is merged into stdout unless `merge_stderr`
+        is False, ex. when stdout is a JSON document
+
+        Output is read by a background thread into a bounded queue, so memory does not grow with the output. After
+        the command exits only the last `tail` lines are kept in `stdout`, and in `stderr` when it is merged. The
+        process group is terminated if the consumer stops iterating before the command exits.
+
+        Usage
+            args = Interpreter.get_pip_args('install', 'torch')
+            for line in Process(args=args, timeout=None, inactivity_timeout=600).stream():
+                print(line)
+
+        Raises:
+            :obj:`subprocess.TimeoutExpired` if the command runs longer than `timeout`
+            :obj:`InactivityTimeout` if the command prints nothing for `inactivity_timeout`
+            :obj:`subprocess.CalledProcessError` if the command fails and `raise_exception` is True
+        """
+        self.stdin = assert_str(stdin, name='stdin', allow_none=True)
+        proc = self.p_open(stderr=subprocess.STDOUT if merge_stderr is True else subprocess.PIPE)
+        self.pid = proc.pid
+        watchdog = self.get_watchdog()
+        lines = queue.Queue(maxsize=16)
+        stopped = threading.Event()
+        reader = threading.Thread(target=self.read_lines, args=(proc.stdout, lines, chunk_size, stopped),
+                                  daemon=True)
+        reader.start()
+        stderr, readers = [], []
+        if merge_stderr is False:
+            readers.append(threading.Thread(target=self.read_chunks, args=(proc.stderr, stderr, watchdog),
+                                            daemon=True))
+            readers[0].start()
+        self.write_stdin(proc=proc, stdin=stdin)
+        last_lines = collections.deque(maxlen=tail)
+        try:
+            while True:
+                try:
+                    chunk = lines.get(timeout=watchdog.remaining())
+                except queue.Empty:
+                    if watchdog.expired():
+                        raise self.stop(proc=proc, watchdog=watchdog) from None
+                    continue
+                watchdog.touch()
+                if chunk is None:
+                    break
+                last_lines.extend(chunk)
+                yield from chunk
+            if self.wait(proc=proc, watchdog=watchdog, readers=readers) is False:
+                raise self.stop(proc=proc, watchdog=watchdog)
+        finally:
+            # The reader may be blocked on a full queue if the consumer stopped early
+            stopped.set()
+            if proc.poll() is None:
+                self.terminate(proc=proc)
+            self.drain(lines=lines)
+            reader.join(timeout=1)
+        output = self.linesep.join(last_lines)
+        self.set_result(return_code=proc.returncode,
+                        stdout=output,
+                        stderr=output if merge_stderr is True else self.decode(stderr),
+                        raise_exception=raise_exception
+                        )
+
+    def read_lines(self, pipe, lines: queue.Queue, chunk_size: int, stopped: threading.Event = None):
+        """
+        Read `pipe` until EOF and put the lines of each chunk in `lines`, then None. Returns early once `stopped` is
+        set, so the thread never stays blocked on a full queue which is no longer consumed.
+        """
+        stopped = stopped or threading.Event()
+        buffer = LineBuffer(encoding=self.encoding)
+        try:
+            while not stopped.is_set():
+                data = pipe.read1(chunk_size) if hasattr(pipe, 'read1') else pipe.read(chunk_size)
+                if len(data) == 0:
+                    break
+                chunk = buffer.feed(data)
+                if len(chunk) > 0 and self.put(lines=lines, item=chunk, stopped=stopped) is False:
+                    return
+            self.put(lines=lines, item=buffer.flush(), stopped=stopped)
+        except (OSError, ValueError):
+            pass
         finally:
+            self.put(lines=lines, item=None, stopped=stopped)
+
+    @classmethod
+    def put(cls, lines: queue.Queue, item, stopped: threading.Event, interval: float = 0.1):
+        """
+        Put `item` in `lines`, or return False if `stopped` is set while the queue is full
+        """
+        while not stopped.is_set():
+            try:
+                lines.put(item, timeout=interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @classmethod
+    def drain(cls, lines: queue.Queue):
+        while True:
+            try:
+                lines.get_nowait()
+            except queue.Empty:
+                return
+
+    def read_chunks(self, pipe, chunks: list, watchdog: Watchdog, chunk_size: int = 64 * 1024):
+        """
+        Read `pipe` until EOF into `chunks`, each read moves the inactivity deadline of `watchdog`
+        """
+        try:
+            while True:
+                data = pipe.read1(chunk_size) if hasattr(pipe, 'read1') else pipe.read(chunk_size)
+                if len(data) == 0:
+                    break
+                chunks.append(data)
+                watchdog.touch()
+        except (OSError, ValueError):
+            pass
+
+    def write_stdin(self, proc, stdin: str = None):
+        try:
+            if stdin is not None:
+                proc.stdin.write(stdin.encode(self.encoding))
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def decode(self, chunks: list):
+        # Same newline translation as a text mode `subprocess.Popen`
+        text = b''.join(chunks).decode(self.encoding, errors='replace')
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    def wait(self, proc, watchdog: Watchdog, readers: list = ()):
+        """
+        Wait until the `readers` threads reached EOF and the command exited, returns False if a deadline passed first
+        """
+        for reader in readers:
+            while reader.is_alive():
+                remaining = watchdog.remaining()
+                if remaining == 0:
+                    return False
+                reader.join(timeout=remaining)
+        while True:
+            try:
+                proc.wait(timeout=watchdog.remaining())
+                return True
+            except subprocess.TimeoutExpired:
+                if watchdog.expired():
+                    return False
+
+    def signal(self, proc, sig: int):
+        """
+        Send `sig` to the process group of the command, or to the command itself where groups are not supported
+        """
+        try:
+            if os.name == 'posix':
+                os.killpg(proc.pid, sig)
+            elif sig == signal.SIGTERM:
+                proc.terminate()
+            else:
+                proc.kill()
+        except (ProcessLookupError, PermissionError):
             pass
+
+    def terminate(self, proc):
+        """
+        Stop the command and its children, `SIGTERM` first and `SIGKILL` if it is still running after `grace` seconds
+        """
+        self.signal(proc=proc, sig=signal.SIGTERM)
+        try:
+            proc.wait(timeout=self.grace)
+        except subprocess.TimeoutExpired:
+            self.log.warning(self.build_log_str(msg=f"Still running {self.grace}s after SIGTERM, sending SIGKILL"))
+            self.signal(proc=proc, sig=SIGKILL)
+            proc.wait()
+        # Children which ignored SIGTERM or outlived the command
+        self.signal(proc=proc, sig=SIGKILL)
+
+    async def terminate_async(self, proc):
+        """
+        Coroutine version of :obj:`Process.terminate`
+        """
+        self.signal(proc=proc, sig=signal.SIGTERM)
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=self.grace)
+        except asyncio.TimeoutError:
+            self.log.warning(self.build_log_str(msg=f"Still running {self.grace}s after SIGTERM, sending SIGKILL"))
+            self.signal(proc=proc, sig=SIGKILL)
+            await proc.wait()
+        self.signal(proc=proc, sig=SIGKILL)
+
+    def stop(self, proc, watchdog: Watchdog, output: str = None):
+        """
+        Terminate the command after a deadline passed and return the exception to raise
+        """
+        self.terminate(proc=proc)
+        self.set_timeout(return_code=proc.returncode, watchdog=watchdog)
+        return watchdog.get_error(cmd=self.args, output=output)
+
+    async def stop_async(self, proc, watchdog: Watchdog, output: str = None):
+        """
+        Coroutine version of :obj:`Process.stop`
+        """
+        await self.terminate_async(proc=proc)
+        self.set_timeout(return_code=proc.returncode, watchdog=watchdog)
+        return watchdog.get_error(cmd=self.args, output=output)
+
+    def set_timeout(self, return_code: int, watchdog: Watchdog):
+        self.status_code = return_code
+        self.return_code = return_code
+        self.failed = True
+        if watchdog.reason == 'inactivity':
+            msg = f"No output for {self.inactivity_timeout}s, stopped with {self.return_code} status"
+        else:
+            msg = f"Timeout after {self.timeout}s with {self.return_code} status"
+        self.log.error(self.build_log_str(msg=msg))
+
+    async def stream_async(self, stdin: str = None, raise_exception: bool = True, tail: int = 1000,
+                           chunk_size: int = 64 * 1024):
+        """
+        Async iterator version of :obj:`Process.stream`
+
+        Usage
+            async for line in Process(args=Interpreter.get_pip_args('install', 'torch'), timeout=600).stream_async():
+                print(line)
+        """
+        self.stdin = assert_str(stdin, name='stdin', allow_none=True)
+        proc = await self.p_open_async(stderr=subprocess.STDOUT)
+        self.pid = proc.pid
+        watchdog = self.get_watchdog()
+        await self.write_stdin_async(proc=proc, stdin=stdin)
+        buffer = LineBuffer(encoding=self.encoding)
+        last_lines = collections.deque(maxlen=tail)
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(proc.stdout.read(chunk_size), timeout=watchdog.remaining())
+                except asyncio.TimeoutError:
+                    if watchdog.expired():
+                        raise await self.stop_async(proc=proc, watchdog=watchdog) from None
+                    continue
+                watchdog.touch()
+                lines = buffer.feed(data) if len(data) > 0 else buffer.flush()
+                for line in lines:
+                    last_lines.append(line)
+                    yield line
+                if len(data) == 0:
+                    break
+            while proc.returncode is None:
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=watchdog.remaining())
+                except asyncio.TimeoutError:
+                    if watchdog.expired():
+                        raise await self.stop_async(proc=proc, watchdog=watchdog) from None
+        finally:
+            if proc.returncode is None:
+                await self.terminate_async(proc=proc)
+        output = self.linesep.join(last_lines)
+        self.set_result(return_code=proc.returncode, stdout=output, stderr=output, raise_exception=raise_exception)
+
+    async def write_stdin_async(self, proc, stdin: str = None):
+        try:
+            if stdin is not None:
+                proc.stdin.write(stdin.encode(self.encoding))
+                await proc.stdin.drain()
+            proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    async def communicate_async(self, proc, stdin=None, raise_exception: bool = True):
+        self.pid = proc.pid
+        watchdog = self.get_watchdog()
+        stdout, stderr = [], []
+
+        async def read(pipe, chunks: list):
+            while True:
+                data = await pipe.read(64 * 1024)
+                if len(data) == 0:
+                    break
+                chunks.append(data)
+                watchdog.touch()
+
+        task = asyncio.ensure_future(asyncio.gather(self.write_stdin_async(proc=proc, stdin=stdin),
+                                                    read(proc.stdout, stdout),
+                                                    read(proc.stderr, stderr),
+                                                    proc.wait()))
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=watchdog.remaining())
+                if not task.done() and watchdog.expired():
+                    raise await self.stop_async(proc=proc, watchdog=watchdog, output=self.decode(stdout))
+            task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            if proc.returncode is None:
+                await self.terminate_async(proc=proc)
+        return self.set_result(return_code=proc.returncode,
+                               stdout=self.decode(stdout),
+                               stderr=self.decode(stderr),
+                               raise_exception=raise_exception
+                               )
+
+    def set_result(self, return_code: int, stdout: str, stderr: str, raise_exception: bool = True):
+        self.status_code = return_code
+        self.return_code = return_code
+        if stderr is not None:
+            self.stderr = stderr
+
+        if stdout is not None:
+            self.stdout = stdout
+        if self.return_code is None:
+            self.return_code = 1
+            self.failed = True
+        if isinstance(self.return_code, int) and self.return_code > 0 or self.return_code < 0:
+            self.failed = True
+            if raise_exception is True:
+                self.log.error(self.build_log_str(
+                        msg="Exited with non-zero status {STATUS}: {STDERR}".format(STATUS=self.return_code,
+                                                                                    NEWLINE=self.linesep,
+                                                                                    STDERR=self.stderr),
+                        name='STDOUT')
+                        )
+                raise subprocess.CalledProcessError(returncode=self.return_code,
+                                                    cmd=self.args,
+                                                    output=self.stdout,
+                                                    stderr=self.stderr)
+        return stdout, stderr
+
+    def communicate(self, proc, stdin=None, raise_exception: bool = True):
+        """
+        Wait for the command to exit while reading its output, stopping it when a deadline passes
+        """
+        self.pid = proc.pid
+        watchdog = self.get_watchdog()
+        stdout, stderr = [], []
+        readers = [threading.Thread(target=self.read_chunks, args=(pipe, chunks, watchdog), daemon=True)
+                   for pipe, chunks in ((proc.stdout, stdout), (proc.stderr, stderr)) if pipe is not None]
+        for reader in readers:
+            reader.start()
+        self.write_stdin(proc=proc, stdin=stdin)
+        try:
+            if self.wait(proc=proc, watchdog=watchdog, readers=readers) is False:
+                raise self.stop(proc=proc, watchdog=watchdog, output=self.decode(stdout))
+        finally:
+            if proc.poll() is None:
+                self.terminate(proc=proc)
+        return self.set_result(return_code=proc.returncode,
+                               stdout=self.decode(stdout),
+                               stderr=self.decode(stderr),
+                               raise_exception=raise_exception
+                               )
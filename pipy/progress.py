@@ -0,0 +1,136 @@
+import dataclasses
+import re
+
+from .dataclass import DataClass
+from .interpreter import Interpreter
+
+RE_COLLECTING = re.compile(r'^Collecting (?P<name>[^\s\[<>=!~;@]+)')
+RE_DOWNLOADING = re.compile(r'^Downloading (?P<url>\S+?)(?: \((?P<size>[\d.]+) (?P<unit>[kMG]?B)\))?$')
+RE_USING_CACHED = re.compile(r'^Using cached (?P<url>\S+?)(?: \((?P<size>[\d.]+) (?P<unit>[kMG]?B)\))?$')
+RE_RAW_PROGRESS = re.compile(r'^Progress (?P<current>\d+) of (?P<total>\d+)$')
+RE_BAR_PROGRESS = re.compile(r'(?P<current>[\d.]+)/(?P<total>[\d.]+) (?P<unit>[kMG]?B)\b')
+RE_BUILDING = re.compile(r'^Building wheels? for (?P<name>\S+)')
+RE_INSTALLING = re.compile(r'^Installing collected packages: (?P<names>.+)$')
+RE_INSTALLED = re.compile(r'^Successfully installed (?P<names>.+)$')
+RE_SATISFIED = re.compile(r'^Requirement already satisfied: (?P<name>[^\s\[<>=!~;]+)')
+RE_ERROR = re.compile(r'^ERROR: (?P<message>.+)$')
+UNITS = {'B': 1, 'kB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3}
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=False, unsafe_hash=False, frozen=False)
+class ProgressEvent(DataClass):
+    """
+    Dataclass which represents one step reported by `pip install`
+
+    Parameters
+        kind(:obj:`str`, required): One of `collecting`, `downloading`, `progress`, `building`, `satisfied`,
+            `installing`, `installed` or `error`
+        name(:obj:`str`, optional): Package (or file) the event applies to
+        current(:obj:`int`, optional): Bytes downloaded so far, for `downloading` and `progress` events
+        total(:obj:`int`, optional): Size of the download in bytes, if known
+        names(:obj:`list`, optional): Packages of `installing` and `installed` events
+        line(:obj:`str`, optional): The output line the event was parsed from
+
+    Warnings
+        Instances of this class are created by :obj:`PipProgressParser` and are not type checked.
+    """
+    kind: str = dataclasses.field(init=True)
+    name: str = dataclasses.field(init=True, default=None)
+    current: int = dataclasses.field(init=True, default=None)
+    total: int = dataclasses.field(init=True, default=None)
+    names: list = dataclasses.field(init=True, default=None)
+    line: str = dataclasses.field(init=True, default=None)
+
+
+class PipProgressParser(object):
+    """
+    Turns the output lines of `pip install` into :obj:`ProgressEvent`, ex. to forward them to job monitoring
+
+    Understands the `--progress-bar raw` output of pip 24.1+ (`Progress 1024 of 4096`) and the text of the
+    interactive progress bar (`1.2/3.4 MB`). Older pip versions do not print a progress bar when the output is not a
+    terminal, the size reported by `Downloading ... (3.4 MB)` is then the only download information.
+
+    Usage
+        parser = PipProgressParser()
+        for line in Process(args=Interpreter.get_pip_args('install', 'torch', *PipProgressParser.get_args())).stream():
+            event = parser.parse(line)
+            if event is not None:
+                monitor.send(event.as_dict())
+    """
+
+    def __init__(self):
+        self.name = None
+        self.total = None
+
+    @classmethod
+    def get_args(cls):
+        """
+        Return the `pip install` arguments which enable machine readable progress, if the installed pip supports them
+        """
+        if Interpreter.get_capabilities().raw_progress is True:
+            return ['--progress-bar', 'raw']
+        return []
+
+    @classmethod
+    def get_bytes(cls, size: str, unit: str):
+        if size is None:
+            return None
+        return int(float(size) * UNITS.get(unit, 1))
+
+    @classmethod
+    def get_names(cls, names: str, separator: str = ','):
+        return [name.strip() for name in names.split(separator) if len(name.strip()) > 0]
+
+    def parse(self, line: str):
+        """
+        Return the :obj:`ProgressEvent` of one output line, or None if the line is not a progress step
+        """
+        line = line.strip()
+        if len(line) == 0:
+            return None
+        matches = RE_RAW_PROGRESS.match(line)
+        if matches is not None:
+            self.total = int(matches.group('total'))
+            return ProgressEvent(kind='progress', name=self.name, current=int(matches.group('current')),
+                                 total=self.total, line=line)
+        matches = RE_COLLECTING.match(line)
+        if matches is not None:
+            self.name, self.total = matches.group('name'), None
+            return ProgressEvent(kind='collecting', name=self.name, line=line)
+        matches = RE_DOWNLOADING.match(line) or RE_USING_CACHED.match(line)
+        if matches is not None:
+            self.total = self.get_bytes(size=matches.group('size'), unit=matches.group('unit'))
+            return ProgressEvent(kind='downloading', name=matches.group('url').rsplit('/', 1)[-1], current=0,
+                                 total=self.total, line=line)
+        matches = RE_BUILDING.match(line)
+        if matches is not None:
+            return ProgressEvent(kind='building', name=matches.group('name'), line=line)
+        matches = RE_SATISFIED.match(line)
+        if matches is not None:
+            return ProgressEvent(kind='satisfied', name=matches.group('name'), line=line)
+        matches = RE_INSTALLING.match(line)
+        if matches is not None:
+            return ProgressEvent(kind='installing', names=self.get_names(matches.group('names')), line=line)
+        matches = RE_INSTALLED.match(line)
+        if matches is not None:
+            return ProgressEvent(kind='installed', names=self.get_names(matches.group('names'), separator=None),
+                                 line=line)
+        matches = RE_ERROR.match(line)
+        if matches is not None:
+            return ProgressEvent(kind='error', name=self.name, line=matches.group('message'))
+        matches = RE_BAR_PROGRESS.search(line)
+        if matches is not None:
+            unit = matches.group('unit')
+            return ProgressEvent(kind='progress', name=self.name,
+                                 current=self.get_bytes(size=matches.group('current'), unit=unit),
+                                 total=self.get_bytes(size=matches.group('total'), unit=unit), line=line)
+        return None
+
+    def events(self, lines):
+        """
+        Yield the :obj:`ProgressEvent` of an iterable of output lines, ex. :obj:`Process.stream`
+        """
+        for line in lines:
+            event = self.parse(line)
+            if event is not None:
+                yield event
@@ -0,0 +1,306 @@
+import dataclasses
+import importlib
+import importlib.machinery
+import os
+import sys
+import types
+
+from .dataclass import DataClass
+from .distributions import DistributionIndex
+from .graph import DependencyGraph
+from .logging import get_logger
+from .requirements import normalize_name
+from .snapshot import Snapshot
+from .transaction import Transaction
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=False, unsafe_hash=False, frozen=False)
+class ReloadReport(DataClass):
+    """
+    Dataclass which represents the result of :obj:`ModuleReloader.reload`
+
+    Parameters
+        distributions(:obj:`list`): names of the changed distributions
+        reloaded(:obj:`list`): names of the reloaded modules, in reload order
+        failed(:obj:`dict`): module name -> error of the modules which raised while they were reloaded
+        skipped(:obj:`dict`): module name -> reason of the changed modules which can not be reloaded, ex. extension
+            modules
+        stale(:obj:`dict`): module name -> names of its attributes which still hold objects of the previous versions,
+            ex. `from boxsdk import Client` in `__main__`
+    """
+    distributions: list = dataclasses.field(init=True, default_factory=list)
+    reloaded: list = dataclasses.field(init=True, default_factory=list)
+    failed: dict = dataclasses.field(init=True, default_factory=dict)
+    skipped: dict = dataclasses.field(init=True, default_factory=dict)
+    stale: dict = dataclasses.field(init=True, default_factory=dict)
+
+    @property
+    def safe(self):
+        """
+        True if every changed module was reloaded
+        """
+        return len(self.failed) == 0 and len(self.skipped) == 0
+
+
+class ModuleReloader(object):
+    """
+    Reloads the imported modules of distributions which were installed, upgraded or downgraded, so a notebook can use
+    the new versions without restarting its kernel
+
+    The modules of a changed distribution are found from its `RECORD` (or its top-level names), only the `importlib`
+    finders of its directories are invalidated, and packages are pointed at their new location first (ex. when an
+    :obj:`Overlay` now shadows the shared environment). The modules are then reloaded in place with
+    `importlib.reload`, a module after the modules it references, followed by the imported modules of the packages
+    which depend on the changed distributions. Extension modules, Pipy itself and the modules of uninstalled
+    distributions can not be reloaded and are reported, as are modules which raise while reloading and attributes of
+    other modules which still hold objects of the previous versions.
+
+    Usage
+        before = Pipy.snapshot()
+        Pipy.install('boxsdk', upgrade=True)
+        Pipy.reload(snapshot=before) # ReloadReport(distributions=['boxsdk'], reloaded=['boxsdk.util', 'boxsdk', ...])
+        Pipy.install('boxsdk', upgrade=True, reload=True) # same
+    """
+    log = get_logger()
+
+    @classmethod
+    def get_changed(cls, names: list = None, snapshot: Snapshot = None):
+        """
+        Return the keys of the named distributions and of the distributions which changed since `snapshot`
+        """
+        keys = [normalize_name(name) for name in names or []]
+        if snapshot is not None:
+            diff = snapshot.diff(Snapshot.take())
+            keys.extend(normalize_name(name) for name in diff.added + diff.removed + diff.reinstalled)
+            keys.extend(normalize_name(name) for name, _, _ in diff.upgraded + diff.downgraded)
+        return list(dict.fromkeys(keys))
+
+    @classmethod
+    def get_file(cls, module):
+        filepath = getattr(module, '__file__', None)
+        if not isinstance(filepath, str):
+            return None
+        return os.path.normcase(os.path.abspath(filepath))
+
+    @classmethod
+    def is_namespace(cls, module):
+        return getattr(module, '__file__', None) is None and hasattr(module, '__path__')
+
+    @classmethod
+    def is_extension(cls, module):
+        loader = getattr(getattr(module, '__spec__', None), 'loader', None)
+        filepath = getattr(module, '__file__', None) or ''
+        return isinstance(loader, importlib.machinery.ExtensionFileLoader) or \
+            filepath.endswith(tuple(importlib.machinery.EXTENSION_SUFFIXES))
+
+    @classmethod
+    def get_modules(cls, dist, modules: dict):
+        """
+        Return the names of the imported modules of an installed distribution: modules whose file is in its
+        `RECORD`, and modules under its top-level names unless the top-level module is a namespace package
+        """
+        files = {os.path.normcase(os.path.abspath(path)) for path in Transaction.get_files(dist=dist) or []}
+        top_level = {name for name in dist.get_top_level()
+                     if name in modules and cls.is_namespace(modules[name]) is False}
+        return [name for name, module in modules.items()
+                if name.split('.')[0] in top_level or cls.get_file(module) in files]
+
+    @classmethod
+    def get_removed_modules(cls, key: str, modules: dict):
+        """
+        Return the names of the imported modules of an uninstalled distribution, guessed from its name
+        """
+        top_level = key.replace('-', '_')
+        return [name for name in modules if name == top_level or name.startswith(top_level + '.')]
+
+    @classmethod
+    def invalidate_caches(cls, distributions: list):
+        """
+        Invalidate the `importlib` path finders of the directories of `distributions` only
+        """
+        directories = set()
+        for dist in distributions:
+            directories.add(os.path.normcase(os.path.abspath(dist.location)))
+            for name in dist.get_top_level():
+                directories.add(os.path.normcase(os.path.abspath(os.path.join(dist.location, name))))
+        invalidated = 0
+        for path, finder in list(sys.path_importer_cache.items()):
+            if finder is None or not isinstance(path, str):
+                continue
+            path = os.path.normcase(os.path.abspath(path))
+            if path in directories or any(path.startswith(directory + os.sep) for directory in directories):
+                finder.invalidate_caches()
+                invalidated += 1
+        finder = getattr(getattr(importlib, 'metadata', None), 'MetadataPathFinder', None)
+        if finder is not None:
+            finder.invalidate_caches()
+        DistributionIndex.invalidate()
+        return invalidated
+
+    @classmethod
+    def get_references(cls, module, names: set):
+        """
+        Return the attributes of `module` which are modules or classes and functions defined in the modules `names`
+
+        Returns:
+            :obj:`dict`: attribute -> referenced module name
+        """
+        references = {}
+        try:
+            items = list(vars(module).items())
+        except TypeError:
+            return references
+        for attr, value in items:
+            try:
+                if isinstance(value, types.ModuleType):
+                    name = value.__name__
+                elif isinstance(value, (type, types.FunctionType)):
+                    name = value.__module__
+                else:
+                    continue
+            except Exception:
+                # Lazy proxies may fail on attribute access
+                continue
+            if name in names and name != getattr(module, '__name__', None):
+                references[attr] = name
+        return references
+
+    @classmethod
+    def is_stale(cls, value, module):
+        """
+        Returns True if the class or function `value` is not the one its reloaded module defines now
+        """
+        if isinstance(value, types.ModuleType) or '<' in value.__qualname__:
+            return False
+        current = module
+        for part in value.__qualname__.split('.'):
+            current = getattr(current, part, None)
+        return current is not value
+
+    @classmethod
+    def sort(cls, names: list, modules: dict):
+        """
+        Order modules so that each module is reloaded after the modules it references and after their packages,
+        which may re-export the referenced objects (`from boxsdk import Client`). Cycles are broken by reloading the
+        deepest module first.
+        """
+        def get_packages(name):
+            parts = name.split('.')
+            return {'.'.join(parts[:idx]) for idx in range(1, len(parts))}
+
+        names = set(names)
+        requires = {}
+        for name in names:
+            required = set()
+            for target in cls.get_references(module=modules[name], names=names).values():
+                required.add(target)
+                required.update(package for package in get_packages(target) - get_packages(name)
+                                if package in names and package != name)
+            requires[name] = required
+        ordered = []
+        while len(requires) > 0:
+            ready = sorted(name for name, required in requires.items() if len(required) == 0)
+            if len(ready) == 0:
+                ready = [max(requires, key=lambda name: (name.count('.'), name))]
+            for name in ready:
+                requires.pop(name)
+                ordered.append(name)
+            for required in requires.values():
+                required.difference_update(ready)
+        return ordered
+
+    @classmethod
+    def relocate(cls, names: list, modules: dict):
+        """
+        Point packages at the directories they are found in now, parents first, so that `importlib.reload` finds
+        their submodules at the new location
+        """
+        for name in sorted(names, key=lambda name: name.count('.')):
+            module = modules[name]
+            if not hasattr(module, '__path__') or cls.is_namespace(module) is True:
+                continue
+            parent = name.rpartition('.')[0]
+            path = getattr(modules.get(parent), '__path__', None) if parent else None
+            spec = importlib.machinery.PathFinder.find_spec(name, path)
+            if spec is not None and spec.submodule_search_locations is not None and \
+                    list(spec.submodule_search_locations) != list(module.__path__):
+                cls.log.info(f"Module {name} moved to {spec.origin}")
+                module.__path__ = list(spec.submodule_search_locations)
+
+    @classmethod
+    def reload(cls, names: list = None, snapshot: Snapshot = None, dependents: bool = True):
+        """
+        Reload the imported modules of the distributions `names` and of the distributions which changed since
+        `snapshot`
+
+        Args:
+            names(:obj:`list`, optional): names of the changed distributions
+            snapshot(:obj:`Snapshot`, optional): :obj:`Snapshot` taken before the environment was changed
+            dependents(:obj:`bool`, optional): If True, also reload the imported modules of the packages which depend
+                on the changed distributions. Defaults to True.
+
+        Returns:
+            :obj:`ReloadReport`
+        """
+        if isinstance(names, str):
+            names = [names]
+        DistributionIndex.invalidate()
+        keys = cls.get_changed(names=names, snapshot=snapshot)
+        distributions = DistributionIndex.refresh()
+        report = ReloadReport(distributions=[distributions[key].name if key in distributions else key for key in keys])
+        if len(keys) == 0:
+            return report
+        modules = {name: module for name, module in list(sys.modules.items()) if module is not None}
+        cls.invalidate_caches(distributions=[distributions[key] for key in keys if key in distributions])
+
+        changed = []
+        for key in keys:
+            if key in distributions:
+                changed.extend(cls.get_modules(dist=distributions[key], modules=modules))
+            else:
+                for name in cls.get_removed_modules(key=key, modules=modules):
+                    report.skipped[name] = 'the distribution was uninstalled'
+        affected = list(changed)
+        if dependents is True:
+            graph = DependencyGraph.current()
+            dependent_keys = {dependent for key in keys if key in distributions
+                              for dependent in graph.dependents(name=key, transitive=True)}
+            for key in sorted(dependent_keys - set(keys)):
+                affected.extend(name for name in cls.get_modules(dist=distributions[key], modules=modules)
+                                if cls.is_extension(modules[name]) is False)
+
+        reloadable = []
+        for name in dict.fromkeys(affected):
+            module = modules[name]
+            if name.split('.')[0] == __name__.split('.')[0]:
+                report.skipped[name] = 'Pipy can not reload itself'
+            elif cls.is_extension(module) is True:
+                report.skipped[name] = 'extension modules can not be reloaded'
+            elif cls.is_namespace(module) is False:
+                reloadable.append(name)
+
+        cls.relocate(names=reloadable, modules=modules)
+        for name in cls.sort(names=reloadable, modules=modules):
+            try:
+                importlib.reload(modules[name])
+                report.reloaded.append(name)
+            except Exception as e:
+                report.failed[name] = f"{type(e).__name__}: {e}"
+
+        reloaded = set(report.reloaded)
+        for name, module in list(sys.modules.items()):
+            if module is None or name in reloaded:
+                continue
+            references = cls.get_references(module=module, names=reloaded)
+            stale = sorted(attr for attr, target in references.items()
+                           if cls.is_stale(value=getattr(module, attr, None), module=modules[target]))
+            if len(stale) > 0:
+                report.stale[name] = stale
+
+        cls.log.info(f"Reloaded {len(report.reloaded)} modules of {', '.join(report.distributions)}")
+        for name, reason in list(report.failed.items()) + list(report.skipped.items()):
+            cls.log.warning(f"Module {name} could not be reloaded: {reason}")
+        if len(report.stale) > 0:
+            cls.log.warning(f"{len(report.stale)} modules hold objects of the previous versions: " + \
+                            f"{', '.join(f'{name}.{attr}' for name, attrs in report.stale.items() for attr in attrs)}")
+        return report
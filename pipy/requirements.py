@@ -0,0 +1,378 @@
+import os
+import platform
+import re
+import sys
+
+RE_NORMALIZE_NAME = re.compile(r'[-_.]+')
+RE_REQUIREMENT = re.compile(
+        r'^\s*(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*'
+        r'(?:\[(?P<extras>[^\]]*)\])?\s*'
+        r'(?:@\s*(?P<url>[^;\s]+))?\s*'
+        r'\(?(?P<specifier>[^;()]*)\)?\s*'
+        r'(?:;\s*(?P<marker>.+))?$')
+RE_VERSION = re.compile(
+        r'^\s*v?(?:(?P<epoch>\d+)!)?(?P<release>\d+(?:\.\d+)*)'
+        r'(?:[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>\d+)?)?'
+        r'(?:-(?P<post_n1>\d+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>\d+)?)?'
+        r'(?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>\d+)?)?'
+        r'(?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?\s*$', re.IGNORECASE)
+RE_SPECIFIER = re.compile(r'^\s*(?P<operator>~=|===|==|!=|<=|>=|<|>)\s*(?P<version>[^\s,]+)\s*$')
+RE_MARKER_TOKEN = re.compile(
+        r'\s*(?:(?P<string>\'[^\']*\'|"[^"]*")|(?P<op>===|==|!=|<=|>=|~=|<|>|not\s+in\b|in\b)|'
+        r'(?P<bool>and\b|or\b)|(?P<paren>[()])|(?P<var>[A-Za-z_.]+))')
+
+PRE_RELEASE_LABELS = {'a': 'a', 'alpha': 'a', 'b': 'b', 'beta': 'b', 'c': 'rc', 'rc': 'rc', 'pre': 'rc',
+                      'preview': 'rc'}
+VERSION_MARKERS = ('python_version', 'python_full_version', 'implementation_version', 'platform_release')
+
+
+def normalize_name(name: str):
+    """
+    Normalize a package name for comparison, see: https://www.python.org/dev/peps/pep-0503/#normalized-names
+    """
+    return RE_NORMALIZE_NAME.sub('-', name).lower()
+
+
+class Version(object):
+    """
+    A version number which can be compared with other versions following PEP 440
+
+    Versions which do not follow PEP 440 are compared as strings, after any valid PEP 440 version.
+
+    See: https://www.python.org/dev/peps/pep-0440/
+    """
+    __slots__ = ('raw', 'epoch', 'release', 'pre', 'post', 'dev', 'local', 'key')
+
+    def __init__(self, version: str):
+        self.raw = str(version).strip()
+        matches = RE_VERSION.match(self.raw)
+        if matches is None:
+            self.epoch, self.release, self.pre, self.post, self.dev, self.local = 0, (), None, None, None, None
+            self.key = (1, self.raw)
+            return
+        groups = matches.groupdict()
+        self.epoch = int(groups['epoch'] or 0)
+        self.release = tuple(int(i) for i in groups['release'].split('.'))
+        self.pre = None
+        if groups['pre_l'] is not None:
+            self.pre = (PRE_RELEASE_LABELS[groups['pre_l'].lower()], int(groups['pre_n'] or 0))
+        self.post = None
+        if groups['post_n1'] is not None or groups['post_l'] is not None:
+            self.post = int(groups['post_n1'] or groups['post_n2'] or 0)
+        self.dev = None
+        if groups['dev_l'] is not None:
+            self.dev = int(groups['dev_n'] or 0)
+        self.local = groups['local']
+        self.key = (0, self.cmpkey())
+
+    def cmpkey(self):
+        release = list(self.release)
+        while len(release) > 1 and release[-1] == 0:
+            release.pop()
+        if self.pre is None and self.post is None and self.dev is not None:
+            pre = ('', -1)
+        elif self.pre is None:
+            pre = ('z', 0)
+        else:
+            pre = self.pre
+        post = (-1,) if self.post is None else (self.post,)
+        dev = (float('inf'),) if self.dev is None else (self.dev,)
+        local = () if self.local is None else tuple(
+                (0, int(part)) if part.isdigit() else (-1, part) for part in re.split(r'[-_.]', self.local.lower()))
+        return self.epoch, tuple(release), pre, post, dev, local
+
+    @property
+    def public(self):
+        return self.raw.split('+')[0]
+
+    @property
+    def is_prerelease(self):
+        return self.pre is not None or self.dev is not None
+
+    def __repr__(self):
+        return "Version('{}')".format(self.raw)
+
+    def __str__(self):
+        return self.raw
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return self.key == as_version(other).key
+
+    def __ne__(self, other):
+        return self.key != as_version(other).key
+
+    def __lt__(self, other):
+        return self.key < as_version(other).key
+
+    def __le__(self, other):
+        return self.key <= as_version(other).key
+
+    def __gt__(self, other):
+        return self.key > as_version(other).key
+
+    def __ge__(self, other):
+        return self.key >= as_version(other).key
+
+
+def as_version(version):
+    if isinstance(version, Version):
+        return version
+    return Version(version)
+
+
+class Specifier(object):
+    """
+    A set of version specifiers, ex. `>=1.0,<2.0`, which can test if a version satisfies all of them
+
+    See: https://www.python.org/dev/peps/pep-0440/#version-specifiers
+    """
+    __slots__ = ('raw', 'clauses')
+
+    def __init__(self, specifier: str = None):
+        self.raw = (specifier or '').strip()
+        self.clauses = []
+        for clause in self.raw.split(','):
+            if len(clause.strip()) == 0:
+                continue
+            matches = RE_SPECIFIER.match(clause)
+            if matches is None:
+                raise ValueError(f"Invalid version specifier: {clause}")
+            operator, spec = matches.group('operator'), matches.group('version')
+            spec_version = None if operator == '===' or spec.endswith('.*') else Version(spec)
+            self.clauses.append((operator, spec, spec_version))
+
+    def __repr__(self):
+        return "Specifier('{}')".format(self.raw)
+
+    def __str__(self):
+        return self.raw
+
+    def __bool__(self):
+        return len(self.clauses) > 0
+
+    def __contains__(self, version):
+        return self.contains(version)
+
+    def contains(self, version):
+        """
+        Returns True if `version` satisfies every clause of the specifier. Pre-releases are always allowed, because
+        this is used to check installed versions and not to select a version to install.
+        """
+        version = as_version(version)
+        return all(self.match(operator=operator, spec=spec, version=version, spec_version=spec_version)
+                   for operator, spec, spec_version in self.clauses)
+
+    @classmethod
+    def match(cls, operator: str, spec: str, version: Version, spec_version: Version = None):
+        if operator == '===':
+            return version.raw.lower() == spec.lower()
+        if operator in ('==', '!=') and spec.endswith('.*'):
+            prefix = Version(spec[:-2])
+            release = version.release + (0,) * max(0, len(prefix.release) - len(version.release))
+            matches = version.epoch == prefix.epoch and release[:len(prefix.release)] == prefix.release
+            return matches if operator == '==' else not matches
+        if spec_version is None:
+            spec_version = Version(spec)
+        if version.local is not None and (operator not in ('==', '!=') or spec_version.local is None):
+            version = Version(version.public)
+        if operator in ('==', '!='):
+            matches = version == spec_version
+            return matches if operator == '==' else not matches
+        if operator == '~=':
+            prefix = '.'.join(str(i) for i in spec_version.release[:-1])
+            return version >= spec_version and cls.match(operator='==', spec=prefix + '.*', version=version)
+        if operator == '<=':
+            return version <= spec_version
+        if operator == '>=':
+            return version >= spec_version
+        if operator == '<':
+            return version < spec_version and not (
+                    spec_version.pre is None and version.is_prerelease and version.release == spec_version.release)
+        if operator == '>':
+            return version > spec_version and not (
+                    spec_version.post is None and version.post is not None and
+                    version.release == spec_version.release)
+        return False
+
+
+def get_marker_environment(extra: str = ''):
+    """
+    Return the values of the environment marker variables for the running interpreter, see
+    :obj:`Interpreter.get_marker_environment` for the target interpreter
+
+    See: https://www.python.org/dev/peps/pep-0508/#environment-markers
+    """
+    implementation = sys.implementation
+    implementation_version = "{0.major}.{0.minor}.{0.micro}".format(implementation.version)
+    if implementation.version.releaselevel != 'final':
+        implementation_version += implementation.version.releaselevel[0] + str(implementation.version.serial)
+    return {
+            'implementation_name':            implementation.name,
+            'implementation_version':         implementation_version,
+            'os_name':                        os.name,
+            'platform_machine':               platform.machine(),
+            'platform_release':               platform.release(),
+            'platform_system':                platform.system(),
+            'platform_version':               platform.version(),
+            'python_full_version':            platform.python_version(),
+            'platform_python_implementation': platform.python_implementation(),
+            'python_version':                 '.'.join(platform.python_version_tuple()[:2]),
+            'sys_platform':                   sys.platform,
+            'extra':                          extra,
+            }
+
+
+class Marker(object):
+    """
+    An environment marker, ex. `python_version < "3.8" and extra == "test"`, which can be evaluated
+
+    See: https://www.python.org/dev/peps/pep-0508/#environment-markers
+    """
+    __slots__ = ('raw', 'tokens')
+
+    def __init__(self, marker: str):
+        self.raw = marker.strip()
+        self.tokens = self.tokenize(self.raw)
+
+    def __repr__(self):
+        return "Marker('{}')".format(self.raw)
+
+    def __str__(self):
+        return self.raw
+
+    @classmethod
+    def tokenize(cls, marker: str):
+        tokens = []
+        idx = 0
+        marker = marker.rstrip()
+        while idx < len(marker):
+            matches = RE_MARKER_TOKEN.match(marker, idx)
+            if matches is None or matches.end() == idx:
+                raise ValueError(f"Invalid environment marker: {marker}")
+            kind = matches.lastgroup
+            value = matches.group(kind)
+            if kind == 'string':
+                value = value[1:-1]
+            elif kind == 'op':
+                value = re.sub(r'\s+', ' ', value)
+            tokens.append((kind, value))
+            idx = matches.end()
+        return tokens
+
+    def evaluate(self, environment: dict = None):
+        """
+        Evaluate the marker against `environment`, defaults to the running interpreter with `extra` set to ''
+        """
+        if environment is None:
+            environment = get_marker_environment()
+        value, idx = self.parse_or(environment=environment, idx=0)
+        if idx != len(self.tokens):
+            raise ValueError(f"Invalid environment marker: {self.raw}")
+        return value
+
+    def parse_or(self, environment: dict, idx: int):
+        value, idx = self.parse_and(environment=environment, idx=idx)
+        while idx < len(self.tokens) and self.tokens[idx] == ('bool', 'or'):
+            right, idx = self.parse_and(environment=environment, idx=idx + 1)
+            value = value or right
+        return value, idx
+
+    def parse_and(self, environment: dict, idx: int):
+        value, idx = self.parse_atom(environment=environment, idx=idx)
+        while idx < len(self.tokens) and self.tokens[idx] == ('bool', 'and'):
+            right, idx = self.parse_atom(environment=environment, idx=idx + 1)
+            value = value and right
+        return value, idx
+
+    def parse_atom(self, environment: dict, idx: int):
+        if idx < len(self.tokens) and self.tokens[idx] == ('paren', '('):
+            value, idx = self.parse_or(environment=environment, idx=idx + 1)
+            if idx >= len(self.tokens) or self.tokens[idx] != ('paren', ')'):
+                raise ValueError(f"Invalid environment marker: {self.raw}")
+            return value, idx + 1
+        if idx + 3 > len(self.tokens):
+            raise ValueError(f"Invalid environment marker: {self.raw}")
+        (left_kind, left), (op_kind, op), (right_kind, right) = self.tokens[idx:idx + 3]
+        if op_kind != 'op':
+            raise ValueError(f"Invalid environment marker: {self.raw}")
+        variable = left if left_kind == 'var' else right if right_kind == 'var' else None
+        if left_kind == 'var':
+            left = environment.get(left, '')
+        if right_kind == 'var':
+            right = environment.get(right, '')
+        return self.compare(left=left, op=op, right=right, variable=variable), idx + 3
+
+    @classmethod
+    def compare(cls, left: str, op: str, right: str, variable: str = None):
+        if variable == 'extra':
+            left, right = normalize_name(left), normalize_name(right)
+        if op == 'in':
+            return left in right
+        if op == 'not in':
+            return left not in right
+        if variable in VERSION_MARKERS and RE_VERSION.match(right) is not None and op != '===':
+            try:
+                return Specifier(f"{op}{right}").contains(left)
+            except ValueError:
+                pass
+        return {'==':  lambda: left == right,
+                '===': lambda: left == right,
+                '!=':  lambda: left != right,
+                '<':   lambda: left < right,
+                '<=':  lambda: left <= right,
+                '>':   lambda: left > right,
+                '>=':  lambda: left >= right,
+                '~=':  lambda: left == right,
+                }[op]()
+
+
+class Requirement(object):
+    """
+    A dependency declared by a distribution, ex. `python-dateutil (>=2.6.1) ; python_version >= "3.6"`
+
+    Parameters
+        requirement(:obj:`str`, required): A PEP 508 requirement string, ex. a `Requires-Dist` metadata value
+
+    Attributes
+        name(:obj:`str`): Name of the required distribution
+        key(:obj:`str`): Normalized name of the required distribution
+        extras(:obj:`tuple`): Extras requested from the required distribution
+        specifier(:obj:`Specifier`): Versions of the required distribution which satisfy the requirement
+        marker(:obj:`Marker`): Environment marker, or None if the requirement always applies
+        url(:obj:`str`): Direct URL reference, or None
+
+    See: https://www.python.org/dev/peps/pep-0508/
+    """
+    __slots__ = ('raw', 'name', 'key', 'extras', 'specifier', 'marker', 'url')
+
+    def __init__(self, requirement: str):
+        self.raw = requirement.strip()
+        matches = RE_REQUIREMENT.match(self.raw)
+        if matches is None:
+            raise ValueError(f"Invalid requirement: {requirement}")
+        self.name = matches.group('name')
+        self.key = normalize_name(self.name)
+        self.extras = tuple(e.strip() for e in (matches.group('extras') or '').split(',') if len(e.strip()) > 0)
+        self.url = matches.group('url')
+        self.specifier = Specifier(matches.group('specifier'))
+        self.marker = Marker(matches.group('marker')) if matches.group('marker') is not None else None
+
+    def __repr__(self):
+        return "Requirement('{}')".format(self.raw)
+
+    def __str__(self):
+        return self.raw
+
+    def applies(self, environment: dict = None):
+        """
+        Returns True if the requirement's environment marker is satisfied, see :obj:`Marker.evaluate`
+        """
+        if self.marker is None:
+            return True
+        return self.marker.evaluate(environment=environment)
+
+    def is_satisfied_by(self, version):
+        return self.specifier.contains(version)
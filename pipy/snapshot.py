@@ -0,0 +1,138 @@
+import dataclasses
+import hashlib
+
+from .dataclass import DataClass
+from .distributions import DistributionIndex
+from .requirements import Version, normalize_name
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=True, unsafe_hash=False, frozen=False)
+class SnapshotDiff(DataClass):
+    """
+    Dataclass which represents the changes between two :obj:`Snapshot`
+
+    Parameters
+        added(:obj:`list`): names of the packages which were installed
+        removed(:obj:`list`): names of the packages which were uninstalled
+        upgraded(:obj:`list`): (name, old version, new version) of the packages which were upgraded
+        downgraded(:obj:`list`): (name, old version, new version) of the packages which were downgraded
+        reinstalled(:obj:`list`): names of the packages whose version is the same but whose files changed
+    """
+    added: list = dataclasses.field(init=True, default_factory=list)
+    removed: list = dataclasses.field(init=True, default_factory=list)
+    upgraded: list = dataclasses.field(init=True, default_factory=list)
+    downgraded: list = dataclasses.field(init=True, default_factory=list)
+    reinstalled: list = dataclasses.field(init=True, default_factory=list)
+
+    def __bool__(self):
+        return len(self.added) + len(self.removed) + len(self.upgraded) + len(self.downgraded) + \
+               len(self.reinstalled) > 0
+
+
+class Snapshot(object):
+    """
+    Immutable record of the installed packages at one point in time
+
+    Each package is stored as `key -> (name, version, fingerprint)`, where the fingerprint is taken from the size and
+    mtime of the distribution's `RECORD` file, so taking a snapshot does not read any package file. Two snapshots are
+    compared in linear time with :obj:`Snapshot.diff`, and :obj:`Snapshot.changed` tells whether anything may have
+    changed since the snapshot by only calling `stat` on the `site-packages` directories.
+
+    Usage
+        before = Pipy.snapshot()
+        run_job()
+        if before.changed():
+            before.diff(Pipy.snapshot()) # SnapshotDiff(added=['boxsdk'], upgraded=[('requests', '2.22.0', '2.23.0')])
+    """
+    __slots__ = ('packages', 'mtimes', '_digest')
+
+    def __init__(self, packages: dict, mtimes: dict = None):
+        self.packages = packages
+        self.mtimes = mtimes
+        self._digest = None
+
+    def __len__(self):
+        return len(self.packages)
+
+    def __contains__(self, name: str):
+        return normalize_name(name) in self.packages
+
+    def __eq__(self, other):
+        return isinstance(other, Snapshot) and self.digest == other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return f"Snapshot(packages={len(self.packages)}, digest='{self.digest[:12]}')"
+
+    @classmethod
+    def take(cls):
+        """
+        Return a snapshot of the installed environment
+        """
+        paths = DistributionIndex.get_paths()
+        mtimes = DistributionIndex.get_mtimes(paths)
+        packages = {key: (dist.name, dist.version, dist.get_fingerprint())
+                    for key, dist in DistributionIndex.refresh().items()}
+        return cls(packages=packages, mtimes=mtimes)
+
+    @classmethod
+    def from_packages(cls, packages: list):
+        """
+        Return a snapshot of a list of packages, ex. the result of `Pipy.list()`. Packages do not have a fingerprint,
+        so reinstalls of the same version are not detected and :obj:`Snapshot.changed` always returns True.
+        """
+        return cls(packages={normalize_name(pkg.name): (pkg.name, pkg.version, None) for pkg in packages})
+
+    @property
+    def digest(self):
+        """
+        Compact sha256 digest of every (key, version, fingerprint), equal snapshots have equal digests
+        """
+        if self._digest is None:
+            digest = hashlib.sha256()
+            for key in sorted(self.packages.keys()):
+                _, version, fingerprint = self.packages[key]
+                digest.update(f"{key}=={version}#{fingerprint}\n".encode('utf-8'))
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def changed(self):
+        """
+        Returns True if a `site-packages` directory was modified since the snapshot was taken, which is the case for
+        every install, upgrade or uninstall. Only the directories are checked, no distribution is read.
+        """
+        if self.mtimes is None:
+            return True
+        paths = DistributionIndex.get_paths()
+        if set(paths) != set(self.mtimes.keys()):
+            return True
+        return DistributionIndex.get_mtimes(paths) != self.mtimes
+
+    def diff(self, other):
+        """
+        Return the changes from this snapshot to a newer snapshot `other`
+
+        Returns:
+            :obj:`SnapshotDiff`
+        """
+        result = SnapshotDiff()
+        for key, (name, version, fingerprint) in other.packages.items():
+            previous = self.packages.get(key)
+            if previous is None:
+                result.added.append(name)
+            elif previous[1] != version:
+                old_version, new_version = Version(previous[1]), Version(version)
+                if new_version > old_version:
+                    result.upgraded.append((name, previous[1], version))
+                elif new_version < old_version:
+                    result.downgraded.append((name, previous[1], version))
+                else:
+                    result.reinstalled.append(name)
+            elif fingerprint is not None and previous[2] is not None and previous[2] != fingerprint:
+                result.reinstalled.append(name)
+        for key, (name, _, _) in self.packages.items():
+            if key not in other.packages:
+                result.removed.append(name)
+        return result
@@ -0,0 +1,117 @@
+import contextlib
+import contextvars
+import dataclasses
+
+from .dataclass import DataClass
+from .logging import get_logger
+
+
+@dataclasses.dataclass(init=True, repr=True, eq=True, order=False, unsafe_hash=False, frozen=False)
+class TimeoutPolicy(DataClass):
+    """
+    Dataclass which represents how long a pip command may run
+
+    Parameters
+        timeout(:obj:`float`, optional): Wall clock limit in seconds, None for no limit
+        per_package(:obj:`float`, optional): Seconds added to `timeout` for each package of a batch command
+        inactivity(:obj:`float`, optional): Limit in seconds without any output from the command, None for no limit
+        grace(:obj:`float`, optional): Seconds between `SIGTERM` and `SIGKILL` when the command is stopped
+
+    See Also
+        :obj:`Timeouts`
+    """
+    timeout: float = dataclasses.field(init=True, default=None)
+    per_package: float = dataclasses.field(init=True, default=0)
+    inactivity: float = dataclasses.field(init=True, default=None)
+    grace: float = dataclasses.field(init=True, default=10)
+
+    def get_timeout(self, packages: int = 1):
+        if self.timeout is None:
+            return None
+        return self.timeout + self.per_package * max(packages - 1, 0)
+
+    def get_kwargs(self, packages: int = 1):
+        """
+        Return the :obj:`Process` keyword arguments of the policy, for a command which handles `packages` packages
+        """
+        return {'timeout': self.get_timeout(packages=packages),
+                'inactivity_timeout': self.inactivity,
+                'grace': self.grace}
+
+
+class Timeouts(object):
+    """
+    Timeout policy of each kind of pip command
+
+    Policies are set globally with :obj:`Timeouts.configure`, or for the commands run inside a `with` block (the
+    current thread or asyncio task) with :obj:`Timeouts.override`. Installs have no short wall clock limit but
+    are stopped when pip prints nothing for 10 minutes.
+
+    Usage
+        Timeouts.configure('install', timeout=None, inactivity=900)
+        with Timeouts.override(install=TimeoutPolicy(timeout=7200)):
+            Pipy.install('torch')
+        Pipy.install('torch', timeout=7200) # same as the override above
+    """
+    log = get_logger()
+    policies = {
+        'install':   TimeoutPolicy(timeout=3600, per_package=300, inactivity=600),
+        'uninstall': TimeoutPolicy(timeout=120, per_package=30, inactivity=60),
+        'resolve':   TimeoutPolicy(timeout=300, per_package=30, inactivity=120),
+        'wheel':     TimeoutPolicy(timeout=3600, per_package=600, inactivity=600),
+        'list':      TimeoutPolicy(timeout=60, inactivity=30),
+        'show':      TimeoutPolicy(timeout=60, per_package=5, inactivity=30),
+        'default':   TimeoutPolicy(timeout=60, inactivity=30),
+        }
+    _overrides = contextvars.ContextVar('pipy_timeouts', default=None)
+
+    @classmethod
+    def get(cls, operation: str):
+        """
+        Return the :obj:`TimeoutPolicy` of an operation, ex. `install`
+        """
+        overrides = cls._overrides.get()
+        if overrides is not None and operation in overrides:
+            return overrides[operation]
+        return cls.policies.get(operation, cls.policies['default'])
+
+    @classmethod
+    def get_kwargs(cls, operation: str, packages: int = 1):
+        return cls.get(operation=operation).get_kwargs(packages=packages)
+
+    @classmethod
+    def configure(cls, operation: str, policy: TimeoutPolicy = None, **kwargs):
+        """
+        Set the global policy of an operation, either to `policy` or by changing fields of the current one
+        """
+        if policy is None:
+            policy = dataclasses.replace(cls.policies.get(operation, cls.policies['default']), **kwargs)
+        cls.policies[operation] = policy
+        return policy
+
+    @classmethod
+    def as_policy(cls, operation: str, timeout):
+        """
+        Return `timeout` as a :obj:`TimeoutPolicy`, a number replaces the wall clock limit of the current policy
+        """
+        if timeout is None or isinstance(timeout, TimeoutPolicy):
+            return timeout
+        return dataclasses.replace(cls.get(operation=operation), timeout=timeout, per_package=0)
+
+    @classmethod
+    @contextlib.contextmanager
+    def override(cls, **policies):
+        """
+        Use other policies for the commands run inside the `with` block, ex. `override(install=TimeoutPolicy(...))`.
+        A number replaces the wall clock limit of the operation, None keeps the current policy.
+        """
+        overrides = dict(cls._overrides.get() or {})
+        for operation, policy in policies.items():
+            policy = cls.as_policy(operation=operation, timeout=policy)
+            if policy is not None:
+                overrides[operation] = policy
+        token = cls._overrides.set(overrides)
+        try:
+            yield overrides
+        finally:
+            cls._overrides.reset(token)
@@ -0,0 +1,264 @@
+import os
+import shutil
+import tempfile
+
+from .coordinator import InstallCoordinator
+from .distributions import DistributionIndex
+from .graph import DependencyGraph
+from .interpreter import Interpreter
+from .logging import get_logger
+from .metadata import MetadataReader
+from .preflight import Preflight
+from .requirements import Requirement, normalize_name
+from .snapshot import Snapshot
+
+
+class TransactionError(RuntimeError):
+    """
+    Raised when a rollback could not restore every changed package
+
+    Attributes
+        packages(:obj:`list`): names of the packages which were changed and could not be restored
+    """
+
+    def __init__(self, message: str, packages: list):
+        super().__init__(message)
+        self.packages = packages
+
+
+class Transaction(object):
+    """
+    Installs or uninstalls packages as one unit, which is rolled back if anything fails
+
+    When the transaction begins, the installed files of every package the command may change are stashed with hard
+    links next to the package, so nothing is copied. pip never writes into an existing file (it unlinks it first),
+    so the stashed links keep the old content. If the block raises, including on timeout or `KeyboardInterrupt`,
+    the packages which changed are found by diffing a :obj:`Snapshot`: the files of their new versions are removed
+    using their `RECORD`, and the stashed files are moved back with `os.replace`. Rollback work is proportional to
+    the changed packages, not to the environment.
+
+    The packages which may change are the requested packages, plus, when dependencies are installed, the packages
+    pip's resolver plans to install (pip 22.2+) or the installed dependencies of the requested packages.
+
+    Warnings
+        The files of a package whose install was killed before pip wrote its `RECORD` can not be found, and are
+        left in place.
+
+    Usage
+        with Transaction(names=['boxsdk', 'requests'], no_dependencies=False):
+            Pipy.install(['boxsdk', 'requests'], no_dependencies=False)
+        Pipy.install(['boxsdk', 'requests'], transaction=True) # same
+    """
+    log = get_logger()
+
+    def __init__(self, names=None, no_dependencies: bool = True, upgrade: bool = False):
+        if isinstance(names, str):
+            names = [names]
+        self.names = list(names or [])
+        self.no_dependencies = no_dependencies
+        self.upgrade = upgrade
+        self.snapshot: Snapshot = None
+        # key -> list of (path, stashed path), and key -> stash directory
+        self.stashed = {}
+        self.stash_dirs = {}
+        self.state = 'new'
+        self.lock = None
+
+    def __enter__(self):
+        # No other process may change the environment between the snapshot and the commit or rollback
+        self.lock = InstallCoordinator.hold(operation='transaction', names=self.names)
+        self.lock.__enter__()
+        try:
+            self.begin()
+        except BaseException:
+            self.lock.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.log.error(f"Rolling back the transaction of {', '.join(self.names)}: {exc_value!r}")
+                self.rollback()
+        finally:
+            self.lock.__exit__(None, None, None)
+        return False
+
+    @classmethod
+    def get_key(cls, name: str):
+        try:
+            return normalize_name(Requirement(name).name)
+        except ValueError:
+            return normalize_name(name)
+
+    def get_targets(self):
+        """
+        Return the keys of the installed packages which the command may change
+        """
+        keys = {self.get_key(name=name) for name in self.names}
+        if self.no_dependencies is False:
+            capabilities = Interpreter.get_capabilities()
+            if capabilities.report is True and capabilities.dry_run is True:
+                report = Preflight.get_report(names=self.names, no_dependencies=False, upgrade=self.upgrade)
+                keys.update(Preflight.get_plan(report=report).keys())
+            else:
+                graph = DependencyGraph.current()
+                for key in list(keys):
+                    keys.update(graph.dependencies(name=key, transitive=True))
+        distributions = DistributionIndex.refresh()
+        return sorted(key for key in keys if key in distributions)
+
+    @classmethod
+    def get_files(cls, dist):
+        """
+        Return the absolute paths of the installed files of a distribution, the files of its metadata directory
+        last, or None if they are not recorded
+        """
+        rows = MetadataReader.read_record(path=dist.path)
+        if rows is not None:
+            paths = [os.path.join(dist.location, row[0]) for row in rows if len(row[0]) > 0]
+        else:
+            # Legacy `*.egg-info` directories list their files relative to the metadata directory
+            text = MetadataReader.read_text(path=dist.path, filename='installed-files.txt')
+            if text is None:
+                return None
+            paths = [os.path.join(dist.path, line.strip()) for line in text.splitlines() if len(line.strip()) > 0]
+        metadata_dir = os.path.normpath(dist.path) + os.sep
+        paths = sorted({os.path.normpath(path) for path in paths}, key=lambda p: (p.startswith(metadata_dir), p))
+        return paths
+
+    def begin(self):
+        """
+        Snapshot the environment and stash the files of the packages which may change
+        """
+        if self.state != 'new':
+            raise RuntimeError(f"Transaction is {self.state}")
+        targets = self.get_targets()
+        self.snapshot = Snapshot.take()
+        distributions = DistributionIndex.refresh()
+        self.state = 'active'
+        try:
+            for key in targets:
+                self.stash(key=key, dist=distributions[key])
+        except BaseException:
+            self.cleanup()
+            self.state = 'failed'
+            raise
+        self.log.info(f"Began transaction of {', '.join(self.names)}, stashed {len(self.stashed)} packages " + \
+                      f"({sum(len(files) for files in self.stashed.values())} files)")
+        return self
+
+    def stash(self, key: str, dist):
+        files = self.get_files(dist=dist)
+        if files is None:
+            self.log.warning(f"Package({dist.name})({dist.version}) does not record its files and can not be " + \
+                             "rolled back")
+            return
+        stash_dir = tempfile.mkdtemp(prefix='.pipy-stash-', dir=dist.location)
+        self.stash_dirs[key] = stash_dir
+        entries = []
+        for idx, path in enumerate(files):
+            if not os.path.isfile(path):
+                continue
+            stashed = os.path.join(stash_dir, str(idx))
+            try:
+                os.link(path, stashed)
+            except OSError:
+                # Another file system, or no hard link support
+                shutil.copy2(path, stashed)
+            entries.append((path, stashed))
+        self.stashed[key] = entries
+
+    def commit(self):
+        """
+        Keep the changes and drop the stash
+        """
+        if self.state != 'active':
+            return
+        self.cleanup()
+        self.state = 'committed'
+        DistributionIndex.invalidate()
+
+    def rollback(self):
+        """
+        Restore every package which changed since the transaction began
+
+        Returns:
+            :obj:`SnapshotDiff`: the changes which were rolled back
+
+        Raises:
+            :obj:`TransactionError` if a changed package was not stashed
+        """
+        if self.state != 'active':
+            return None
+        DistributionIndex.invalidate()
+        diff = self.snapshot.diff(Snapshot.take())
+        changed = {normalize_name(name) for name in diff.added + diff.removed + diff.reinstalled}
+        changed.update(normalize_name(name) for name, _, _ in diff.upgraded + diff.downgraded)
+        distributions = DistributionIndex.refresh()
+        failed = []
+        try:
+            for key in sorted(changed):
+                dist = distributions.get(key)
+                if key in self.snapshot.packages and key not in self.stashed:
+                    failed.append(self.snapshot.packages[key][0])
+                    continue
+                if dist is not None:
+                    self.remove(dist=dist)
+                if key in self.stashed:
+                    self.restore(key=key)
+        finally:
+            self.cleanup()
+            self.state = 'rolled_back'
+            DistributionIndex.invalidate()
+        self.log.info(f"Rolled back {len(changed) - len(failed)} packages: {', '.join(sorted(changed))}")
+        if len(failed) > 0:
+            raise TransactionError(f"Could not roll back {len(failed)} packages: {', '.join(failed)}",
+                                   packages=failed)
+        return diff
+
+    def remove(self, dist):
+        """
+        Remove the installed files of a distribution, its metadata directory first
+        """
+        files = self.get_files(dist=dist)
+        if files is None:
+            self.log.warning(f"Package({dist.name})({dist.version}) does not record its files, it is not removed")
+            return
+        metadata_dir = os.path.normpath(dist.path) + os.sep
+        directories = set()
+        for path in sorted(files, key=lambda p: not p.startswith(metadata_dir)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            directories.add(os.path.dirname(path))
+        directories.add(os.path.normpath(dist.path))
+        self.remove_empty(directories=directories, root=dist.location)
+
+    def restore(self, key: str):
+        """
+        Move the stashed files of a package back, its metadata directory last
+        """
+        for path, stashed in self.stashed.pop(key):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(stashed, path)
+
+    @classmethod
+    def remove_empty(cls, directories: set, root: str):
+        root = os.path.normpath(root)
+        for directory in sorted(directories, key=len, reverse=True):
+            while directory.startswith(root + os.sep):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+    def cleanup(self):
+        for stash_dir in self.stash_dirs.values():
+            shutil.rmtree(stash_dir, ignore_errors=True)
+        self.stash_dirs = {}
+        self.stashed = {}
@@ -0,0 +1,331 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from .cache import SqliteCache, get_cache_dir
+from .interpreter import Interpreter
+from .logging import get_logger
+from .preflight import Preflight
+from .process import Process
+from .requirements import Requirement, Version, normalize_name
+from .timeouts import Timeouts
+
+
+class Wheelhouse(SqliteCache):
+    """
+    Shared directory of pre-built wheels which packages are installed from without network access
+
+    Wheels are downloaded or built once with `pip wheel` and kept in one flat directory, so `pip install --no-index
+    --find-links <wheelhouse>` can install from it. The directory is indexed by the sha256 of each wheel in a SQLite
+    database next to the wheels: a wheel with the same content is only stored once, a rebuilt wheel with a different
+    content does not replace the one other nodes already installed, and the files which are used least recently are
+    evicted first when the directory is larger than `max_size`.
+
+    The location is set with `PIPY_WHEELHOUSE` and defaults to `wheelhouse` in the Pipy cache directory, the size
+    limit is set with `PIPY_WHEELHOUSE_MAX_SIZE` (bytes) and defaults to 5 GiB.
+
+    Usage
+        Wheelhouse.ensure(['boxsdk', 'requests']) # download once
+        Pipy.install(['boxsdk', 'requests'], wheelhouse=True) # pip install --no-index --find-links <wheelhouse> ...
+        Wheelhouse.prune(max_size=1024 ** 3)
+    """
+    log = get_logger()
+    path: str = None
+    max_size = int(os.environ.get('PIPY_WHEELHOUSE_MAX_SIZE', 5 * 1024 ** 3))
+    schema = 'CREATE TABLE IF NOT EXISTS wheels (' \
+             'sha256 TEXT PRIMARY KEY, ' \
+             'filename TEXT NOT NULL UNIQUE, ' \
+             'key TEXT NOT NULL, ' \
+             'version TEXT NOT NULL, ' \
+             'size INTEGER NOT NULL, ' \
+             'mtime REAL NOT NULL, ' \
+             'used REAL NOT NULL)'
+    _local = threading.local()
+
+    @classmethod
+    def get_dir(cls):
+        path = cls.path or os.environ.get('PIPY_WHEELHOUSE')
+        if path is None:
+            return get_cache_dir(name='wheelhouse')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @classmethod
+    def get_path(cls):
+        return os.path.join(cls.get_dir(), '.index.sqlite3')
+
+    @classmethod
+    def get_hash(cls, path: str):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def parse_filename(cls, filename: str):
+        """
+        Return the (key, version) of a wheel filename, ex. `boxsdk-2.7.1-py2.py3-none-any.whl` -> (boxsdk, 2.7.1)
+
+        See: https://www.python.org/dev/peps/pep-0427/#file-name-convention
+        """
+        parts = filename[:-len('.whl')].split('-')
+        if not filename.endswith('.whl') or len(parts) not in (5, 6):
+            return None
+        return normalize_name(parts[0]), parts[1]
+
+    @classmethod
+    def add(cls, path: str):
+        """
+        Move the wheel at `path` into the wheelhouse and index it, a wheel which is already stored is discarded
+
+        Returns:
+            :obj:`dict`: the index entry of the stored wheel
+        """
+        filename = os.path.basename(path)
+        parsed = cls.parse_filename(filename=filename)
+        if parsed is None:
+            raise ValueError(f"Not a wheel: {path}")
+        sha256 = cls.get_hash(path=path)
+        conn = cls.get_connection()
+        row = conn.execute('SELECT * FROM wheels WHERE sha256 = ? OR filename = ?', (sha256, filename)).fetchone()
+        if row is not None and os.path.exists(os.path.join(cls.get_dir(), row['filename'])):
+            if row['sha256'] != sha256:
+                cls.log.warning(f"Keeping stored wheel {filename}, the new build has a different content")
+            os.remove(path)
+            return dict(row)
+        target = os.path.join(cls.get_dir(), filename)
+        os.replace(path, target)
+        stat = os.stat(target)
+        conn.execute('DELETE FROM wheels WHERE sha256 = ? OR filename = ?', (sha256, filename))
+        conn.execute('INSERT INTO wheels (sha256, filename, key, version, size, mtime, used) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (sha256, filename, parsed[0], parsed[1], stat.st_size, stat.st_mtime, time.time()))
+        return cls.get_entry(filename=filename)
+
+    @classmethod
+    def get_entry(cls, filename: str):
+        row = cls.get_connection().execute('SELECT * FROM wheels WHERE filename = ?', (filename,)).fetchone()
+        return None if row is None else dict(row)
+
+    @classmethod
+    def scan(cls):
+        """
+        Synchronize the index with the directory: index wheels which were copied into the directory, forget wheels
+        which were deleted, and re-hash wheels whose size or mtime changed
+        """
+        directory = cls.get_dir()
+        conn = cls.get_connection()
+        indexed = {row['filename']: row for row in conn.execute('SELECT * FROM wheels')}
+        files = {}
+        for entry in os.scandir(directory):
+            if entry.is_file() and cls.parse_filename(filename=entry.name) is not None:
+                files[entry.name] = entry.stat()
+        for filename in indexed.keys() - files.keys():
+            conn.execute('DELETE FROM wheels WHERE filename = ?', (filename,))
+        for filename, stat in files.items():
+            row = indexed.get(filename)
+            if row is not None and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime:
+                continue
+            key, version = cls.parse_filename(filename=filename)
+            conn.execute('DELETE FROM wheels WHERE filename = ?', (filename,))
+            conn.execute('INSERT OR REPLACE INTO wheels (sha256, filename, key, version, size, mtime, used) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (cls.get_hash(path=os.path.join(directory, filename)), filename, key, version, stat.st_size,
+                          stat.st_mtime, time.time() if row is None else row['used']))
+        return len(files)
+
+    @classmethod
+    def find(cls, requirement: str):
+        """
+        Return the index entry of the highest version of a stored wheel which satisfies `requirement`, ex.
+        `boxsdk` or `boxsdk>=2.7`, or None. Platform tags are not checked, pip selects the compatible file.
+        """
+        req = Requirement(requirement)
+        rows = cls.get_connection().execute('SELECT * FROM wheels WHERE key = ?', (req.key,)).fetchall()
+        rows = [dict(row) for row in rows if req.specifier.contains(row['version'])]
+        if len(rows) == 0:
+            return None
+        return max(rows, key=lambda row: Version(row['version']))
+
+    @classmethod
+    def download(cls, names: list, no_dependencies: bool = True):
+        """
+        Download or build wheels of `names` (and their dependencies unless `no_dependencies` is True) with a single
+        `pip wheel` command, and add them to the wheelhouse. Wheels already in the wheelhouse are reused by pip.
+
+        Returns:
+            :obj:`list`: index entries of the added wheels
+        """
+        directory = cls.get_dir()
+        build_dir = tempfile.mkdtemp(dir=directory, prefix='.build-')
+        try:
+            args = Interpreter.get_pip_args('wheel', '--wheel-dir', build_dir, '--find-links', directory, *names)
+            if no_dependencies is True:
+                args.append('--no-deps')
+            cls.log.info(f"Building wheels of {len(names)} packages: {', '.join(names)} ...")
+            cmd = Process(args=args, shell=False, **Timeouts.get_kwargs(operation='wheel', packages=len(names)))
+            cmd.run(raise_exception=False)
+            if cmd.failed is True:
+                cls.log.error(f"pip wheel exited with status {cmd.return_code}: {cmd.stderr}")
+            entries = []
+            for filename in os.listdir(build_dir):
+                if cls.parse_filename(filename=filename) is not None:
+                    entries.append(cls.add(path=os.path.join(build_dir, filename)))
+            return entries
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    @classmethod
+    def ensure(cls, names: list, no_dependencies: bool = True):
+        """
+        Make sure the wheelhouse has a wheel for each name, and for their dependencies unless `no_dependencies` is
+        True, downloading only the missing ones, then evict old wheels which do not fit in `max_size`. The wheels
+        which the install needs, and every wheel downloaded by this call, are not evicted.
+
+        Returns:
+            :obj:`list`: index entry of the wheel of each name, or None if it could not be downloaded or built
+        """
+        cls.scan()
+        entries = [cls.find(requirement=name) for name in names]
+        missing = [name for name, entry in zip(names, entries) if entry is None]
+        added = []
+        if len(missing) > 0:
+            added = cls.download(names=missing, no_dependencies=no_dependencies)
+            entries = [entry if entry is not None else cls.find(requirement=name)
+                       for name, entry in zip(names, entries)]
+        else:
+            cls.log.info(f"Using {len(entries)} wheels from {cls.get_dir()}")
+        if no_dependencies is False:
+            added.extend(cls.ensure_dependencies(names=[name for name, entry in zip(names, entries)
+                                                        if entry is not None]))
+        used = [entry for entry in entries + added if entry is not None]
+        cls.use(entries=used)
+        cls.prune(keep=[entry['sha256'] for entry in used])
+        return entries
+
+    @classmethod
+    def ensure_dependencies(cls, names: list):
+        """
+        Make sure the wheelhouse has every wheel which `pip install --no-index` of `names` needs, resolved offline
+        against the wheelhouse with `pip install --dry-run --report` (pip 22.2+). The dependencies are downloaded if
+        they can not be resolved, or if pip can not report.
+
+        Returns:
+            :obj:`list`: index entries of the wheels of the dependencies
+        """
+        if len(names) == 0:
+            return []
+        capabilities = Interpreter.get_capabilities()
+        if capabilities.dry_run is False or capabilities.report is False:
+            # `pip wheel` copies the stored wheels it resolves into the build directory, so every one is returned
+            return cls.download(names=names, no_dependencies=False)
+        try:
+            report = Preflight.get_report(names=names, no_dependencies=False, use_cache=False,
+                                          index_args=cls.get_install_args())
+        except subprocess.CalledProcessError:
+            cls.log.info(f"Dependencies of {', '.join(names)} are missing from {cls.get_dir()}")
+            return cls.download(names=names, no_dependencies=False)
+        entries = [cls.find(requirement=f"{key}=={version}")
+                   for key, version in Preflight.get_plan(report=report).items()]
+        if None in entries:
+            return cls.download(names=names, no_dependencies=False)
+        return entries
+
+    @classmethod
+    def use(cls, entries: list):
+        now = time.time()
+        cls.get_connection().executemany('UPDATE wheels SET used = ? WHERE sha256 = ?',
+                                         [(now, entry['sha256']) for entry in entries])
+
+    @classmethod
+    def get_install_args(cls):
+        return ['--no-index', '--find-links', cls.get_dir()]
+
+    @classmethod
+    def get_size(cls):
+        return cls.get_connection().execute('SELECT COALESCE(SUM(size), 0) FROM wheels').fetchone()[0]
+
+    @classmethod
+    def prune(cls, max_size: int = None, keep: list = None):
+        """
+        Delete the least recently used wheels until the wheelhouse is not larger than `max_size` bytes
+
+        Args:
+            max_size(:obj:`int`, optional): size limit in bytes, defaults to `Wheelhouse.max_size`
+            keep(:obj:`list`, optional): sha256 of wheels which must not be deleted, ex. the ones being installed
+
+        Returns:
+            :obj:`list`: filenames of the deleted wheels
+        """
+        max_size = cls.max_size if max_size is None else max_size
+        keep = set(keep or [])
+        conn = cls.get_connection()
+        size = cls.get_size()
+        deleted = []
+        if size <= max_size:
+            return deleted
+        for row in conn.execute('SELECT * FROM wheels ORDER BY used ASC').fetchall():
+            if size <= max_size:
+                break
+            if row['sha256'] in keep:
+                continue
+            try:
+                os.remove(os.path.join(cls.get_dir(), row['filename']))
+            except FileNotFoundError:
+                pass
+            conn.execute('DELETE FROM wheels WHERE sha256 = ?', (row['sha256'],))
+            size = size - row['size']
+            deleted.append(row['filename'])
+        cls.log.info(f"Pruned {len(deleted)} wheels from {cls.get_dir()}, {size} bytes are used")
+        return deleted
+
+    @classmethod
+    def benchmark(cls, names: list, repeat: int = 3):
+        """
+        Measure the install of `names` into a throwaway `--target` directory: one `pip install` per package like
+        :obj:`PackageHelper.install_package`, against :obj:`Wheelhouse.ensure` and a single `pip install --no-index`
+        with an empty (cold) and a populated (warm) wheelhouse. The wheelhouses are temporary, the packages are
+        installed without their dependencies and pip's own cache is used by every install.
+
+        Usage
+            Wheelhouse.benchmark(['boxsdk', 'requests', ...]) # {'install_package': {'min': 41.2, ...}, 'cold': ...}
+
+        Returns:
+            :obj:`dict`: `install_package`, `cold` and `warm` -> min, median and max latency in seconds
+        """
+        from .benchmark import measure
+
+        names = list(names)
+        root = tempfile.mkdtemp(prefix='pipy-benchmark-')
+        path = cls.path
+
+        def install(args):
+            target = tempfile.mkdtemp(dir=root, prefix='target-')
+            try:
+                cmd = Process(args=Interpreter.get_pip_args('install', '--no-dependencies', '--target', target, *args),
+                              shell=False, **Timeouts.get_kwargs(operation='install', packages=len(args)))
+                cmd.run(raise_exception=True)
+            finally:
+                shutil.rmtree(target, ignore_errors=True)
+
+        def install_wheelhouse(directory):
+            cls.path = directory
+            cls.ensure(names=names)
+            install(cls.get_install_args() + names)
+
+        try:
+            results = {'install_package': measure(lambda: [install([name]) for name in names], repeat=repeat),
+                       'cold': measure(lambda: install_wheelhouse(tempfile.mkdtemp(dir=root, prefix='cold-')),
+                                       repeat=repeat)}
+            warm = tempfile.mkdtemp(dir=root, prefix='warm-')
+            install_wheelhouse(warm)
+            results['warm'] = measure(lambda: install_wheelhouse(warm), repeat=repeat)
+            return results
+        finally:
+            cls.path = path
+            shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,285 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+
+from .distributions import DistributionIndex
+from .interpreter import Interpreter
+from .logging import get_logger
+
+# Commands which do not change the installed environment, the worker is reused after them
+READ_ONLY_COMMANDS = frozenset(('list', 'show', 'freeze', 'inspect', 'check', 'help', 'index', 'config', 'cache',
+                                'debug', 'hash', '--version', '-V'))
+
+# Runs in the worker process. Protocol: one JSON request per line on stdin, one JSON response per line on the
+# original stdout. During a command fds 0, 1 and 2 are redirected to temporary files, so whatever pip or its
+# subprocesses print can not corrupt the protocol.
+WORKER_SOURCE = r'''
+import io, json, locale, os, sys, tempfile
+if sys.path and sys.path[0] in ('', os.getcwd()):
+    del sys.path[0]
+proto_in = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+proto_out = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 0)
+os.dup2(devnull, 1)
+encoding = locale.getpreferredencoding()
+
+def reply(**response):
+    proto_out.write(json.dumps(response) + '\n')
+    proto_out.flush()
+
+def read(f):
+    f.seek(0)
+    text = f.read().decode(encoding, errors='replace')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+try:
+    import pip
+    from pip._internal.cli.main import main
+    from pip._internal.commands import create_command
+    for name in ('list', 'show'):
+        create_command(name)
+except BaseException as e:
+    reply(ready=False, error=repr(e))
+    sys.exit(1)
+reply(ready=True, pid=os.getpid(), version=pip.__version__)
+
+for request in proto_in:
+    request = json.loads(request)
+    with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        if request.get('stdin') is not None:
+            stdin.write(request['stdin'].encode(encoding))
+            stdin.seek(0)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_stderr = os.dup(2)
+        os.dup2(stdin.fileno(), 0)
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        try:
+            code = main(request['args'])
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException as e:
+            import traceback
+            traceback.print_exc()
+            code = 2
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(devnull, 0)
+            os.dup2(devnull, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stderr)
+        reply(code=code, stdout=read(out), stderr=read(err))
+'''
+
+
+class WorkerError(Exception):
+    """
+    Raised when the pip worker could not be started or exited while running a command
+    """
+    pass
+
+
+class PipWorker(object):
+    """
+    A long-lived Python process which imports pip's CLI once and runs pip commands sent over a pipe
+
+    Most of the time of `pip list` or `pip show` is interpreter startup and pip's imports, the worker pays for them
+    once. The worker runs in its own process group like any :obj:`Process`, and is stopped when a command runs longer
+    than its timeout. It is not reused after a mutating command (ex. `install`), when it crashes, or when a
+    `site-packages` directory was modified since it started, because pip caches the installed distributions.
+
+    Workers are taken from a pool with :obj:`PipWorker.acquire`, so threads do not wait for each other. The worker
+    is disabled unless `PIPY_PIP_WORKER=1` is set or :obj:`PipWorker.configure` is called, it is then used by
+    :obj:`Process` for `pip ...` commands which are not streamed.
+
+    Usage
+        PipWorker.configure(enabled=True)
+        Process(args=Interpreter.get_pip_args('show', 'requests')).run() # runs in a worker
+        PipWorker.benchmark(args=['show', 'pip'])   # {'subprocess': {...}, 'worker': {...}}
+    """
+    log = get_logger()
+    enabled = None
+    max_idle = 4
+    start_timeout = 60
+    pool = queue.LifoQueue()
+    _lock = threading.Lock()
+
+    def __init__(self):
+        # Imported here, process.py uses this module
+        from .process import Process
+        self.process = Process(args=[Interpreter.get_executable(), '-c', WORKER_SOURCE], timeout=None, grace=2)
+        self.mtimes = DistributionIndex.get_mtimes(DistributionIndex.get_paths())
+        self.proc = self.process.p_open(stderr=subprocess.DEVNULL)
+        self.responses = queue.Queue()
+        self.reader = threading.Thread(target=self.read_responses, daemon=True)
+        self.reader.start()
+        self.commands = 0
+        self.pid = self.proc.pid
+        ready = self.receive(timeout=self.start_timeout)
+        if ready.get('ready') is not True:
+            self.close()
+            raise WorkerError(f"pip worker failed to start: {ready.get('error')}")
+        self.version = ready.get('version')
+
+    def __repr__(self):
+        return f"PipWorker(pid={self.pid}, pip={self.version}, commands={self.commands})"
+
+    @classmethod
+    def is_enabled(cls):
+        if cls.enabled is None:
+            cls.enabled = os.environ.get('PIPY_PIP_WORKER', '0').lower() in ('1', 'true', 'yes')
+        return cls.enabled
+
+    @classmethod
+    def configure(cls, enabled: bool = True, max_idle: int = None):
+        cls.enabled = enabled
+        if max_idle is not None:
+            cls.max_idle = max_idle
+        if enabled is False:
+            cls.close_all()
+
+    @classmethod
+    def is_read_only(cls, args: list):
+        command = next((arg for arg in args if not arg.startswith('-') or arg in ('--version', '-V')), None)
+        return command in READ_ONLY_COMMANDS
+
+    @classmethod
+    def acquire(cls):
+        """
+        Return an idle worker which can run a command in the current environment, or start a new one
+        """
+        while True:
+            try:
+                worker = cls.pool.get_nowait()
+            except queue.Empty:
+                return cls()
+            if worker.is_usable():
+                return worker
+            worker.close()
+
+    @classmethod
+    def release(cls, worker):
+        with cls._lock:
+            if worker.is_usable() and cls.pool.qsize() < cls.max_idle:
+                cls.pool.put(worker)
+                return
+        worker.close()
+
+    @classmethod
+    def close_all(cls):
+        while True:
+            try:
+                cls.pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @classmethod
+    def execute(cls, args: list, stdin: str = None, timeout: float = None):
+        """
+        Run `pip <args>` in a pooled worker
+
+        Returns:
+            :obj:`tuple`: (return_code, stdout, stderr)
+
+        Raises:
+            :obj:`subprocess.TimeoutExpired` if the command runs longer than `timeout`, the worker is stopped
+            :obj:`WorkerError` if the worker exits while running the command
+        """
+        worker = cls.acquire()
+        try:
+            result = worker.run(args=args, stdin=stdin, timeout=timeout)
+        except BaseException:
+            worker.close(graceful=False)
+            raise
+        if not cls.is_read_only(args=args):
+            worker.close()
+        else:
+            cls.release(worker)
+        return result
+
+    def is_usable(self):
+        return self.proc.poll() is None and \
+               DistributionIndex.get_mtimes(DistributionIndex.get_paths()) == self.mtimes
+
+    def read_responses(self):
+        try:
+            for line in self.proc.stdout:
+                self.responses.put(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.responses.put(None)
+
+    def receive(self, timeout: float = None):
+        try:
+            line = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            self.close(graceful=False)
+            raise subprocess.TimeoutExpired(cmd=self.process.args, timeout=timeout) from None
+        if line is None:
+            self.close()
+            raise WorkerError(f"pip worker {self.pid} exited with status {self.proc.returncode}")
+        return json.loads(line.decode('utf-8'))
+
+    def run(self, args: list, stdin: str = None, timeout: float = None):
+        """
+        Returns:
+            :obj:`tuple`: (return_code, stdout, stderr)
+        """
+        request = json.dumps({'args': list(args), 'stdin': stdin}) + '\n'
+        try:
+            self.proc.stdin.write(request.encode('utf-8'))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.close()
+            raise WorkerError(f"pip worker {self.pid} is not running") from None
+        try:
+            response = self.receive(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise subprocess.TimeoutExpired(cmd=['pip'] + list(args), timeout=timeout) from None
+        self.commands += 1
+        return response['code'], response['stdout'], response['stderr']
+
+    def close(self, graceful: bool = True):
+        """
+        Stop the worker, by closing its stdin or, if it is running a command, by terminating its process group
+        """
+        if self.proc.poll() is None:
+            try:
+                if graceful is False:
+                    raise subprocess.TimeoutExpired(cmd=self.process.args, timeout=0)
+                self.proc.stdin.close()
+                self.proc.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.terminate(proc=self.proc)
+
+    @classmethod
+    def benchmark(cls, args: list = ('list', '--format', 'freeze'), repeat: int = 10):
+        """
+        Measure the latency of `pip <args>` run as a new process and in a warm worker
+
+        Returns:
+            :obj:`dict`: `subprocess` and `worker` -> min, median and max latency in seconds, and `start` -> seconds
+                to start a worker
+        """
+        import time
+        from .benchmark import measure
+        from .process import Process
+
+        args = list(args)
+        # The baseline never goes through a worker, even with `PIPY_PIP_WORKER=1`
+        results = {'subprocess': measure(lambda: Process(args=Interpreter.get_pip_args(*args), timeout=None,
+                                                         worker=False).run(raise_exception=False), repeat=repeat)}
+        started = time.perf_counter()
+        worker = cls()
+        results['start'] = time.perf_counter() - started
+        try:
+            results['worker'] = measure(lambda: worker.run(args=args), repeat=repeat)
+        finally:
+            worker.close()
+        return results